@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fake_kube.py — Generator 2: kube-apiserver giả lập cho benchmark scaler (KUBE_TRANSPORT=native).
+
+Phục vụ (HTTP, không auth, keep-alive):
+  GET   /version
+  GET   /api/v1/namespaces[/{ns}]
+  GET   /apis/apps/v1[/namespaces/{ns}]/{deployments|statefulsets}      (limit/continue, watch=1)
+  GET   /apis/autoscaling/{v2|v1}[/namespaces/{ns}]/horizontalpodautoscalers
+  GET   /api/v1/nodes, /api/v1[/namespaces/{ns}]/pods                     (--nodes; fieldSelector spec.nodeName, status.phase)
+  GET   /apis/policy/v1[/namespaces/{ns}]/poddisruptionbudgets             (--pdb-ratio workload có PDB)
+  POST  /api/v1/namespaces/{ns}/pods/{name}/eviction                       (PDB allowed 0 -> 429, còn lại xoá pod, allowed-1)
+  GET   /apis/apps/v1/namespaces/{ns}/{kind}/{name}/scale
+  PATCH /apis/apps/v1/namespaces/{ns}/{kind}/{name}/scale               (precondition resourceVersion -> 409)
+  POST  /apis/authorization.k8s.io/v1/selfsubjectaccessreviews          (luôn allowed)
+  POST  /apis/authorization.k8s.io/v1/selfsubjectrulesreviews           (rule get/list/watch/patch deploy,sts[/scale], pods)
+
+watch=1&resourceVersion=RV&timeoutSeconds=N: stream (chunked) các event ADDED/MODIFIED sau RV, BOOKMARK
+định kỳ; RV cũ hơn lúc dựng cluster (chưa có log event) -> event ERROR 410 như apiserver thật.
+
+Cluster sinh theo N namespace (bench-ns-000..) × M workload (wl-000.., khớp gen_raw.py),
+--sts-ratio là StatefulSet, --hpa-ratio có HPA; workload có selector / label pod template app=<tên>. Latency cấu hình theo request và thêm cho list.
+--nodes K: thêm K node chia 2 nodegroup (gke-bench-pool-a/b-<hash>-<id>), pod của workload (replicas) rải lên
+node + 1 DaemonSet pod mỗi node; 1 node mỗi pool mới tạo 10 phút (check-ultilized bỏ qua node < 30 phút),
+node thứ 10, 20, ... có taint dedicated=batch:NoSchedule. Workload >= 1 replica theo --pdb-ratio có PDB
+(minAvailable 1 hoặc maxUnavailable 0 -> allowed 0; có cả khi không --nodes, cho pdb_scout / PDB_GUARD). --cordon REGEX: node khớp tên đã cordon (unschedulable).
+
+Ví dụ:
+  python3 bench/fake_kube.py --port 18080 --ns 50 --wl 40 --latency-ms 5 --kubeconfig /tmp/bench/kubeconfig
+"""
+
+import json, re, time, random, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+PLURAL = {"deployments": "Deployment", "statefulsets": "StatefulSet", "horizontalpodautoscalers": "HorizontalPodAutoscaler"}
+
+class Cluster:
+    def __init__(self, ns: int, wl: int, sts_ratio: float, hpa_ratio: float, seed: int, nodes: int = 0,
+                 pdb_ratio: float = 0.3, cordon: str = ""):
+        rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.namespaces = [f"bench-ns-{i:03d}" for i in range(ns)] + ["kube-system", "monitoring"]
+        self.items = {}     # (plural, ns, name) -> obj
+        self.rv = 1000
+        self.events = []    # (rv, type, plural, obj) sau khi dựng cluster, cho watch
+        self.cond = threading.Condition(self.lock)
+        for i in range(ns):
+            n = f"bench-ns-{i:03d}"
+            for j in range(wl):
+                name = f"wl-{j:03d}"
+                plural = "statefulsets" if rng.random() < sts_ratio else "deployments"
+                self._add(plural, n, name, {"replicas": rng.choice([0, 1, 1, 2, 3]),
+                                            "selector": {"matchLabels": {"app": name}},
+                                            "template": {"metadata": {"labels": {"app": name}}}})
+                if rng.random() < hpa_ratio:
+                    self._add("horizontalpodautoscalers", n, f"{name}-hpa", {
+                        "minReplicas": rng.choice([1, 2]), "maxReplicas": 5,
+                        "scaleTargetRef": {"apiVersion": "apps/v1", "kind": PLURAL[plural], "name": name},
+                    })
+        self.nodes, self.pods, self.pdbs = [], [], []
+        if nodes:
+            self._add_nodes(rng, nodes)
+        self._add_pdbs(rng, pdb_ratio)
+        for n in self.nodes:
+            if cordon and re.search(cordon, n["metadata"]["name"]):
+                n["spec"]["unschedulable"] = True
+        self.base_rv = self.rv
+
+    def _add_nodes(self, rng, count):
+        now = time.time()
+        for i in range(count):
+            pool = "ab"[i % 2]
+            age = 600 if i in (0, 1) else 86400
+            self.nodes.append({
+                "kind": "Node",
+                "metadata": {"name": f"gke-bench-pool-{pool}-1f2e3d4c-{i:04d}",
+                             "labels": {"cloud.google.com/gke-nodepool": f"pool-{pool}"},
+                             "creationTimestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - age))},
+                "spec": {"taints": [{"key": "dedicated", "value": "batch", "effect": "NoSchedule"}]} if i % 10 == 9 else {},
+                "status": {"allocatable": {"cpu": "3920m", "memory": "13134288Ki", "pods": "110"},
+                           "conditions": [{"type": "Ready", "status": "True"}]},
+            })
+        def pod(ns, name, node, cpu, mem, owner, labels):
+            return {"kind": "Pod",
+                    "metadata": {"name": name, "namespace": ns, "labels": labels,
+                                 "ownerReferences": [{"kind": owner[0], "name": owner[1], "controller": True}]},
+                    "spec": {"nodeName": node, "containers": [
+                        {"name": "app", "resources": {"requests": {"cpu": cpu, "memory": mem}}}]},
+                    "status": {"phase": "Running"}}
+        names = [n["metadata"]["name"] for n in self.nodes]
+        for (plural, ns, name), o in sorted(self.items.items()):
+            if plural == "horizontalpodautoscalers":
+                continue
+            cpu, mem = rng.choice(["50m", "100m", "250m", "500m"]), rng.choice(["64Mi", "256Mi", "512Mi", "1Gi"])
+            owner = ("StatefulSet", name) if plural == "statefulsets" else ("ReplicaSet", f"{name}-7d9f8")
+            for r in range(o["spec"]["replicas"]):
+                pname = f"{name}-{r}" if plural == "statefulsets" else f"{name}-7d9f8-{r:05x}"
+                self.pods.append(pod(ns, pname, rng.choice(names), cpu, mem, owner, {"app": name}))
+        for n in names:
+            self.pods.append(pod("kube-system", f"node-agent-{n[-4:]}", n, "100m", "128Mi",
+                                 ("DaemonSet", "node-agent"), {"app": "node-agent"}))
+
+    def _add_pdbs(self, rng, ratio):
+        for (plural, ns, name), o in sorted(self.items.items()):
+            r = o["spec"].get("replicas", 0)
+            if plural == "horizontalpodautoscalers" or r < 1 or rng.random() >= ratio:
+                continue
+            if rng.random() < 0.7:
+                spec, allowed, desired = {"minAvailable": 1}, r - 1, 1
+            else:
+                spec, allowed, desired = {"maxUnavailable": 0}, 0, r
+            spec["selector"] = {"matchLabels": {"app": name}}
+            self.pdbs.append({"kind": "PodDisruptionBudget",
+                              "metadata": {"name": f"{name}-pdb", "namespace": ns},
+                              "spec": spec,
+                              "status": {"currentHealthy": r, "desiredHealthy": desired,
+                                         "disruptionsAllowed": allowed, "expectedPods": r}})
+
+    def evict(self, ns, name):
+        """Gọi khi đang giữ lock -> (status, body) như Eviction API."""
+        pod = next((p for p in self.pods if p["metadata"]["namespace"] == ns and p["metadata"]["name"] == name), None)
+        if not pod:
+            return 404, {"reason": "NotFound", "message": f'pods "{name}" not found'}
+        labels = pod["metadata"].get("labels") or {}
+        pdbs = [b for b in self.pdbs if b["metadata"]["namespace"] == ns
+                and all(labels.get(k) == v for k, v in b["spec"]["selector"]["matchLabels"].items())]
+        if any(b["status"]["disruptionsAllowed"] <= 0 for b in pdbs):
+            return 429, {"kind": "Status", "reason": "TooManyRequests", "code": 429,
+                         "message": "Cannot evict pod as it would violate the pod's disruption budget.",
+                         "details": {"causes": [{"reason": "DisruptionBudget"}]}}
+        for b in pdbs:
+            b["status"]["disruptionsAllowed"] -= 1
+            b["status"]["currentHealthy"] -= 1
+        self.pods.remove(pod)
+        return 201, {"kind": "Status", "status": "Success"}
+
+    def list_pods(self, ns=None, field_selector=""):
+        out = [p for p in self.pods if ns is None or p["metadata"]["namespace"] == ns]
+        for cond in filter(None, field_selector.split(",")):
+            neg = "!=" in cond
+            k, v = cond.split("!=" if neg else "=", 1)
+            get = (lambda p: p["spec"].get("nodeName", "")) if k == "spec.nodeName" else \
+                  (lambda p: p["status"].get("phase", "")) if k == "status.phase" else \
+                  (lambda p: p["metadata"].get(k.split(".", 1)[-1], ""))
+            out = [p for p in out if (get(p) != v) == neg]
+        return out
+
+    def _add(self, plural, ns, name, spec):
+        self.rv += 1
+        self.items[(plural, ns, name)] = {
+            "apiVersion": "autoscaling/v2" if plural == "horizontalpodautoscalers" else "apps/v1",
+            "kind": PLURAL[plural],
+            "metadata": {"name": name, "namespace": ns, "resourceVersion": str(self.rv)},
+            "spec": spec,
+        }
+
+    def record(self, etype, plural, obj):
+        """Gọi khi đang giữ lock: ghi event và đánh thức các watch."""
+        self.events.append((self.rv, etype, plural, json.loads(json.dumps(obj))))
+        self.cond.notify_all()
+
+    def list(self, plural, ns=None):
+        return [o for (p, n, _), o in sorted(self.items.items()) if p == plural and (ns is None or n == ns)]
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cluster: Cluster = None
+    latency_s = 0.0
+    list_latency_s = 0.0
+    stats = {"requests": 0, "patches": 0, "conflicts": 0}
+
+    def log_message(self, *a):
+        pass
+
+    def _send(self, code, obj):
+        b = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(b)))
+        self.end_headers()
+        self.wfile.write(b)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length", "0") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def _delay(self, extra=0.0):
+        Handler.stats["requests"] += 1
+        if self.latency_s or extra:
+            time.sleep(self.latency_s + extra)
+
+    def do_GET(self):
+        u = urlsplit(self.path)
+        path, q = u.path, parse_qs(u.query)
+        c = self.cluster
+        if path == "/version":
+            self._delay()
+            return self._send(200, {"gitVersion": "v1.29.0-bench"})
+        if path == "/api/v1/namespaces":
+            self._delay(self.list_latency_s)
+            return self._send(200, {"kind": "NamespaceList", "metadata": {},
+                                    "items": [{"metadata": {"name": n}} for n in c.namespaces]})
+        if path == "/api/v1/nodes":
+            self._delay(self.list_latency_s)
+            return self._send_list("NodeList", c.nodes, q)
+        m = re.fullmatch(r"/api/v1(?:/namespaces/([^/]+))?/pods", path)
+        if m:
+            self._delay(self.list_latency_s)
+            return self._send_list("PodList", c.list_pods(m.group(1), (q.get("fieldSelector") or [""])[0]), q)
+        m = re.fullmatch(r"/apis/policy/v1(?:/namespaces/([^/]+))?/poddisruptionbudgets", path)
+        if m:
+            self._delay(self.list_latency_s)
+            return self._send_list("PodDisruptionBudgetList",
+                                   [p for p in c.pdbs if m.group(1) is None or p["metadata"]["namespace"] == m.group(1)], q)
+        m = re.fullmatch(r"/api/v1/namespaces/([^/]+)", path)
+        if m:
+            self._delay()
+            ok = m.group(1) in c.namespaces
+            return self._send(200 if ok else 404, {"metadata": {"name": m.group(1)}} if ok else {"reason": "NotFound"})
+        m = re.fullmatch(r"/apis/apps/v1/namespaces/([^/]+)/(deployments|statefulsets)/([^/]+)/scale", path)
+        if m:
+            self._delay()
+            o = c.items.get((m.group(2), m.group(1), m.group(3)))
+            if not o:
+                return self._send(404, {"reason": "NotFound"})
+            return self._send(200, {"kind": "Scale", "metadata": dict(o["metadata"]), "spec": {"replicas": o["spec"]["replicas"]}})
+        m = re.fullmatch(r"/apis/(?:apps/v1|autoscaling/v2|autoscaling/v1)(?:/namespaces/([^/]+))?/(deployments|statefulsets|horizontalpodautoscalers)", path)
+        if m and (q.get("watch") or [""])[0] in ("1", "true"):
+            self._delay()
+            return self._watch(m.group(2), m.group(1), q)
+        if m:
+            self._delay(self.list_latency_s)
+            return self._send_list(PLURAL[m.group(2)] + "List", c.list(m.group(2), m.group(1)), q)
+        self._delay()
+        self._send(404, {"reason": "NotFound", "message": path})
+
+    def _send_list(self, kind, items, q):
+        limit = int((q.get("limit") or ["0"])[0] or 0)
+        start = int((q.get("continue") or ["0"])[0] or 0)
+        meta = {"resourceVersion": str(self.cluster.rv)}
+        if limit:
+            page = items[start:start + limit]
+            if start + limit < len(items):
+                meta["continue"] = str(start + limit)
+            items = page
+        return self._send(200, {"kind": kind, "metadata": meta,
+                                "items": [{k: v for k, v in o.items() if k not in ("kind", "apiVersion")} for o in items]})
+
+    def _chunk(self, obj):
+        b = (json.dumps(obj) + "\n").encode()
+        self.wfile.write(f"{len(b):x}\r\n".encode() + b + b"\r\n")
+        self.wfile.flush()
+
+    def _watch(self, plural, ns, q):
+        c = self.cluster
+        rv = int((q.get("resourceVersion") or ["0"])[0] or 0)
+        deadline = time.time() + float((q.get("timeoutSeconds") or ["30"])[0])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            with c.lock:
+                if rv < c.base_rv:
+                    self._chunk({"type": "ERROR", "object": {"kind": "Status", "code": 410, "reason": "Expired"}})
+                    deadline = 0
+            while time.time() < deadline:
+                with c.lock:
+                    evs = [e for e in c.events if e[0] > rv and e[2] == plural
+                           and (ns is None or e[3]["metadata"].get("namespace") == ns)]
+                    if not evs:
+                        c.cond.wait(min(1.0, max(0.0, deadline - time.time())))
+                        evs = [e for e in c.events if e[0] > rv and e[2] == plural
+                               and (ns is None or e[3]["metadata"].get("namespace") == ns)]
+                for erv, etype, _, obj in evs:
+                    self._chunk({"type": etype, "object": obj})
+                    rv = erv
+                if not evs and q.get("allowWatchBookmarks"):
+                    self._chunk({"type": "BOOKMARK", "object": {"kind": PLURAL[plural],
+                                 "metadata": {"resourceVersion": str(c.rv)}}})
+                    rv = max(rv, c.rv)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def do_PATCH(self):
+        m = re.fullmatch(r"/apis/apps/v1/namespaces/([^/]+)/(deployments|statefulsets)/([^/]+)/scale", urlsplit(self.path).path)
+        body = self._body()
+        self._delay()
+        if not m:
+            return self._send(404, {"reason": "NotFound"})
+        c = self.cluster
+        with c.lock:
+            o = c.items.get((m.group(2), m.group(1), m.group(3)))
+            if not o:
+                return self._send(404, {"reason": "NotFound"})
+            rv = (body.get("metadata") or {}).get("resourceVersion")
+            if rv and rv != o["metadata"]["resourceVersion"]:
+                Handler.stats["conflicts"] += 1
+                return self._send(409, {"reason": "Conflict", "message": "the object has been modified"})
+            Handler.stats["patches"] += 1
+            o["spec"]["replicas"] = int((body.get("spec") or {}).get("replicas", o["spec"]["replicas"]))
+            c.rv += 1
+            o["metadata"]["resourceVersion"] = str(c.rv)
+            c.record("MODIFIED", m.group(2), o)
+            return self._send(200, {"kind": "Scale", "metadata": dict(o["metadata"]), "spec": {"replicas": o["spec"]["replicas"]}})
+
+    def do_POST(self):
+        body = self._body()
+        self._delay()
+        m = re.fullmatch(r"/api/v1/namespaces/([^/]+)/pods/([^/]+)/eviction", urlsplit(self.path).path)
+        if m:
+            with self.cluster.lock:
+                return self._send(*self.cluster.evict(m.group(1), m.group(2)))
+        if urlsplit(self.path).path.endswith("/selfsubjectaccessreviews"):
+            body["status"] = {"allowed": True}
+            return self._send(201, body)
+        if urlsplit(self.path).path.endswith("/selfsubjectrulesreviews"):
+            body["status"] = {"incomplete": False, "nonResourceRules": [], "resourceRules": [
+                {"verbs": ["get", "list", "watch"], "apiGroups": [""], "resources": ["pods"]},
+                {"verbs": ["get", "list", "watch", "patch"], "apiGroups": ["apps"],
+                 "resources": ["deployments", "statefulsets", "deployments/scale", "statefulsets/scale"]},
+            ]}
+            return self._send(201, body)
+        self._send(404, {"reason": "NotFound"})
+
+def write_kubeconfig(path: str, port: int):
+    cfg = {
+        "apiVersion": "v1", "kind": "Config", "current-context": "bench",
+        "clusters": [{"name": "bench", "cluster": {"server": f"http://127.0.0.1:{port}"}}],
+        "users": [{"name": "bench", "user": {"token": "bench"}}],
+        "contexts": [{"name": "bench", "context": {"cluster": "bench", "user": "bench"}}],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cfg, f, indent=2)
+
+def serve(port: int, cluster: Cluster, latency_ms: float = 0, list_latency_ms: float = 0) -> ThreadingHTTPServer:
+    """Chạy server trong thread nền (runner dùng); trả về server để shutdown()."""
+    Handler.cluster = cluster
+    Handler.latency_s = latency_ms / 1000.0
+    Handler.list_latency_s = list_latency_ms / 1000.0
+    srv = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="kube-apiserver giả lập cho benchmark")
+    ap.add_argument("--port", type=int, default=18080)
+    ap.add_argument("--ns", type=int, default=20)
+    ap.add_argument("--wl", type=int, default=20)
+    ap.add_argument("--sts-ratio", type=float, default=0.2)
+    ap.add_argument("--hpa-ratio", type=float, default=0.1)
+    ap.add_argument("--nodes", type=int, default=0, help="số node giả (0 = không phục vụ nodes/pods)")
+    ap.add_argument("--pdb-ratio", type=float, default=0.3)
+    ap.add_argument("--cordon", default="", help="regex tên node đã cordon")
+    ap.add_argument("--latency-ms", type=float, default=0)
+    ap.add_argument("--list-latency-ms", type=float, default=0)
+    ap.add_argument("--kubeconfig", default="", help="ghi kubeconfig trỏ về server này")
+    ap.add_argument("--seed", type=int, default=1)
+    return ap.parse_args(argv)
+
+if __name__ == "__main__":
+    a = parse_args()
+    if a.kubeconfig:
+        write_kubeconfig(a.kubeconfig, a.port)
+    cl = Cluster(a.ns, a.wl, a.sts_ratio, a.hpa_ratio, a.seed, a.nodes, a.pdb_ratio, a.cordon)
+    print(f"🚀 fake kube on :{a.port} ns={a.ns} wl={a.wl} items={len(cl.items)} nodes={len(cl.nodes)} pods={len(cl.pods)} latency={a.latency_ms}ms")
+    Handler.cluster = cl
+    Handler.latency_s = a.latency_ms / 1000.0
+    Handler.list_latency_s = a.list_latency_ms / 1000.0
+    try:
+        ThreadingHTTPServer(("127.0.0.1", a.port), Handler).serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+gen_raw.py — Generator 1: sinh cây RAW giả lập (raw-*.jsonl theo ngày) cho benchmark dedupe/compute-active.
+
+- N namespace (bench-ns-000..) × M workload (wl-000..)
+- --regs        số lần đăng ký (mỗi lần = 1 file raw-<rid>-<build>.jsonl, 1..--max-lines dòng)
+- --dup-ratio   tỉ lệ dòng đăng ký lại một ns|workload đã có (khác end_date/requester)
+- --all-ratio   tỉ lệ dòng `ns | _ALL_` (kèm biến thể __ALL__ / ALL / *)
+- --invalid-ratio tỉ lệ dòng hỏng (JSON lỗi / thiếu mode)
+- --store DIR   ghi qua exception_store thay vì cây file (như EXCEPTION_STORE=store)
+
+Record giống hệt build-exception-draft.py (req_id, seq, hash, created_at...).
+mtime file được rải trong --days ngày gần nhất để nằm trong LOOKBACK_DAYS.
+
+Ví dụ:
+  python3 bench/gen_raw.py --out /tmp/bench/raw --ns 50 --wl 40 --regs 2000
+"""
+
+import os, sys, json, random, hashlib, argparse, datetime, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+ALL_VARIANTS = ["_ALL_", "_ALL_", "_ALL_", "__ALL__", "ALL", "*"]
+REQUESTERS = ["xuan.na", "anh.vtq", "binh.lt", "chi.nt", "dung.pv"]
+REASONS = ["test game KOL", "UAT release", "batch cuối tháng", "demo khách hàng", "load test"]
+
+def build_lines(rng: random.Random, args, seen: list, reg_no: int, today: datetime.date, created: datetime.datetime):
+    rid = f"exc-{created.strftime('%Y%m%dT%H%M%SZ')}-{reg_no:05x}"
+    n = rng.randint(1, args.max_lines)
+    end = today + datetime.timedelta(days=rng.randint(-5, args.max_days + 5))
+    end_input = end.strftime("%Y%m%d") if rng.random() < 0.5 else end.isoformat()
+    ex247 = rng.random() < 0.3
+    exow = (not ex247) or rng.random() < 0.5
+    requester = rng.choice(REQUESTERS)
+    reason = rng.choice(REASONS)
+    lines = []
+    for seq in range(1, n + 1):
+        r = rng.random()
+        if r < args.invalid_ratio / 2:
+            lines.append('{"req_id": "' + rid + '", "seq": ' + str(seq) + ', "ns": ')
+            continue
+        if seen and rng.random() < args.dup_ratio:
+            ns, wl = rng.choice(seen)
+        else:
+            ns = f"bench-ns-{rng.randrange(args.ns):03d}"
+            wl = rng.choice(ALL_VARIANTS) if rng.random() < args.all_ratio else f"wl-{rng.randrange(args.wl):03d}"
+            seen.append((ns, wl))
+        m247, mow = ex247, exow
+        if r < args.invalid_ratio:
+            m247 = mow = False
+        h = hashlib.sha256(f"{ns}|{wl}|{end.isoformat()}|{m247}|{mow}|{requester}|{reason}".encode()).hexdigest()
+        lines.append(json.dumps({
+            "req_id": rid, "seq": seq, "ns": ns, "workload": wl,
+            "on_exeption_247": m247, "on_exeption_out_worktime": mow,
+            "requester": requester, "reason": reason,
+            "end_date": end.isoformat(), "end_input": end_input,
+            "created_at": created.strftime("%Y-%m-%dT%H:%M:%SZ"), "created_by": rng.choice(REQUESTERS),
+            "source_job": "bench/register", "source_build": f"https://jenkins.local/job/bench/{reg_no}/",
+            "status": "draft", "hash": h,
+        }, ensure_ascii=False))
+    return rid, lines
+
+def generate(args) -> dict:
+    rng = random.Random(args.seed)
+    today = datetime.date.fromisoformat(args.today) if args.today else datetime.date.today()
+    now = time.time()
+    seen = []
+    store = None
+    if args.store:
+        import exception_store
+        store = exception_store.ExceptionStore(args.store)
+    total_lines = 0
+    for reg in range(args.regs):
+        age = rng.random() * args.days * 86400
+        ts = now - age
+        created = datetime.datetime.utcfromtimestamp(ts)
+        day = (today - datetime.timedelta(seconds=age)).isoformat()
+        rid, lines = build_lines(rng, args, seen, reg, today, created)
+        fid = f"{day}/raw-{rid}-{reg + 1}.jsonl"
+        total_lines += len(lines)
+        if store is not None:
+            with store.lock():
+                store.append(fid, lines, ts=ts)
+            continue
+        path = os.path.join(args.out, fid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for l in lines:
+                f.write(l + "\n")
+        os.utime(path, (ts, ts))
+    if store is not None:
+        with store.lock():
+            store.compact()
+    return {"regs": args.regs, "lines": total_lines, "keys": len(set(seen))}
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Sinh RAW giả lập cho benchmark")
+    ap.add_argument("--out", default="/tmp/bench/raw", help="RAW_ROOT đích")
+    ap.add_argument("--store", default="", help="STORE_ROOT: ghi qua exception_store thay vì file")
+    ap.add_argument("--ns", type=int, default=20)
+    ap.add_argument("--wl", type=int, default=20)
+    ap.add_argument("--regs", type=int, default=500)
+    ap.add_argument("--max-lines", type=int, default=8)
+    ap.add_argument("--dup-ratio", type=float, default=0.3)
+    ap.add_argument("--all-ratio", type=float, default=0.05)
+    ap.add_argument("--invalid-ratio", type=float, default=0.02)
+    ap.add_argument("--days", type=int, default=60, help="rải mtime/ngày trong N ngày gần nhất")
+    ap.add_argument("--max-days", type=int, default=60, help="end_date tối đa (như MAX_DAYS)")
+    ap.add_argument("--today", default="", help="YYYY-MM-DD (mặc định hôm nay)")
+    ap.add_argument("--seed", type=int, default=1)
+    return ap.parse_args(argv)
+
+if __name__ == "__main__":
+    a = parse_args()
+    res = generate(a)
+    print(f"✅ generated regs={res['regs']} lines={res['lines']} keys={res['keys']} -> {a.store or a.out}")
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+run_bench.py — đo thời gian 1 tick pipeline trên dữ liệu giả lập, ghi JSON để so sánh theo thời gian.
+
+Mỗi scale `NSxWL` (vd. 10x10,50x40):
+  1) gen_raw.py sinh RAW (regs = NS*WL*--regs-factor) vào thư mục tạm
+  2) dedupe      : scripts/dedupe_exceptions.py          (RAW_ROOT/OUT_DIR tạm, TODAY cố định)
+  3) compute     : scripts/compute-active-exceptions.py
+  4) scaler      : scripts/scale-by-exceptions.py ACTION=--action, KUBE_TRANSPORT=native,
+                   trỏ vào fake_kube.py (cluster dựng lại mỗi lần chạy), JITTER_*=0, managed-ns `^bench-`
+
+Mỗi stage chạy --repeat lần (subprocess, wall time); ghi min/median/max.
+ENV của shell được truyền nguyên cho script (vd. DEDUPE_WORKERS=4, SCALE_MODE=bulk) -> so sánh cấu hình.
+
+Kết quả: --out (mặc định bench/results/bench-<ts>.json). --compare FILE in chênh lệch median theo %.
+
+Ví dụ:
+  python3 bench/run_bench.py --scales 10x10,50x40,200x50 --repeat 3 --latency-ms 2
+  DEDUPE_WORKERS=4 python3 bench/run_bench.py --compare bench/results/bench-20250905T010203Z.json
+"""
+
+import os, sys, json, time, shutil, socket, argparse, datetime, platform, statistics, subprocess, tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.normpath(os.path.join(HERE, "..", "scripts"))
+sys.path.insert(0, HERE)
+
+import gen_raw, fake_kube
+
+def free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    p = s.getsockname()[1]
+    s.close()
+    return p
+
+def run_script(name: str, env: dict, log_path: str) -> float:
+    t0 = time.perf_counter()
+    with open(log_path, "a", encoding="utf-8") as log:
+        rc = subprocess.call([sys.executable, os.path.join(SCRIPTS, name)], env=env, cwd=SCRIPTS,
+                             stdout=log, stderr=subprocess.STDOUT)
+    dt = time.perf_counter() - t0
+    if rc != 0:
+        raise RuntimeError(f"{name} rc={rc} (xem {log_path})")
+    return dt
+
+def summarize(runs: list) -> dict:
+    return {"runs": [round(x, 4) for x in runs], "min": round(min(runs), 4),
+            "median": round(statistics.median(runs), 4), "max": round(max(runs), 4)}
+
+def count_lines(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            return sum(1 for _ in f)
+    except OSError:
+        return 0
+
+def bench_scale(ns: int, wl: int, args, work: str) -> dict:
+    d = os.path.join(work, f"{ns}x{wl}")
+    raw, out, state = os.path.join(d, "raw"), os.path.join(d, "out"), os.path.join(d, "state")
+    log = os.path.join(d, "bench.log")
+    os.makedirs(out, exist_ok=True)
+
+    ga = gen_raw.parse_args([
+        "--out", raw, "--ns", str(ns), "--wl", str(wl),
+        "--regs", str(max(10, int(ns * wl * args.regs_factor))),
+        "--dup-ratio", str(args.dup_ratio), "--all-ratio", str(args.all_ratio),
+        "--today", args.today, "--seed", str(args.seed),
+    ])
+    t0 = time.perf_counter()
+    g = gen_raw.generate(ga)
+    res = {"ns": ns, "wl": wl, "gen": dict(g, seconds=round(time.perf_counter() - t0, 4)), "stages": {}}
+
+    env = dict(os.environ, RAW_ROOT=raw, OUT_DIR=out, TODAY=args.today,
+               LOOKBACK_DAYS=str(ga.days + 30), MAX_DAYS=str(ga.max_days), PYTHONUNBUFFERED="1")
+    env.pop("DEBUG", None)
+
+    runs = []
+    for _ in range(args.repeat):
+        shutil.rmtree(out, ignore_errors=True)   # full run mỗi lần (checkpoint cũ không được tính)
+        os.makedirs(out)
+        runs.append(run_script("dedupe_exceptions.py", env, log))
+    res["stages"]["dedupe"] = summarize(runs)
+    res["polished"] = count_lines(os.path.join(out, "polished_exceptions.jsonl"))
+
+    runs = [run_script("compute-active-exceptions.py", env, log) for _ in range(args.repeat)]
+    res["stages"]["compute_active"] = summarize(runs)
+    res["active"] = count_lines(os.path.join(out, "active_exceptions.jsonl"))
+
+    if args.action != "none":
+        managed = os.path.join(d, "managed-ns.txt")
+        with open(managed, "w", encoding="utf-8") as f:
+            f.write("^bench-\n")
+        port = free_port()
+        kcfg = os.path.join(d, "kubeconfig")
+        fake_kube.write_kubeconfig(kcfg, port)
+        senv = dict(env, KUBE_TRANSPORT="native", KUBECONFIG_FILE=kcfg, KUBE_CONTEXT="bench",
+                    STATE_ROOT=state, MANAGED_NS_FILE=managed, DENY_NS_FILE=os.path.join(d, "deny-ns.txt"),
+                    HOLIDAYS_FILE=os.path.join(d, "holidays.txt"), ACTION=args.action, DRY_RUN="0",
+                    JITTER_UP_BULK_S="0", JITTER_UP_EXC_S="0", JITTER_DOWN_S="0")
+        runs, reqs = [], []
+        for _ in range(args.repeat):
+            shutil.rmtree(state, ignore_errors=True)
+            fake_kube.Handler.stats.update(requests=0, patches=0, conflicts=0)
+            cluster = fake_kube.Cluster(ns, wl, args.sts_ratio, args.hpa_ratio, args.seed)
+            srv = fake_kube.serve(port, cluster, args.latency_ms, args.list_latency_ms)
+            try:
+                runs.append(run_script("scale-by-exceptions.py", senv, log))
+            finally:
+                srv.shutdown()
+                srv.server_close()
+            reqs.append(dict(fake_kube.Handler.stats))
+        res["stages"]["scaler"] = summarize(runs)
+        res["api"] = reqs[-1]
+    return res
+
+def compare(cur: dict, base_path: str):
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    idx = {(r["ns"], r["wl"]): r for r in base.get("results", [])}
+    print(f"\n=== so với {base_path} ({base.get('ts')}, rev={base.get('git_rev')}) ===")
+    for r in cur["results"]:
+        b = idx.get((r["ns"], r["wl"]))
+        if not b:
+            print(f"  {r['ns']}x{r['wl']}: không có trong baseline")
+            continue
+        for st, v in r["stages"].items():
+            bv = (b.get("stages") or {}).get(st)
+            if not bv or not bv.get("median"):
+                continue
+            pct = (v["median"] - bv["median"]) / bv["median"] * 100
+            flag = "🔺" if pct > 10 else ("🟢" if pct < -10 else "  ")
+            print(f"  {flag} {r['ns']}x{r['wl']:<5} {st:<15} {bv['median']:.3f}s -> {v['median']:.3f}s ({pct:+.1f}%)")
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ""
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark dedupe / compute-active / scaler")
+    ap.add_argument("--scales", default="10x10,50x20,100x40", help="danh sách NSxWL, phân cách dấu phẩy")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--regs-factor", type=float, default=0.5, help="số đăng ký = NS*WL*factor")
+    ap.add_argument("--dup-ratio", type=float, default=0.3)
+    ap.add_argument("--all-ratio", type=float, default=0.05)
+    ap.add_argument("--sts-ratio", type=float, default=0.2)
+    ap.add_argument("--hpa-ratio", type=float, default=0.1)
+    ap.add_argument("--latency-ms", type=float, default=0)
+    ap.add_argument("--list-latency-ms", type=float, default=0)
+    ap.add_argument("--action", default="weekday_enter_out",
+                    help="ACTION cho scaler (weekday_prestart|weekday_enter_out|weekend_pre|weekend_close|none)")
+    ap.add_argument("--today", default=datetime.date.today().isoformat())
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--work", default="", help="thư mục làm việc (mặc định tạm, xoá sau khi chạy)")
+    ap.add_argument("--out", default="", help="file JSON kết quả")
+    ap.add_argument("--compare", default="", help="file JSON baseline để so sánh")
+    return ap.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    scales = []
+    for s in args.scales.split(","):
+        a, b = s.lower().strip().split("x")
+        scales.append((int(a), int(b)))
+
+    work = args.work or tempfile.mkdtemp(prefix="exc-bench-")
+    ts = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    doc = {
+        "ts": ts, "git_rev": git_rev(), "python": platform.python_version(), "host": platform.node(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("work", "out", "compare")},
+        "env": {k: os.environ[k] for k in sorted(os.environ)
+                if k in ("DEDUPE_WORKERS", "DEDUPE_INCREMENTAL", "EXCEPTION_STORE", "SCALE_MODE",
+                         "SCALE_CONCURRENCY", "KUBE_POOL_SIZE", "KUBE_LIST_CHUNK", "INVENTORY_MODE")},
+        "results": [],
+    }
+    try:
+        for ns, wl in scales:
+            print(f"▶️  scale {ns}x{wl} ...", flush=True)
+            r = bench_scale(ns, wl, args, work)
+            doc["results"].append(r)
+            line = "  ".join(f"{k}={v['median']:.3f}s" for k, v in r["stages"].items())
+            print(f"   lines={r['gen']['lines']} polished={r['polished']} active={r['active']}  {line}", flush=True)
+    except Exception as e:
+        print(f"❌ bench error: {e} (giữ lại {work})")
+        return 2
+    if not args.work:
+        shutil.rmtree(work, ignore_errors=True)
+
+    out = args.out or os.path.join(HERE, "results", f"bench-{ts}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+    print(f"✅ results -> {out}")
+    if args.compare:
+        compare(doc, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import os, sys, re, json, csv, hashlib, time, glob, shutil, datetime, random
 from typing import Tuple, Dict, List
+import exception_store
 
 # ---------- DEBUG ----------
 DEBUG = os.environ.get("DEBUG", "0").lower() in ("1", "true", "yes")
@@ -147,12 +148,29 @@ def retention_cleanup(raw_root: str, retain_days: int, dry_run: bool):
         except Exception:
             pass
 
+def store_retention(store, retain_days: int, dry_run: bool):
+    """EXCEPTION_STORE=store: retention = compact bỏ entry quá RETAIN_DAYS (thay cho glob/xoá file)."""
+    dbg(f"🧹 Retention (store): path={store.root}, keep {retain_days}d, dry_run={int(dry_run)}")
+    if dry_run:
+        dbg(f"🔎 DRY-RUN: needs_compact={store.needs_compact(retain_days)} (RETENTION_DRY_RUN=0 để compact thật)")
+        return
+    res = store.maybe_compact(retain_days)
+    dbg(f"🗜️  Compacted: {res}" if res else "✅ Không cần compact.")
+
+def publish_store(store, file_id: str, src_jsonl: str) -> int:
+    with open(src_jsonl, "r", encoding="utf-8") as f:
+        lines = [l.rstrip("\n") for l in f if l.strip()]
+    with store.lock():
+        return store.append(file_id, lines)
+
 # ---------- Main ----------
 def main():
     # === ENV & required vars ===
     RAW_ROOT = os.environ.get("RAW_ROOT", "/data/exceptions/raw")
     RETAIN_DAYS = int(os.environ.get("RETAIN_DAYS", "90"))
     RETENTION_DRY_RUN = os.environ.get("RETENTION_DRY_RUN", "0").lower() in ("1", "true", "yes")
+    # files = ghi RAW_ROOT/<ngày>/raw-*.jsonl,csv,meta như cũ | store = append vào exception_store (STORE_ROOT)
+    EXCEPTION_STORE = os.environ.get("EXCEPTION_STORE", "files").lower()
 
     EXEC_ON_247   = os.environ.get("EXEC_ON_247", "false")
     EXEC_ON_OUT   = os.environ.get("EXEC_ON_OUT", "true")
@@ -242,42 +260,55 @@ def main():
     dbg(f" - {out_jsonl}")
     dbg(f" - {out_csv}")
 
-    # Retention
-    if safe_path_guard(RAW_ROOT):
-        retention_cleanup(RAW_ROOT, RETAIN_DAYS, RETENTION_DRY_RUN)
+    day = datetime.date.today().isoformat()
+    if EXCEPTION_STORE == "store":
+        store = exception_store.ExceptionStore()
+        boot = store.bootstrap(RAW_ROOT)
+        if boot:
+            dbg(f"📥 Store mới: import {RAW_ROOT} -> files={boot[0]} lines={boot[1]}")
+        file_id = f"{day}/raw-{rid}-{build_number}.jsonl"
+        n = publish_store(store, file_id, out_jsonl)
+        dbg(f"📦 Published: {store.root} ({file_id}, {n} line(s))")
+        store_retention(store, RETAIN_DAYS, RETENTION_DRY_RUN)
+        shown_csv = out_csv
     else:
-        dbg("⚠️  Bỏ qua retention: RAW_ROOT không an toàn.")
-
-    # Publish
-    day_dir = os.path.join(RAW_ROOT, datetime.date.today().isoformat())
-    ensure_dir(day_dir)
-
-    out_raw_jsonl = os.path.join(day_dir, f"raw-{rid}-{build_number}.jsonl")
-    out_raw_csv   = os.path.join(day_dir, f"raw-{rid}-{build_number}.csv")
-    tmp_jsonl     = out_raw_jsonl + ".tmp"
-    tmp_csv       = out_raw_csv + ".tmp"
-
-    shutil.copyfile(out_jsonl, tmp_jsonl); os.replace(tmp_jsonl, out_raw_jsonl)
-    shutil.copyfile(out_csv,   tmp_csv);   os.replace(tmp_csv,   out_raw_csv)
-
-    meta_path = os.path.join(day_dir, f"raw-{rid}-{build_number}.meta")
-    with open(meta_path, "w", encoding="utf-8") as fm:
-        fm.write(f"created_at={created_at}\n")
-        fm.write(f"created_by={build_user}\n")
-        fm.write(f"job={job_name}\n")
-        fm.write(f"build={build_url}\n")
-        fm.write(f"files={os.path.basename(out_raw_jsonl)},{os.path.basename(out_raw_csv)}\n")
-
-    dbg("📦 Published:")
-    dbg(f" - {out_raw_jsonl}")
-    dbg(f" - {out_raw_csv}")
-    dbg(f" - {meta_path}")
+        # Retention
+        if safe_path_guard(RAW_ROOT):
+            retention_cleanup(RAW_ROOT, RETAIN_DAYS, RETENTION_DRY_RUN)
+        else:
+            dbg("⚠️  Bỏ qua retention: RAW_ROOT không an toàn.")
+
+        # Publish
+        day_dir = os.path.join(RAW_ROOT, day)
+        ensure_dir(day_dir)
+
+        out_raw_jsonl = os.path.join(day_dir, f"raw-{rid}-{build_number}.jsonl")
+        out_raw_csv   = os.path.join(day_dir, f"raw-{rid}-{build_number}.csv")
+        tmp_jsonl     = out_raw_jsonl + ".tmp"
+        tmp_csv       = out_raw_csv + ".tmp"
+
+        shutil.copyfile(out_jsonl, tmp_jsonl); os.replace(tmp_jsonl, out_raw_jsonl)
+        shutil.copyfile(out_csv,   tmp_csv);   os.replace(tmp_csv,   out_raw_csv)
+
+        meta_path = os.path.join(day_dir, f"raw-{rid}-{build_number}.meta")
+        with open(meta_path, "w", encoding="utf-8") as fm:
+            fm.write(f"created_at={created_at}\n")
+            fm.write(f"created_by={build_user}\n")
+            fm.write(f"job={job_name}\n")
+            fm.write(f"build={build_url}\n")
+            fm.write(f"files={os.path.basename(out_raw_jsonl)},{os.path.basename(out_raw_csv)}\n")
+
+        dbg("📦 Published:")
+        dbg(f" - {out_raw_jsonl}")
+        dbg(f" - {out_raw_csv}")
+        dbg(f" - {meta_path}")
+        shown_csv = out_raw_csv
     try:
-        print("\n=== Nội dung dữ liệu đã được ghi nhận "===\n")
-        with open(out_raw_csv, "r", encoding="utf-8") as f:
+        print("\n=== Nội dung dữ liệu đã được ghi nhận ===\n")
+        with open(shown_csv, "r", encoding="utf-8") as f:
             for line in f:
                 print(line.rstrip())
     except Exception as e:
-        print(f"⚠️  Không đọc được {out_raw_csv}: {e}")
+        print(f"⚠️  Không đọc được {shown_csv}: {e}")
 if __name__ == "__main__":
     main()
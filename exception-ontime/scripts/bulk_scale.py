@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bulk_scale.py
+
+PATCH subresource /scale hàng loạt, dùng chung transport (kube_transport) của scaler.
+
+- Mỗi item PATCH .../namespaces/{ns}/{deployments|statefulsets}/{name}/scale
+  kèm metadata.resourceVersion (precondition) lấy từ inventory
+- 409 Conflict: GET lại /scale; nếu spec.replicas vẫn như lúc lập kế hoạch (rv chỉ đổi do status)
+  thì retry với rv mới, nếu người khác đã đổi replicas thì ghi nhận `conflict` và bỏ qua
+- 429 / 5xx: backoff theo Retry-After hoặc luỹ thừa (kèm jitter), retry theo từng item
+- Kết quả từng item gom vào report của run (ok / noop / conflict / failed + số lần retry)
+
+ENV:
+  BULK_MAX_RETRIES = 5
+  BULK_BACKOFF_S   = 0.5   (backoff gốc, nhân đôi mỗi lần, trần 30s)
+"""
+
+import os, time, random, datetime, json
+from typing import Dict, List, Optional
+from kube_transport import resource_path, SCALE_RESOURCES, KubeError
+
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", "5"))
+BULK_BACKOFF_S   = float(os.environ.get("BULK_BACKOFF_S", "0.5"))
+
+RETRYABLE = (429, 500, 502, 503, 504)
+
+def scale_path(ns: str, kind: str, name: str) -> str:
+    return resource_path(SCALE_RESOURCES.get(kind.lower(), kind), ns, name, "scale")
+
+def _backoff(attempt: int, retry_after=None) -> float:
+    if retry_after:
+        try:
+            return min(30.0, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+    return min(30.0, BULK_BACKOFF_S * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+def _message(data) -> str:
+    if isinstance(data, dict):
+        return str(data.get("message") or data.get("reason") or "")[:200]
+    return str(data or "")[:200]
+
+def scale_item(t, item: dict, max_retries: int = None) -> dict:
+    """
+    item: {ns, kind, name, target, current (replicas lúc lập kế hoạch), rv (resourceVersion, có thể rỗng)}
+    Trả về dict kết quả: status ∈ ok | noop | conflict | failed.
+    """
+    max_retries = BULK_MAX_RETRIES if max_retries is None else max_retries
+    path = scale_path(item["ns"], item["kind"], item["name"])
+    rv = item.get("rv") or ""
+    res = {"ns": item["ns"], "kind": item["kind"], "name": item["name"], "target": item["target"],
+           "status": "failed", "attempts": 0, "retries": 0, "conflicts": 0, "throttled": 0,
+           "last_status": None, "error": ""}
+    attempt = 0
+    while True:
+        res["attempts"] += 1
+        body = {"spec": {"replicas": int(item["target"])}}
+        if rv:
+            body["metadata"] = {"resourceVersion": rv}
+        try:
+            st, data = t.request("PATCH", path, body)
+        except KubeError as e:
+            st, data = 0, str(e)
+        res["last_status"] = st
+
+        if 200 <= st < 300:
+            res["status"] = "ok"
+            return res
+
+        if attempt >= max_retries:
+            res["error"] = f"{st} {_message(data)}".strip()
+            return res
+
+        if st == 409:
+            res["conflicts"] += 1
+            try:
+                st2, cur = t.request("GET", path)
+            except KubeError as e:
+                st2, cur = 0, str(e)
+            if st2 != 200 or not isinstance(cur, dict):
+                res["error"] = f"conflict, re-read failed: {st2} {_message(cur)}".strip()
+                return res
+            cur_rep = (cur.get("spec") or {}).get("replicas", 0)
+            if cur_rep == item["target"]:
+                res["status"] = "noop"
+                return res
+            if item.get("current") is not None and cur_rep != item["current"]:
+                # replicas đã bị người/tiến trình khác đổi -> không ghi đè
+                res["status"] = "conflict"
+                res["error"] = f"replicas changed concurrently ({item['current']} -> {cur_rep})"
+                return res
+            rv = (cur.get("metadata") or {}).get("resourceVersion", "")
+        elif st in RETRYABLE or st == 0:
+            if st == 429:
+                res["throttled"] += 1
+            retry_after = (data.get("details") or {}).get("retryAfterSeconds") if isinstance(data, dict) else None
+            time.sleep(_backoff(attempt, retry_after))
+        else:
+            res["error"] = f"{st} {_message(data)}".strip()
+            return res
+        attempt += 1
+        res["retries"] += 1
+
+def summarize(results: List[dict]) -> Dict[str, int]:
+    tot = {"items": len(results), "ok": 0, "noop": 0, "conflict": 0, "failed": 0,
+           "retries": 0, "conflicts_seen": 0, "throttled": 0}
+    for r in results:
+        tot[r["status"]] = tot.get(r["status"], 0) + 1
+        tot["retries"] += r.get("retries", 0)
+        tot["conflicts_seen"] += r.get("conflicts", 0)
+        tot["throttled"] += r.get("throttled", 0)
+    return tot
+
+def write_report(path: str, action: str, started: float, results: List[dict], extra: Optional[dict] = None) -> dict:
+    rep = {
+        "action": action,
+        "started_at": datetime.datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "duration_s": round(time.time() - started, 3),
+        "totals": summarize(results),
+        "items": sorted(results, key=lambda r: (r["ns"], r["kind"], r["name"])),
+    }
+    if extra:
+        rep.update(extra)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(rep, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return rep
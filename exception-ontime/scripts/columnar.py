@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+columnar.py
+
+Snapshot nhị phân dạng cột (.col) ghi cạnh JSONL trung gian của pipeline (polished_exceptions.jsonl,
+active_exceptions.jsonl); JSONL vẫn là format cho người đọc / debug, stage sau load .col thay vì json.loads
+từng dòng:
+
+- Mỗi cột là mảng uint32 id trỏ vào 1 pool giá trị intern dùng chung (ns, workload, mode, end_date... mỗi giá trị
+  distinct lưu 1 lần): string lưu utf-8 thô, giá trị khác (list, số, null) lưu 1 mảnh JSON; key vắng mặt = MISSING,
+  key không khai báo cột -> cột `_extra` (object JSON) -> records() trả lại đúng dict như dòng JSONL
+- Layout: MAGIC | u32 độ dài header | header JSON (rows, cột, offset từng buffer, byteorder, chữ ký JSONL nguồn)
+  | buffer căn 8 byte: cột id, pool offsets (u32), pool tag (1 byte 's' | 'j'), pool blob
+- Đọc: mmap + memoryview.cast -> không copy, không parse; mỗi giá trị distinct decode 1 lần (cache theo id)
+- Chỉ dùng khi chữ ký (size, mtime_ns) của JSONL còn khớp lúc ghi: JSONL bị ghi lại / sửa tay mà .col không
+  cập nhật -> open_table() trả None, caller đọc JSONL như cũ
+- open_table() kiểm tra buffer nằm trong file, pool offsets hợp lệ, mọi id < số giá trị; caller vẫn bắt lỗi
+  khi dựng record và quay về JSONL (snapshot chỉ là đường tắt, JSONL là nguồn chuẩn)
+
+ENV:
+  COLUMNAR_SNAPSHOT = 0   (1 = ghi / đọc .col cạnh JSONL)
+
+CLI:
+  python3 columnar.py info  OUT_DIR/polished_exceptions.col
+  python3 columnar.py dump  OUT_DIR/active_exceptions.col     # in lại JSONL từ snapshot
+  python3 columnar.py selftest                                 # ghi -> đọc lại với nhiều cỡ header
+"""
+
+import os, sys, json, mmap, struct
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+ENABLED = os.environ.get("COLUMNAR_SNAPSHOT", "0").lower() in ("1", "true", "yes")
+
+MAGIC = b"EXCOL\x01\n\x00"
+VERSION = 1
+MISSING = 0xFFFFFFFF
+EXTRA = "_extra"
+
+def snapshot_path(jsonl_path: str) -> str:
+    base = jsonl_path[:-6] if jsonl_path.endswith(".jsonl") else jsonl_path
+    return base + ".col"
+
+def _signature(path: str) -> Optional[dict]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+class Writer:
+    """Gom record theo cột trong array('I') + pool intern; close() ghi file (tmp + rename)."""
+
+    def __init__(self, path: str, columns: List[str]):
+        self.path = path
+        self.columns = [c for c in columns if c != EXTRA] + [EXTRA]
+        self.ids = {c: array("I") for c in self.columns}
+        self.known = set(self.columns)
+        self.pool: Dict[tuple, int] = {}
+        self.tags = bytearray()
+        self.offsets = array("I", [0])
+        self.blob = bytearray()
+        self.rows = 0
+
+    def _intern(self, v) -> int:
+        if isinstance(v, str):
+            key = ("s", v)
+        else:
+            key = ("j", json.dumps(v, ensure_ascii=False, separators=(",", ":")))
+        vid = self.pool.get(key)
+        if vid is None:
+            vid = self.pool[key] = len(self.tags)
+            self.tags += key[0].encode()
+            self.blob += key[1].encode("utf-8")
+            self.offsets.append(len(self.blob))
+        return vid
+
+    def add(self, rec: dict):
+        extra = {k: v for k, v in rec.items() if k not in self.known}
+        for c in self.columns:
+            if c == EXTRA:
+                self.ids[c].append(self._intern(extra) if extra else MISSING)
+            else:
+                self.ids[c].append(self._intern(rec[c]) if c in rec else MISSING)
+        self.rows += 1
+
+    def close(self, source_path: str = None):
+        """source_path: JSONL tương ứng (đã đóng) -> ghi chữ ký để reader biết snapshot còn khớp."""
+        bufs = [(f"col:{c}", self.ids[c].tobytes()) for c in self.columns]
+        bufs += [("pool.offsets", self.offsets.tobytes()), ("pool.tags", bytes(self.tags)), ("pool.blob", bytes(self.blob))]
+        header = {"version": VERSION, "rows": self.rows, "values": len(self.tags), "byteorder": sys.byteorder,
+                  "columns": self.columns, "source": _signature(source_path) if source_path else None, "buffers": {}}
+        # offset buffer phụ thuộc độ dài header (offset dài thêm chữ số -> header dài ra -> offset dời theo)
+        # -> lặp tới khi điểm bắt đầu vùng buffer không đổi (thường 2-3 lượt)
+        start = -1
+        while True:
+            head = json.dumps(header, separators=(",", ":")).encode()
+            first = _align(len(MAGIC) + 4 + len(head))
+            if first == start:
+                break
+            start = pos = first
+            for name, b in bufs:
+                header["buffers"][name] = [pos, len(b)]
+                pos = _align(pos + len(b))
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(head)) + head)
+            for name, b in bufs:
+                off = header["buffers"][name][0]
+                f.write(b"\0" * (off - f.tell()))
+                assert f.tell() == off, f"columnar: {name} lệch offset ({f.tell()} != {off})"
+                f.write(b)
+        os.replace(tmp, self.path)
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+def write(path: str, columns: List[str], records: Iterable[dict], source_path: str = None) -> int:
+    w = Writer(path, columns)
+    for r in records:
+        w.add(r)
+    w.close(source_path)
+    return w.rows
+
+_UNSET = object()
+
+class Table:
+    """Snapshot đã mmap; column() trả memoryview uint32 (zero-copy), value() decode giá trị theo id (cache)."""
+
+    def __init__(self, path: str, mm: mmap.mmap, header: dict):
+        self.path, self.mm, self.header = path, mm, header
+        self.rows: int = header["rows"]
+        self.columns: List[str] = header["columns"]
+        view = memoryview(mm)
+
+        def buf(name):
+            off, n = header["buffers"][name]
+            return view[off:off + n]
+
+        self._cols = {c: buf(f"col:{c}").cast("I") for c in self.columns}
+        self._offsets = buf("pool.offsets").cast("I")
+        self._tags = buf("pool.tags")
+        self._blob = buf("pool.blob")
+        self._vals = [_UNSET] * header["values"]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def close(self):
+        """Nhả memoryview rồi đóng mmap (mmap còn view export thì close() báo BufferError)."""
+        for v in [*self._cols.values(), self._offsets, self._tags, self._blob]:
+            v.release()
+        self._cols = {}
+        self.mm.close()
+
+    def column(self, name: str) -> memoryview:
+        return self._cols[name]
+
+    def value(self, vid: int):
+        v = self._vals[vid]
+        if v is _UNSET:
+            raw = self._blob[self._offsets[vid]:self._offsets[vid + 1]]
+            v = str(raw, "utf-8") if self._tags[vid] == 0x73 else json.loads(str(raw, "utf-8"))
+            self._vals[vid] = v
+        return v
+
+    def records(self, columns: List[str] = None) -> Iterator[dict]:
+        """Dict từng dòng (như json.loads dòng JSONL); columns -> chỉ dựng các field đó."""
+        names = [c for c in (columns or self.columns) if c in self._cols and c != EXTRA]
+        vals = self._vals
+        cells, sparse, shared = [], [], []
+        for c in names:
+            # decode mỗi id distinct 1 lần rồi map cả cột bằng list comprehension (không gọi hàm theo ô)
+            ids = self._cols[c]
+            uniq = set(ids)
+            if MISSING in uniq:
+                uniq.discard(MISSING)
+                sparse.append(c)
+            for vid in uniq:
+                self.value(vid)
+            cells.append([vals[x] if x != MISSING else _UNSET for x in ids] if c in sparse else [vals[x] for x in ids])
+            if len(uniq) < self.rows and any(type(vals[v]) is list for v in uniq):
+                shared.append(c)    # list dùng chung giữa các dòng -> trả bản copy
+        extra = self._cols[EXTRA] if EXTRA in self._cols and (columns is None or EXTRA in columns) else None
+        for i, tup in enumerate(zip(*cells) if names else ((),) * self.rows):
+            rec = dict(zip(names, tup))
+            for c in sparse:
+                if rec[c] is _UNSET:
+                    del rec[c]
+            for c in shared:
+                if type(rec.get(c)) is list:
+                    rec[c] = rec[c][:]
+            if extra is not None and extra[i] != MISSING:
+                rec.update(json.loads(json.dumps(self.value(extra[i]))))
+            yield rec
+
+def load_records(jsonl_path: str, columns: List[str] = None) -> Optional[List[dict]]:
+    """
+    Record của JSONL đọc qua snapshot cạnh nó; None (caller đọc JSONL) nếu tắt / không có / không khớp / lỗi
+    khi dựng record - snapshot hỏng không bao giờ làm stage fail.
+    """
+    t = open_table(snapshot_path(jsonl_path), jsonl_path)
+    if t is None:
+        return None
+    try:
+        return list(t.records(columns))
+    except (IndexError, ValueError, TypeError, UnicodeDecodeError) as e:
+        print(f"⚠️  {t.path}: đọc snapshot lỗi ({e}) -> đọc {jsonl_path}")
+        return None
+    finally:
+        t.close()
+
+def _check_buffers(mm: mmap.mmap, header: dict):
+    for name, (off, size) in header["buffers"].items():
+        if off < 0 or size < 0 or off + size > len(mm):
+            raise ValueError(f"{name} vượt ngoài file")
+
+def _check(t: Table):
+    """Pool offsets tăng dần khớp blob, mọi cột đủ dòng và id < số giá trị -> ValueError nếu hỏng."""
+    n = t.header["values"]
+    offs = t._offsets
+    if len(offs) != n + 1 or len(t._tags) != n or offs[0] != 0 or offs[n] != len(t._blob):
+        raise ValueError("pool hỏng")
+    if any(a > b for a, b in zip(offs, offs[1:])):
+        raise ValueError("pool offsets không tăng dần")
+    for c in t.columns:
+        ids = t.column(c)
+        if len(ids) != t.rows:
+            raise ValueError(f"cột {c} sai số dòng")
+        uniq = set(ids)
+        uniq.discard(MISSING)
+        if uniq and max(uniq) >= n:
+            raise ValueError(f"cột {c} có id ngoài pool")
+
+def open_table(path: str, source_path: str = None) -> Optional[Table]:
+    """None nếu tắt / thiếu file / sai magic, version, byteorder, cấu trúc / chữ ký JSONL nguồn không khớp."""
+    if not ENABLED:
+        return None
+    return _open(path, source_path)
+
+def _open(path: str, source_path: str = None) -> Optional[Table]:
+    if source_path is not None:
+        sig = _signature(source_path)
+        if sig is None:
+            return None
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if mm[:len(MAGIC)] != MAGIC:
+            raise ValueError("magic")
+        (n,) = struct.unpack_from("<I", mm, len(MAGIC))
+        header = json.loads(mm[len(MAGIC) + 4:len(MAGIC) + 4 + n])
+        if header.get("version") != VERSION or header.get("byteorder") != sys.byteorder:
+            raise ValueError("version")
+        if source_path is not None and header.get("source") != sig:
+            raise ValueError("stale")
+        _check_buffers(mm, header)
+        t = Table(path, mm, header)
+    except (ValueError, KeyError, struct.error, TypeError):
+        mm.close()
+        return None
+    try:
+        _check(t)
+    except ValueError:
+        t.close()
+        return None
+    return t
+
+def selftest() -> int:
+    """
+    Ghi -> đọc lại, số dòng tăng dần từng 1 với 1 / 4 / 12 cột: offset buffer quét qua mốc 10^k (header dài thêm
+    chữ số) và mọi phần dư mod 8 của header; có ô MISSING, list dùng chung và cột `_extra`.
+    """
+    import tempfile
+    seen, n = set(), 0
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "t.col")
+        for ncol in (1, 4, 12):
+            cols = [f"c{i}" for i in range(ncol)]
+            for rows in range(260):
+                recs = []
+                for r in range(rows):
+                    rec = {c: (f"v{r}" if i % 2 == 0 else [r % 5, None]) for i, c in enumerate(cols)}
+                    if r % 7 == 3:
+                        rec.pop(cols[-1])
+                    if r % 11 == 5:
+                        rec["zz_extra"] = {"k": r}
+                    recs.append(rec)
+                write(path, cols, recs)
+                t = _open(path)
+                if t is None or list(t.records()) != recs:
+                    print(f"❌ selftest: cols={ncol} rows={rows} đọc lại sai")
+                    return 1
+                seen.add((len(MAGIC) + 4 + struct.unpack_from("<I", t.mm, len(MAGIC))[0]) % 8)
+                t.close()
+                n += 1
+    print(f"✅ selftest: {n} snapshot ghi/đọc khớp (header mod 8: {sorted(seen)})")
+    return 0 if len(seen) == 8 else 1
+
+def main(argv: List[str]) -> int:
+    if argv[:1] == ["selftest"]:
+        return selftest()
+    if len(argv) < 2 or argv[0] not in ("info", "dump"):
+        print(__doc__)
+        return 2
+    t = _open(argv[1])
+    if t is None:
+        print(f"❌ {argv[1]}: không đọc được snapshot (thiếu / sai format / hỏng)")
+        return 2
+    if argv[0] == "info":
+        h = t.header
+        print(f"🧊 {argv[1]} rows={t.rows} values={h['values']} size={len(t.mm)}B source={h.get('source')}")
+        for c in t.columns:
+            print(f"  {c:<18} distinct={len(set(t.column(c)) - {MISSING})}")
+        return 0
+    for r in t.records():
+        print(json.dumps(r, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
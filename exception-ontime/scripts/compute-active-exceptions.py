@@ -8,19 +8,32 @@ ENV:
   MAX_DAYS      = 60
   TODAY         = YYYY-MM-DD (optional override, e.g. 2025-09-09)
   DEBUG         = 0/1
+  DECISION_INDEX_FILE = OUT_DIR/decision_index.json
+  HOLIDAYS_FILE = holidays.txt (build sẵn index holiday_calendar cho scaler / schedule.py)
+  COLUMNAR_SNAPSHOT = 0 (1 = đọc polished_exceptions.col nếu còn khớp JSONL, ghi active_exceptions.col; xem columnar.py)
+
+Ngoài active_exceptions.jsonl/.md còn ghi decision index (decision_index.py): mỗi ns 1 default (từ ALL)
++ override theo workload, end_date đã đổi sang ordinal, precedence cụ thể/ALL đã gộp sẵn -> scaler tra O(1).
 """
 
 import os, sys, json, csv, datetime, re
 from collections import defaultdict
+import decision_index
+import holiday_calendar
+import columnar
 
 OUT_DIR        = os.environ.get("OUT_DIR", "/data/exceptions/out")
 MAX_DAYS       = int(os.environ.get("MAX_DAYS", "60"))
 TODAY_OVERRIDE = os.environ.get("TODAY", "").strip()
 DEBUG          = os.environ.get("DEBUG","0").lower() in ("1","true","yes")
+DECISION_INDEX_FILE = os.environ.get("DECISION_INDEX_FILE", "").strip() or os.path.join(OUT_DIR, "decision_index.json")
+HOLIDAYS_FILE  = os.environ.get("HOLIDAYS_FILE", "holidays.txt")
 
 POLISHED = os.path.join(OUT_DIR, "polished_exceptions.jsonl")
 ACTIVE_JL = os.path.join(OUT_DIR, "active_exceptions.jsonl")
 ACTIVE_MD = os.path.join(OUT_DIR, "active_exceptions.md")
+ACTIVE_COLUMNS = ["ns", "workload", "mode", "end_date", "days_left", "sources_count", "last_updated_at",
+                  "modes_raw", "requesters", "reasons", "patchers"]
 
 ALL_KEYS = {"ALL", "_ALL_", "__ALL__", "*"}
 
@@ -45,6 +58,11 @@ def load_polished(path: str):
     rows = []
     if not os.path.exists(path):
         return rows
+    # snapshot cột do dedupe ghi cạnh JSONL (mmap, string intern) -> không json.loads từng dòng
+    snap = columnar.load_records(path)
+    if snap is not None:
+        if DEBUG: print(f"[DEBUG] load polished from {columnar.snapshot_path(path)} (rows={len(snap)})")
+        return snap
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             line=line.strip()
@@ -165,6 +183,8 @@ def main():
     with open(ACTIVE_JL, "w", encoding="utf-8") as f:
         for r in active:
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    if columnar.ENABLED:
+        columnar.write(columnar.snapshot_path(ACTIVE_JL), ACTIVE_COLUMNS, active, ACTIVE_JL)
 
     # md (để Jenkins cat)
     active_sorted = sorted(active, key=lambda r: (r["ns"].lower(), r["workload"].lower()))
@@ -178,8 +198,16 @@ def main():
                 f"{';'.join(r.get('reasons',[]))} | { ';'.join(r.get('requesters',[])) } | { ';'.join(r.get('patchers',[])) } |\n"
             )
 
+    # decision index cho scaler (ghi sau jsonl để mtime index >= active)
+    idx = decision_index.build(active, t)
+    decision_index.write(DECISION_INDEX_FILE, idx)
+
     print(f"✅ Active written: {ACTIVE_JL}")
     print(f"📝 Active digest: {ACTIVE_MD}")
+    print(f"🗂️  Decision index: {DECISION_INDEX_FILE} (ns={len(idx['ns'])})")
+    # holiday index (cache theo sha256 file) build trước giờ mở cửa sổ, scaler chỉ việc đọc
+    cal = holiday_calendar.load(HOLIDAYS_FILE)
+    print(f"🎌 Holiday calendar: {HOLIDAYS_FILE} (days={len(cal)}, ns_sections={len(cal.ns)}, today={cal.is_holiday(t)})")
     print(f"📦 Count: {len(active)}")
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+consolidation_planner.py
+
+Lập kế hoạch gom node cho check-ultilized (node_utilization.py --consolidate): thay vì 1 node "yếu nhất"
++ so tổng free của nodegroup (bỏ qua phân mảnh từng node), mô phỏng đặt request từng pod lên các node còn lại
+và trả về tập node lớn nhất drain được cùng lúc trong 1 run.
+
+- build_consolidation(): hàm thuần (không gọi kube) nhận nodes / pods / PDBs (object API thô) + danh sách ứng viên
+- Ứng viên xét theo requested tăng dần (node rỗng nhất trước -> nhiều node nhất); mỗi ứng viên nhận nếu MỌI pod
+  phải dời đặt được lên node khác (best-fit decreasing: pod lớn trước, chọn node vừa khít nhất còn chỗ,
+  ưu tiên node không phải ứng viên) với cpu / memory / số pod, nodeSelector + nodeAffinity required, taint
+  NoSchedule/NoExecute; node đã nhận pod không bị drain nữa (tránh dời 2 lần)
+- PDB: số pod bị evict theo từng PDB cộng dồn trên cả tập <= status.disruptionsAllowed
+- Pod không phải dời: DaemonSet, mirror pod. Pod chặn drain (node bị loại): annotation unsafe-to-evict=true,
+  namespace bị evict bỏ qua (EVICT_EXCLUDE_NS, như evict.sh), pod không có controller
+- Heuristic tham lam (bài toán tối ưu là NP-hard), đủ tốt cho vài chục ứng viên; không có gì đặt vừa -> tập rỗng
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+import label_selector
+from node_utilization import pod_requests, cpu_milli, mem_bytes
+from node_evictor import EXCLUDE_NS as EVICT_EXCLUDE_NS, UNSAFE_ANNOTATION, MIRROR_ANNOTATION
+
+def _owner_kind(pod: dict) -> str:
+    refs = (pod.get("metadata") or {}).get("ownerReferences") or []
+    ctl = [r for r in refs if r.get("controller")] or refs
+    return ctl[0].get("kind", "") if ctl else ""
+
+def pod_ref(pod: dict) -> str:
+    m = pod.get("metadata") or {}
+    return f"{m.get('namespace', '')}/{m.get('name', '')}"
+
+def classify(pod: dict, exclude_ns: str = None) -> Tuple[str, str]:
+    """-> ("skip" | "block" | "move", lý do)."""
+    meta = pod.get("metadata") or {}
+    ann = meta.get("annotations") or {}
+    if MIRROR_ANNOTATION in ann:
+        return "skip", "mirror pod"
+    kind = _owner_kind(pod)
+    if kind == "DaemonSet":
+        return "skip", "DaemonSet"
+    exclude_ns = EVICT_EXCLUDE_NS if exclude_ns is None else exclude_ns
+    if exclude_ns and re.search(exclude_ns, meta.get("namespace", "")):
+        return "block", f"{pod_ref(pod)} thuộc ns bị loại khỏi evict"
+    if str(ann.get(UNSAFE_ANNOTATION, "")).lower() == "true":
+        return "block", f"{pod_ref(pod)} unsafe-to-evict=true"
+    if not kind:
+        return "block", f"{pod_ref(pod)} không có controller (xoá là mất)"
+    return "move", ""
+
+class _Node:
+    __slots__ = ("name", "labels", "taints", "schedulable", "free_cpu", "free_mem", "free_pods", "receiver")
+
+    def __init__(self, n: dict):
+        meta, spec = n.get("metadata") or {}, n.get("spec") or {}
+        alloc = (n.get("status") or {}).get("allocatable") or {}
+        self.name = meta.get("name", "")
+        self.labels = meta.get("labels") or {}
+        self.taints = spec.get("taints") or []
+        self.schedulable = not spec.get("unschedulable")
+        self.free_cpu, self.free_mem = cpu_milli(alloc.get("cpu")), mem_bytes(alloc.get("memory"))
+        self.free_pods = int(alloc.get("pods") or 110)
+        self.receiver = False
+
+    def fits(self, spec: dict, cpu: int, mem: int) -> bool:
+        return (self.free_cpu >= cpu and self.free_mem >= mem and self.free_pods >= 1
+                and label_selector.node_selector_matches(spec, self.labels)
+                and label_selector.tolerates(spec, self.taints))
+
+    def take(self, cpu: int, mem: int, sign: int = 1):
+        self.free_cpu -= sign * cpu
+        self.free_mem -= sign * mem
+        self.free_pods -= sign
+
+def _pdb_index(pdbs: List[dict]) -> Dict[str, List[dict]]:
+    by_ns: Dict[str, List[dict]] = {}
+    for p in pdbs:
+        by_ns.setdefault((p.get("metadata") or {}).get("namespace", ""), []).append(p)
+    return by_ns
+
+def _pdb_key(p: dict) -> str:
+    m = p.get("metadata") or {}
+    return f"{m.get('namespace', '')}/{m.get('name', '')}"
+
+def build_consolidation(nodes: List[dict], pods: List[dict], pdbs: List[dict], candidates: List[str],
+                        max_nodes: int = 0, exclude_ns: str = None) -> dict:
+    """
+    candidates: tên node được phép drain (đã lọc include / exclude / tuổi / underutilized ở caller).
+    max_nodes: giới hạn số node mỗi run (0 = không giới hạn).
+    -> {"drain": [node], "moves": [{"pod", "from", "to", "cpu_m", "mem_b"}], "blocked": {node: lý do},
+        "pdb_used": {pdb: số pod evict}, "candidates": [...]}
+    """
+    state = {n["metadata"]["name"]: _Node(n) for n in nodes if (n.get("metadata") or {}).get("name")}
+    on_node: Dict[str, List[dict]] = {}
+    for p in pods:
+        nn = (p.get("spec") or {}).get("nodeName") or ""
+        if nn in state and (p.get("status") or {}).get("phase") not in ("Succeeded", "Failed"):
+            cpu, mem = pod_requests(p)
+            state[nn].take(cpu, mem)
+            on_node.setdefault(nn, []).append(p)
+
+    pdb_ns = _pdb_index(pdbs)
+    pdb_left = {_pdb_key(p): int((p.get("status") or {}).get("disruptionsAllowed") or 0) for p in pdbs}
+    cand_set = set(candidates)
+
+    def requested(name: str) -> Tuple[int, int]:
+        tot = [0, 0]
+        for p in on_node.get(name, []):
+            c, m = pod_requests(p)
+            tot[0] += c
+            tot[1] += m
+        return tot[0], tot[1]
+
+    order = sorted((c for c in candidates if c in state), key=lambda c: (requested(c), c))
+    drain: List[str] = []
+    drained = set()
+    moves: List[dict] = []
+    blocked: Dict[str, str] = {}
+    pdb_used: Dict[str, int] = {}
+
+    for name in order:
+        if max_nodes and len(drain) >= max_nodes:
+            break
+        node = state[name]
+        if node.receiver:
+            blocked[name] = "đã nhận pod dời từ node khác trong kế hoạch"
+            continue
+        to_move, reason = [], ""
+        for p in on_node.get(name, []):
+            what, why = classify(p, exclude_ns)
+            if what == "block":
+                reason = why
+                break
+            if what == "move":
+                to_move.append(p)
+        if reason:
+            blocked[name] = reason
+            continue
+
+        # PDB: cộng dồn trên cả tập drain
+        need: Dict[str, int] = {}
+        for p in to_move:
+            labels = (p.get("metadata") or {}).get("labels") or {}
+            for b in pdb_ns.get((p.get("metadata") or {}).get("namespace", ""), []):
+                if label_selector.matches((b.get("spec") or {}).get("selector"), labels):
+                    k = _pdb_key(b)
+                    need[k] = need.get(k, 0) + 1
+        over = [k for k, v in need.items() if pdb_used.get(k, 0) + v > pdb_left.get(k, 0)]
+        if over:
+            blocked[name] = f"PDB {over[0]} allowed={pdb_left.get(over[0], 0)} (cần {pdb_used.get(over[0], 0) + need[over[0]]})"
+            continue
+
+        # best-fit decreasing; thất bại -> hoàn tác các chỗ đã giữ
+        sized = sorted(((pod_requests(p), p) for p in to_move), key=lambda x: (x[0][0], x[0][1]), reverse=True)
+        placed: List[Tuple[_Node, int, int, dict]] = []
+        fail = ""
+        for (cpu, mem), p in sized:
+            spec = p.get("spec") or {}
+            best: Optional[_Node] = None
+            for t in state.values():
+                if t.name == name or t.name in drained or not t.schedulable or not t.fits(spec, cpu, mem):
+                    continue
+                # ưu tiên node không phải ứng viên, rồi node còn ít cpu nhất (vừa khít)
+                if best is None or ((t.name in cand_set, t.free_cpu - cpu, t.free_mem - mem, t.name)
+                                    < (best.name in cand_set, best.free_cpu - cpu, best.free_mem - mem, best.name)):
+                    best = t
+            if best is None:
+                fail = f"{pod_ref(p)} ({cpu}m, {mem // (1024 * 1024)}Mi) không vừa node nào"
+                break
+            best.take(cpu, mem)
+            placed.append((best, cpu, mem, p))
+        if fail:
+            for t, cpu, mem, _ in placed:
+                t.take(cpu, mem, -1)
+            blocked[name] = fail
+            continue
+
+        drain.append(name)
+        drained.add(name)
+        for k, v in need.items():
+            pdb_used[k] = pdb_used.get(k, 0) + v
+        for t, cpu, mem, p in placed:
+            t.receiver = True
+            moves.append({"pod": pod_ref(p), "from": name, "to": t.name, "cpu_m": cpu, "mem_b": mem})
+
+    return {"candidates": order, "drain": drain, "moves": moves, "blocked": blocked, "pdb_used": pdb_used}
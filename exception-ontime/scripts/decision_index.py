@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+decision_index.py
+
+Index quyết định exception do compute-active-exceptions.py ghi ra (OUT_DIR/decision_index.json),
+scaler load 1 lần mỗi tick rồi tra O(1) cho từng workload.
+
+Mỗi entry là 1 cặp ordinal ngày `[end_247, end_ow]` (0 = không có):
+  - ngày chạy <= end_247 -> "247"
+  - ngày chạy <= end_ow  -> "out_worktime"
+  - còn lại             -> "none"
+Cặp này đã gộp sẵn record cụ thể và record ALL của namespace (247 thắng out_worktime khi cả hai còn
+hiệu lực, hết hạn thì rơi xuống mode còn lại) -> scaler không parse end_date, không dò 4 biến thể ALL.
+
+Format (version 1):
+  {"version": 1, "generated_at": ..., "today": "YYYY-MM-DD",
+   "ns": {"<ns>": {"default": [e247, eow] | null, "wl": {"<workload>": [e247, eow], ...}}}}
+"""
+
+import os, json, datetime
+from typing import Dict, Iterable, List, Optional
+import columnar
+
+INDEX_VERSION = 1
+ALL_KEYS = ("_ALL_", "__ALL__", "ALL", "*")   # thứ tự ưu tiên khi 1 ns có nhiều biến thể ALL
+MODES = ("247", "out_worktime")
+NONE = (0, 0)
+
+def _ordinal(s) -> int:
+    try:
+        return datetime.date.fromisoformat(str(s)[:10]).toordinal()
+    except Exception:
+        return 0
+
+def tier_of(rec: Optional[dict]) -> tuple:
+    """record active -> (end_247, end_ow)."""
+    if not rec:
+        return NONE
+    end = _ordinal(rec.get("end_date"))
+    m = (rec.get("mode") or "").strip()
+    if m == "247":
+        return (end, 0)
+    if m == "out_worktime":
+        return (0, end)
+    return NONE
+
+def merge(a: tuple, b: tuple) -> tuple:
+    return (max(a[0], b[0]), max(a[1], b[1]))
+
+class DecisionIndex:
+    def __init__(self, doc: dict = None):
+        doc = doc or {}
+        self.today = doc.get("today", "")
+        self.default: Dict[str, tuple] = {}
+        self.wl: Dict[str, Dict[str, tuple]] = {}
+        for ns, e in (doc.get("ns") or {}).items():
+            d = e.get("default")
+            self.default[ns] = tuple(d) if d else NONE
+            self.wl[ns] = {w: tuple(t) for w, t in (e.get("wl") or {}).items()}
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.wl.values()) + sum(1 for t in self.default.values() if t != NONE)
+
+    def mode_for(self, ns: str, name: str, today_ord: int) -> str:
+        wl = self.wl.get(ns)
+        if wl is None:
+            return "none"
+        t = wl.get(name) or self.default[ns]
+        if today_ord <= t[0]:
+            return "247"
+        if today_ord <= t[1]:
+            return "out_worktime"
+        return "none"
+
+def build(records: Iterable[dict], today: datetime.date = None) -> dict:
+    """
+    records: các dòng active_exceptions.jsonl (ns, workload, mode, end_date).
+    Dòng sau cùng key ghi đè dòng trước (như load map cũ của scaler).
+    """
+    by_key: Dict[tuple, dict] = {}
+    for r in records:
+        ns = (r.get("ns") or "").strip()
+        wl = (r.get("workload") or "").strip()
+        if not ns or not wl or (r.get("mode") or "").strip() not in MODES:
+            continue
+        by_key[(ns, wl)] = r
+
+    glob: Dict[str, tuple] = {}
+    for ns in {ns for ns, _ in by_key}:
+        for k in ALL_KEYS:
+            if (ns, k) in by_key:
+                glob[ns] = tier_of(by_key[(ns, k)])
+                break
+
+    out: Dict[str, dict] = {}
+    for (ns, wl), r in sorted(by_key.items()):
+        e = out.setdefault(ns, {"default": None, "wl": {}})
+        if wl in ALL_KEYS:
+            continue
+        e["wl"][wl] = list(merge(tier_of(r), glob.get(ns, NONE)))
+    for ns, t in glob.items():
+        out.setdefault(ns, {"default": None, "wl": {}})["default"] = list(t)
+
+    return {
+        "version": INDEX_VERSION,
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "today": (today or datetime.date.today()).isoformat(),
+        "ns": {ns: out[ns] for ns in sorted(out)},
+    }
+
+def write(path: str, doc: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def read_active(path: str) -> List[dict]:
+    # snapshot cột (compute-active ghi cạnh JSONL) còn khớp -> chỉ dựng 4 field build() cần, không json.loads
+    snap = columnar.load_records(path, ["ns", "workload", "mode", "end_date"])
+    if snap is not None:
+        return snap
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                rows.append(json.loads(line))
+    return rows
+
+def load(index_path: str, active_path: str) -> DecisionIndex:
+    """
+    Đọc index nếu đúng version và không cũ hơn active_exceptions.jsonl; ngược lại build lại
+    từ active_exceptions.jsonl (trong bộ nhớ). Không có file nào -> index rỗng.
+    """
+    try:
+        st_idx = os.stat(index_path).st_mtime_ns
+    except OSError:
+        st_idx = None
+    try:
+        st_act = os.stat(active_path).st_mtime_ns
+    except OSError:
+        st_act = None
+
+    if st_idx is not None and (st_act is None or st_idx >= st_act):
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            if doc.get("version") == INDEX_VERSION:
+                return DecisionIndex(doc)
+            print(f"⚠️  {index_path}: version {doc.get('version')} != {INDEX_VERSION} → build lại từ active")
+        except Exception as e:
+            print(f"⚠️  {index_path} lỗi ({e}) → build lại từ active")
+    if st_act is None:
+        return DecisionIndex()
+    return DecisionIndex(build(read_active(active_path)))
@@ -14,15 +14,30 @@ Inputs (env):
   DEBUG_DUMP_GROUPS = 0/1
   FILTER_NS       = only include namespace (exact match)
   FILTER_WL       = only include workload (exact match)
+  DEDUPE_INCREMENTAL = 0/1  (1 = chỉ parse RAW mới/đổi, phần còn lại lấy từ checkpoint)
+  CHECKPOINT_FILE = OUT_DIR/.dedupe-checkpoint.json
+  EXCEPTION_STORE = files | store  (store: đọc RAW qua exception_store, compact log định kỳ)
+  STORE_ROOT      = /data/exceptions/store
+  DEDUPE_WORKERS  = 1  (>1: parse RAW song song bằng process pool, gộp theo thứ tự file; 0 = số CPU)
+
+Incremental:
+  checkpoint = manifest các RAW đã xử lý (path, size, mtime, sha256) + aggregate từng file
+  theo ns|workload|end_date. Run sau chỉ parse file mới/đổi (size/mtime khác và sha256 khác),
+  file không còn trong LOOKBACK bị bỏ khỏi checkpoint; manifest hỏng/khác version/RAW_ROOT -> full rebuild.
+  Gộp aggregate theo thứ tự file như full run nên output giống hệt từng byte.
 
 Outputs:
   polished_exceptions.jsonl / .csv
+  polished_exceptions.col  (chỉ khi COLUMNAR_SNAPSHOT=1: snapshot cột cho compute-active, xem columnar.py)
+  .dedupe-started          (mtime = lúc bắt đầu đọc RAW của lần chạy thành công cuối; Jenkins so -newer file này)
   invalid.jsonl
   digest_exceptions.csv
   digest_exceptions.webex.md
   digest_exceptions.html
 """
-import os, sys, re, json, csv, datetime, time
+import os, sys, re, json, csv, datetime, time, hashlib, multiprocessing
+import exception_store
+import columnar
 from collections import defaultdict
 
 # ---------- Config via env ----------
@@ -37,6 +52,16 @@ DEBUG_DUMP_RAW     = os.environ.get("DEBUG_DUMP_RAW", "0").lower() in ("1","true
 DEBUG_DUMP_GROUPS  = os.environ.get("DEBUG_DUMP_GROUPS", "0").lower() in ("1","true","yes")
 FILTER_NS          = os.environ.get("FILTER_NS", "").strip()
 FILTER_WL          = os.environ.get("FILTER_WL", "").strip()
+DEDUPE_INCREMENTAL = os.environ.get("DEDUPE_INCREMENTAL", "0").lower() in ("1","true","yes")
+CHECKPOINT_FILE    = os.environ.get("CHECKPOINT_FILE", "").strip() or os.path.join(OUT_DIR, ".dedupe-checkpoint.json")
+CHECKPOINT_VERSION = 1
+# mốc cho bước "Skip if RAW unchanged" của dedupe.JenkinsFile: RAW ghi sau mốc này (kể cả trong lúc run đang chạy)
+# luôn mới hơn mốc -> run sau vẫn bắt được; chỉ đưa vào chỗ khi run thành công
+STARTED_MARKER     = os.path.join(OUT_DIR, ".dedupe-started")
+# files = quét RAW_ROOT/<ngày>/raw-*.jsonl | store = đọc qua exception_store (STORE_ROOT)
+EXCEPTION_STORE    = os.environ.get("EXCEPTION_STORE", "files").lower()
+# số process parse RAW song song: 1 = tuần tự, 0 = theo số CPU
+DEDUPE_WORKERS     = int(os.environ.get("DEDUPE_WORKERS", "1"))
 
 # ---------- Helpers ----------
 def ensure_dir(p): os.makedirs(p, exist_ok=True)
@@ -84,17 +109,21 @@ def discovered_raw_files(raw_root: str, lookback_days: int):
                     files.append(path)
     return sorted(files)
 
-def read_raw_lines(path: str):
+def _file_lines(path: str):
     with open(path, "r", encoding="utf-8") as f:
         for i, line in enumerate(f, 1):
-            raw = line.rstrip("\n")
-            line = raw.strip()
-            if not line:
-                continue
-            try:
-                yield i, raw, json.loads(line)
-            except Exception:
-                yield i, raw, {"_invalid": True, "_reason": "json_parse_error"}
+            yield i, line.rstrip("\n")
+
+def read_raw_lines(path: str, numbered=None):
+    # numbered = [(số dòng, dòng gốc)] lấy từ exception_store.RawView; None = đọc file RAW thật
+    for i, raw in (numbered if numbered is not None else _file_lines(path)):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            yield i, raw, json.loads(line)
+        except Exception:
+            yield i, raw, {"_invalid": True, "_reason": "json_parse_error"}
 
 def keep_rec(ns: str, wl: str) -> bool:
     if FILTER_NS and ns != FILTER_NS:
@@ -109,6 +138,370 @@ def mode_human(m: str) -> str:
 def esc_html(s: str) -> str:
     return (s or "").replace("&","&amp;").replace("<","&lt;").replace(">","&gt;")
 
+def parse_created_at(ca_raw: str):
+    try:
+        return datetime.datetime.fromisoformat(ca_raw.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+# ---------- Per-file aggregate ----------
+# Mỗi RAW file -> {"lines", "parsed_ok", "invalid": [...], "groups": {ns|wl: {"ns","workload","buckets"}}}
+# bucket = aggregate các record cùng end_date (key "" = không có end_date), đủ để dựng lại output
+# của aggregate_for mà không cần giữ từng record.
+def new_bucket() -> dict:
+    return {"modes": set(), "requesters": set(), "reasons": set(), "patchers": set(), "sources": set(),
+            "last_dt": None, "last_raw": None, "fallback_raw": None}
+
+def merge_bucket(dst: dict, src: dict):
+    for k in ("modes", "requesters", "reasons", "patchers", "sources"):
+        dst[k].update(src[k])
+    # created_at lớn nhất, bằng nhau thì giữ cái gặp trước (như aggregate_for cũ)
+    if src["last_dt"] is not None and (dst["last_dt"] is None or src["last_dt"] > dst["last_dt"]):
+        dst["last_dt"] = src["last_dt"]
+        dst["last_raw"] = src["last_raw"]
+    # created_at không parse được: chỉ dùng khi cả nhóm không có created_at hợp lệ -> lấy max text
+    if src["fallback_raw"] is not None and (dst["fallback_raw"] is None or src["fallback_raw"] > dst["fallback_raw"]):
+        dst["fallback_raw"] = src["fallback_raw"]
+
+def fold_groups(groups: dict, part_groups: dict):
+    """Gộp groups của một file vào groups tổng, giữ thứ tự xuất hiện đầu tiên của key."""
+    for key, pg in part_groups.items():
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = {"ns": pg["ns"], "workload": pg["workload"], "buckets": {}}
+        for ed, b in pg["buckets"].items():
+            if ed not in g["buckets"]:
+                g["buckets"][ed] = new_bucket()
+            merge_bucket(g["buckets"][ed], b)
+
+def parse_raw_file(path: str, numbered=None) -> dict:
+    part = {"lines": 0, "parsed_ok": 0, "invalid": [], "groups": {}}
+    groups = part["groups"]
+    invalid_records = part["invalid"]
+    if DEBUG_DUMP_RAW:
+        print(f"\n[RAW] File: {path}")
+    for ln, raw_line, r in read_raw_lines(path, numbered):
+        part["lines"] += 1
+        ns = (r.get("ns") or "").strip() if isinstance(r, dict) else ""
+        wl = (r.get("workload") or "").strip() if isinstance(r, dict) else ""
+
+        if DEBUG_DUMP_RAW and keep_rec(ns, wl):
+            print(f"  [LN {ln:>3}] raw: {raw_line}")
+        if r.get("_invalid"):
+            invalid_records.append({"source": path, "line": ln, "reason": r.get("_reason","parse_error")})
+            if DEBUG_DUMP_RAW and keep_rec(ns, wl):
+                print(f"            parsed: <INVALID: {r.get('_reason')}>")
+            continue
+
+        # parsed view
+        end_in = r.get("end_input") or r.get("end_date") or ""
+        end_dt = parse_date(end_in) or parse_date(r.get("end_date") or "")
+        m247 = as_bool(r.get("on_exeption_247"))
+        mow  = as_bool(r.get("on_exeption_out_worktime"))
+        requester = (r.get("requester") or "").strip()
+        reason    = (r.get("reason") or "").strip()
+        patcher   = (r.get("created_by") or "").strip()
+        if DEBUG_DUMP_RAW and keep_rec(ns, wl):
+            print(f"            parsed: ns={ns}, wl={wl}, m247={m247}, out={mow}, end_in='{end_in}', end_dt={end_dt}, requester='{requester}', reason='{reason}', patcher='{patcher}'")
+
+        if not ns or not wl:
+            invalid_records.append({"source": path, "line": ln, "reason": "missing_ns_or_workload"})
+            continue
+        if not (m247 or mow):
+            invalid_records.append({"source": path, "line": ln, "reason": "no_mode", "ns":ns, "workload":wl})
+            continue
+
+        key = f"{ns}|{wl}"
+        if key not in groups:
+            groups[key] = {"ns": ns, "workload": wl, "buckets": {}}
+        ed = end_dt.isoformat() if end_dt else ""
+        b = groups[key]["buckets"].get(ed)
+        if b is None:
+            b = groups[key]["buckets"][ed] = new_bucket()
+
+        if m247:
+            b["modes"].add("247")
+        if mow:
+            b["modes"].add("out_worktime")
+        if requester:
+            b["requesters"].add(requester)
+        if reason:
+            b["reasons"].add(reason)
+        if patcher:
+            b["patchers"].add(patcher)
+        b["sources"].add(f"{os.path.basename(path)}:{r.get('req_id','?')}#{r.get('seq','?')}")
+
+        ca_raw = (r.get("created_at") or "").strip()
+        ca_dt = parse_created_at(ca_raw) if ca_raw else None
+        merge_bucket(b, {"modes": (), "requesters": (), "reasons": (), "patchers": (), "sources": (),
+                         "last_dt": ca_dt, "last_raw": ca_raw if ca_dt else None,
+                         "fallback_raw": ca_raw if (ca_raw and ca_dt is None) else None})
+        part["parsed_ok"] += 1
+    return part
+
+# ---------- Checkpoint (DEDUPE_INCREMENTAL) ----------
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_stat(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def part_to_json(part: dict) -> dict:
+    groups = {}
+    for key, g in part["groups"].items():
+        buckets = {}
+        for ed, b in g["buckets"].items():
+            buckets[ed] = {k: sorted(b[k]) for k in ("modes", "requesters", "reasons", "patchers", "sources")}
+            buckets[ed]["last_raw"] = b["last_raw"]
+            buckets[ed]["fallback_raw"] = b["fallback_raw"]
+        groups[key] = {"ns": g["ns"], "workload": g["workload"], "buckets": buckets}
+    return {"lines": part["lines"], "parsed_ok": part["parsed_ok"], "invalid": part["invalid"], "groups": groups}
+
+def part_from_json(obj: dict) -> dict:
+    groups = {}
+    for key, g in obj["groups"].items():
+        buckets = {}
+        for ed, jb in g["buckets"].items():
+            b = new_bucket()
+            for k in ("modes", "requesters", "reasons", "patchers", "sources"):
+                b[k] = set(jb[k])
+            if jb.get("last_raw"):
+                b["last_dt"] = parse_created_at(jb["last_raw"])
+                b["last_raw"] = jb["last_raw"]
+            b["fallback_raw"] = jb.get("fallback_raw")
+            buckets[ed] = b
+        groups[key] = {"ns": g["ns"], "workload": g["workload"], "buckets": buckets}
+    return {"lines": obj["lines"], "parsed_ok": obj["parsed_ok"], "invalid": obj["invalid"], "groups": groups}
+
+def load_checkpoint(path: str) -> dict:
+    """Trả về {path: entry} từ checkpoint; {} nếu không có/hỏng/khác version/RAW_ROOT (-> full rebuild)."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            ck = json.load(f)
+        if ck.get("version") != CHECKPOINT_VERSION or ck.get("raw_root") != RAW_ROOT:
+            print("⚠️  checkpoint version/RAW_ROOT mismatch -> full rebuild")
+            return {}
+        files = ck["files"]
+        if not all({"size", "mtime_ns", "sha256", "part"} <= set(ent) for ent in files.values()):
+            raise ValueError("manifest entry missing fields")
+        return files
+    except Exception as e:
+        print(f"⚠️  checkpoint invalid ({e}) -> full rebuild")
+        return {}
+
+def save_checkpoint(path: str, files: dict):
+    ensure_dir(os.path.dirname(path) or ".")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CHECKPOINT_VERSION, "raw_root": RAW_ROOT, "files": files},
+                  f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def _parse_job(job) -> dict:
+    path, numbered = job
+    return parse_raw_file(path, numbered)
+
+def parse_many(paths: list, view=None):
+    """
+    Yield aggregate của từng path theo đúng thứ tự paths.
+    DEDUPE_WORKERS > 1: shard qua process pool; imap trả kết quả theo thứ tự input nên gộp ở parent
+    vẫn xác định (cùng output với chạy tuần tự). DEBUG_DUMP_RAW in từng dòng -> luôn tuần tự.
+    """
+    jobs = ((p, list(view.lines(p)) if view is not None else None) for p in paths)
+    workers = DEDUPE_WORKERS if DEDUPE_WORKERS > 0 else (os.cpu_count() or 1)
+    workers = min(workers, len(paths))
+    if workers <= 1 or DEBUG_DUMP_RAW:
+        for job in jobs:
+            yield _parse_job(job)
+        return
+    chunk = max(1, len(paths) // (workers * 4))
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(_parse_job, jobs, chunksize=chunk)
+
+def iter_parts(raw_files: list, incremental: bool, view=None, stats: dict = None):
+    """
+    Yield aggregate từng file theo đúng thứ tự raw_files (caller gộp xong thì bỏ, không giữ cả list).
+    incremental: file có size/mtime như manifest -> dùng lại; khác -> so sha256, khác nữa mới parse lại.
+    stats được điền reused/parsed/dropped; checkpoint ghi sau khi duyệt hết.
+    """
+    stats = stats if stats is not None else {}
+    stats.update({"reused": 0, "parsed": 0, "dropped": 0})
+    if not incremental:
+        for part in parse_many(raw_files, view):
+            stats["parsed"] += 1
+            yield part
+        return
+
+    old = load_checkpoint(CHECKPOINT_FILE)
+    files = {}
+    dirty = not old
+    # lượt 1: quyết định file nào dùng lại, file nào phải parse (để parse_many chạy song song cả lô)
+    plan = []
+    for p in raw_files:
+        ent = old.get(p)
+        try:
+            st = view.stat(p) if view is not None else file_stat(p)
+        except OSError:
+            st = {"size": -1, "mtime_ns": -1}
+        if ent and ent["size"] == st["size"] and ent["mtime_ns"] == st["mtime_ns"]:
+            plan.append((p, ent, None))
+            continue
+        digest = view.sha256(p) if view is not None else file_sha256(p)
+        if ent and ent["sha256"] == digest:
+            plan.append((p, {**ent, **st}, None))
+        else:
+            plan.append((p, None, {**st, "sha256": digest}))
+        dirty = True
+
+    parsed = parse_many([p for p, ent, _ in plan if ent is None], view)
+    for p, ent, new in plan:
+        if ent is not None:
+            part = part_from_json(ent["part"])
+            files[p] = ent
+            stats["reused"] += 1
+        else:
+            part = next(parsed)
+            files[p] = {**new, "part": part_to_json(part)}
+            stats["parsed"] += 1
+        yield part
+    stats["dropped"] = len(set(old) - set(files))
+    if dirty or stats["dropped"]:
+        save_checkpoint(CHECKPOINT_FILE, files)
+
+# ---------- Output sinks ----------
+# thứ tự cột = thứ tự key của record polished -> `columnar.py dump` in lại đúng từng dòng JSONL
+POLISHED_COLUMNS = ["ns", "workload", "mode_effective", "modes", "end_date", "days_left",
+                    "requesters", "reasons", "patchers", "sources", "sources_count", "last_updated_at"]
+
+class OutputSinks:
+    """
+    Fan-out 1 lượt duy nhất ra polished JSONL/CSV, invalid.jsonl và digest CSV/Markdown/HTML.
+    Đếm polished / invalid (kèm breakdown theo reason) ngay khi ghi -> không đọc lại file vừa ghi.
+    Digest cần sort theo days_left nên giữ 1 dòng gọn cho mỗi group polished, ghi ra khi close().
+    """
+
+    def __init__(self, out_dir: str):
+        self.polished_jsonl = os.path.join(out_dir, "polished_exceptions.jsonl")
+        self.polished_csv   = os.path.join(out_dir, "polished_exceptions.csv")
+        self.invalid_jsonl  = os.path.join(out_dir, "invalid.jsonl")
+        self.digest_csv     = os.path.join(out_dir, "digest_exceptions.csv")
+        self.digest_md      = os.path.join(out_dir, "digest_exceptions.webex.md")
+        self.digest_html    = os.path.join(out_dir, "digest_exceptions.html")
+
+        self.valid_count = 0
+        self.invalid_count = 0
+        self.invalid_reasons = defaultdict(int)
+        self.digest_rows = []
+
+        self._fj = open(self.polished_jsonl, "w", encoding="utf-8")
+        self._fc = open(self.polished_csv, "w", newline="", encoding="utf-8")
+        self._fi = open(self.invalid_jsonl, "w", encoding="utf-8")
+        self._cw = csv.writer(self._fc)
+        self._col = columnar.Writer(columnar.snapshot_path(self.polished_jsonl), POLISHED_COLUMNS) if columnar.ENABLED else None
+        self._cw.writerow([
+            "ns","workload","mode_effective","modes","end_date","days_left",
+            "requesters","reasons","patchers","sources_count","last_updated_at"
+        ])
+
+    def invalid(self, obj: dict, ensure_ascii: bool = True):
+        self._fi.write(json.dumps(obj, ensure_ascii=ensure_ascii) + "\n")
+        self.invalid_count += 1
+        self.invalid_reasons[obj.get("reason","(none)")] += 1
+
+    def polished(self, record: dict):
+        ns = record["ns"]; wl = record["workload"]; dl = record["days_left"]
+        self._fj.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self._col:
+            self._col.add(record)
+        self._cw.writerow([
+            ns,
+            wl,
+            record["mode_effective"],
+            ";".join(record["modes"]),
+            record["end_date"],
+            dl,
+            ";".join(record["requesters"]),
+            ";".join(record["reasons"]),
+            ";".join(record["patchers"]),
+            record["sources_count"],
+            record["last_updated_at"] or "",
+        ])
+        self.valid_count += 1
+
+        self.digest_rows.append({
+            "ns": ns,
+            "workload": wl,
+            "mode": mode_human(record["mode_effective"]),
+            "end": record["end_date"],
+            "days_left": dl,
+            "reasons": ";".join(record["reasons"]),
+            "requesters": ";".join(record["requesters"]),
+            "patchers": ";".join(record["patchers"]),
+            "tag": "⚠️" if dl <= 3 else "",
+        })
+
+    def close(self):
+        for f in (self._fj, self._fc, self._fi):
+            f.close()
+        if self._col:
+            # ghi sau khi đóng JSONL: chữ ký (size, mtime) của JSONL là bản cuối
+            self._col.close(self.polished_jsonl)
+        self._write_digest()
+
+    def _write_digest(self):
+        digest_rows = self.digest_rows
+        digest_rows.sort(key=lambda r: (r["days_left"], r["ns"].lower(), r["workload"].lower()))
+
+        # CSV
+        with open(self.digest_csv, "w", newline="", encoding="utf-8") as fdc:
+            w = csv.writer(fdc)
+            w.writerow(["NS","Workload","Mode","End","D-left","Tag","Reason(s)","Requester(s)","Patcher(s)"])
+            for r in digest_rows:
+                w.writerow([
+                    r["ns"], r["workload"], r["mode"], r["end"],
+                    r["days_left"], r["tag"], r["reasons"], r["requesters"], r["patchers"]
+                ])
+
+        # Webex Markdown
+        with open(self.digest_md, "w", encoding="utf-8") as fdm:
+            fdm.write("| NS | Workload | Mode | End | D-left | Tag | Reason(s) | Requester(s) | Patcher(s) |\n")
+            fdm.write("| --- | --- | --- | --- | ---: | :-: | --- | --- | --- |\n")
+            for r in digest_rows:
+                fdm.write(
+                    f"| {r['ns']} | {r['workload']} | {r['mode']} | {r['end']} | {r['days_left']} | {r['tag']} | "
+                    f"{r['reasons']} | {r['requesters']} | {r['patchers']} |\n"
+                )
+
+        # HTML
+        with open(self.digest_html, "w", encoding="utf-8") as fdh:
+            fdh.write("<!doctype html><meta charset='utf-8'>\n")
+            fdh.write("<style>table{border-collapse:collapse;font:14px sans-serif} th,td{border:1px solid #ddd;padding:6px 8px} th{background:#f6f6f6} .hot{background:#fff3cd}</style>\n")
+            fdh.write("<table><thead><tr>"
+                      "<th>NS</th><th>Workload</th><th>Mode</th><th>End</th>"
+                      "<th style='text-align:right'>D-left</th><th>Tag</th><th>Reason(s)</th><th>Requester(s)</th><th>Patcher(s)</th>"
+                      "</tr></thead><tbody>\n")
+            for r in digest_rows:
+                cls = " class='hot'" if r["tag"] == "⚠️" else ""
+                fdh.write(
+                    f"<tr{cls}><td>{esc_html(r['ns'])}</td>"
+                    f"<td>{esc_html(r['workload'])}</td>"
+                    f"<td>{esc_html(r['mode'])}</td>"
+                    f"<td>{esc_html(r['end'])}</td>"
+                    f"<td style='text-align:right'>{r['days_left']}</td>"
+                    f"<td style='text-align:center'>{esc_html(r['tag'])}</td>"
+                    f"<td>{esc_html(r['reasons'])}</td>"
+                    f"<td>{esc_html(r['requesters'])}</td>"
+                    f"<td>{esc_html(r['patchers'])}</td></tr>\n"
+                )
+            fdh.write("</tbody></table>\n")
+
 # ---------- Main ----------
 def main():
     ensure_dir(OUT_DIR)
@@ -134,133 +527,64 @@ def main():
             if FILTER_NS or FILTER_WL:
                 print(f"[DEBUG] FILTER_NS={FILTER_NS or '*'}, FILTER_WL={FILTER_WL or '*'}")
 
-        raw_files = discovered_raw_files(RAW_ROOT, LOOKBACK_DAYS)
+        view = None
+        if EXCEPTION_STORE == "store":
+            store = exception_store.ExceptionStore()
+            boot = store.bootstrap(RAW_ROOT)
+            if boot:
+                print(f"📥 Store mới: import RAW_ROOT -> files={boot[0]} lines={boot[1]}")
+            res = store.maybe_compact()
+            if res:
+                print(f"🗜️  Store compacted: {res}")
+        # mốc ghi sau compact (compact của chính run này không làm Jenkins trigger lại), trước khi đọc input
+        started_tmp = STARTED_MARKER + ".tmp"
+        with open(started_tmp, "w", encoding="utf-8") as f:
+            f.write(datetime.datetime.now().isoformat(timespec="seconds") + "\n")
+        if EXCEPTION_STORE == "store":
+            view = store.raw_view(RAW_ROOT, LOOKBACK_DAYS)
+            raw_files = view.files()
+        else:
+            raw_files = discovered_raw_files(RAW_ROOT, LOOKBACK_DAYS)
         if DEBUG:
             print(f"[DEBUG] Found {len(raw_files)} raw file(s):")
             for p in raw_files[:20]:
                 print(f"        - {p}")
 
         groups = {}      # key -> aggregate (per ns|workload only, NO overlay)
-        invalid_records = []
-        reason_counts = defaultdict(int)
         total_lines = 0
         parsed_ok = 0
 
-        # --- pass 1: read raw & optionally dump each line
-        for path in raw_files:
-            if DEBUG_DUMP_RAW:
-                print(f"\n[RAW] File: {path}")
-            for ln, raw_line, r in read_raw_lines(path):
-                total_lines += 1
-                ns = (r.get("ns") or "").strip() if isinstance(r, dict) else ""
-                wl = (r.get("workload") or "").strip() if isinstance(r, dict) else ""
-
-                if DEBUG_DUMP_RAW and keep_rec(ns, wl):
-                    print(f"  [LN {ln:>3}] raw: {raw_line}")
-                if r.get("_invalid"):
-                    invalid_records.append({"source": path, "line": ln, "reason": r.get("_reason","parse_error")})
-                    reason_counts[r.get("_reason","parse_error")] += 1
-                    if DEBUG_DUMP_RAW and keep_rec(ns, wl):
-                        print(f"            parsed: <INVALID: {r.get('_reason')}>")
-                    continue
-
-                # parsed view
-                end_in = r.get("end_input") or r.get("end_date") or ""
-                end_dt = parse_date(end_in) or parse_date(r.get("end_date") or "")
-                m247 = as_bool(r.get("on_exeption_247"))
-                mow  = as_bool(r.get("on_exeption_out_worktime"))
-                requester = (r.get("requester") or "").strip()
-                reason    = (r.get("reason") or "").strip()
-                patcher   = (r.get("created_by") or "").strip()
-                if DEBUG_DUMP_RAW and keep_rec(ns, wl):
-                    print(f"            parsed: ns={ns}, wl={wl}, m247={m247}, out={mow}, end_in='{end_in}', end_dt={end_dt}, requester='{requester}', reason='{reason}', patcher='{patcher}'")
-
-                if not ns or not wl:
-                    invalid_records.append({"source": path, "line": ln, "reason": "missing_ns_or_workload"})
-                    reason_counts["missing_ns_or_workload"] += 1
-                    continue
-                if not (m247 or mow):
-                    invalid_records.append({"source": path, "line": ln, "reason": "no_mode", "ns":ns, "workload":wl})
-                    reason_counts["no_mode"] += 1
-                    continue
-
-                key = f"{ns}|{wl}"
-                if key not in groups:
-                    groups[key] = {
-                        "ns": ns,
-                        "workload": wl,
-                        "records": [],
-                    }
-
-                ca_raw = (r.get("created_at") or "").strip()
-                try:
-                    ca_dt = datetime.datetime.fromisoformat(ca_raw.replace("Z", "+00:00"))
-                except Exception:
-                    ca_dt = None
-
-                record_modes = set()
-                if m247:
-                    record_modes.add("247")
-                if mow:
-                    record_modes.add("out_worktime")
-
-                src_id = f"{os.path.basename(path)}:{r.get('req_id','?')}#{r.get('seq','?')}"
-
-                groups[key]["records"].append({
-                    "end_dt": end_dt,
-                    "modes": record_modes,
-                    "requester": requester,
-                    "reason": reason,
-                    "patcher": patcher,
-                    "created_at": ca_dt,
-                    "created_at_raw": ca_raw or None,
-                    "source": src_id,
-                })
-                parsed_ok += 1
+        # outputs mở trước pass 1: invalid của từng dòng RAW ghi thẳng ra sink, không gom list
+        sinks = OutputSinks(OUT_DIR)
+        try:
+            # --- pass 1: read raw (hoặc lấy aggregate từng file từ checkpoint) & gộp theo thứ tự file
+            # DEBUG_DUMP_RAW cần in lại từng dòng -> luôn parse full
+            inc_stats = {}
+            for part in iter_parts(raw_files, DEDUPE_INCREMENTAL and not DEBUG_DUMP_RAW, view, inc_stats):
+                total_lines += part["lines"]
+                parsed_ok += part["parsed_ok"]
+                for inv in part["invalid"]:
+                    sinks.invalid(inv, ensure_ascii=False)
+                fold_groups(groups, part["groups"])
+            if DEDUPE_INCREMENTAL:
+                print(f"♻️  Incremental: reused={inc_stats['reused']}, parsed={inc_stats['parsed']}, dropped={inc_stats['dropped']}")
 
-        # --- optional dump groups before filtering
-        if DEBUG_DUMP_GROUPS:
-            print("\n[DEBUG] GROUPS (pre-filter):")
-            for key in sorted(groups.keys(), key=lambda x: x.lower()):
-                g = groups[key]
-                if not keep_rec(g["ns"], g["workload"]):
-                    continue
-                print(f"  - {key}")
-                for idx, rec in enumerate(g["records"], 1):
-                    ed = rec["end_dt"].isoformat() if rec["end_dt"] else None
-                    dl = days_left(rec["end_dt"], today) if rec["end_dt"] else None
-                    ca_repr = rec["created_at"].isoformat() if rec["created_at"] else rec.get("created_at_raw")
-                    print(
-                        f"      [{idx:>2}] end={ed} days_left={dl} modes={sorted(rec['modes'])} "
-                        f"requester={rec['requester']!r} reason={rec['reason']!r} "
-                        f"patcher={rec['patcher']!r} created_at={ca_repr} source={rec['source']}"
-                    )
-
-        # write outputs
-        polished_jsonl = os.path.join(OUT_DIR, "polished_exceptions.jsonl")
-        polished_csv   = os.path.join(OUT_DIR, "polished_exceptions.csv")
-        invalid_jsonl  = os.path.join(OUT_DIR, "invalid.jsonl")
-
-        digest_csv   = os.path.join(OUT_DIR, "digest_exceptions.csv")
-        digest_md    = os.path.join(OUT_DIR, "digest_exceptions.webex.md")
-        digest_html  = os.path.join(OUT_DIR, "digest_exceptions.html")
-
-        valid_count = 0
-        digest_rows = []
-
-        with open(polished_jsonl, "w", encoding="utf-8") as fj, \
-             open(polished_csv, "w", newline="", encoding="utf-8") as fc, \
-             open(invalid_jsonl, "w", encoding="utf-8") as fi:
-
-            cw = csv.writer(fc)
-            cw.writerow([
-                "ns","workload","mode_effective","modes","end_date","days_left",
-                "requesters","reasons","patchers","sources_count","last_updated_at"
-            ])
-
-            # flush invalids from parsing stage
-            for inv in invalid_records:
-                fi.write(json.dumps(inv, ensure_ascii=False) + "\n")
+            # --- optional dump groups before filtering
+            if DEBUG_DUMP_GROUPS:
+                print("\n[DEBUG] GROUPS (pre-filter):")
+                for key in sorted(groups.keys(), key=lambda x: x.lower()):
+                    g = groups[key]
+                    if not keep_rec(g["ns"], g["workload"]):
+                        continue
+                    print(f"  - {key}")
+                    for idx, (ed, b) in enumerate(sorted(g["buckets"].items()), 1):
+                        dl = days_left(datetime.date.fromisoformat(ed), today) if ed else None
+                        ca_repr = b["last_dt"].isoformat() if b["last_dt"] else b["fallback_raw"]
+                        print(
+                            f"      [{idx:>2}] end={ed or None} days_left={dl} modes={sorted(b['modes'])} "
+                            f"requesters={sorted(b['requesters'])} reasons={sorted(b['reasons'])} "
+                            f"patchers={sorted(b['patchers'])} last_updated_at={ca_repr} sources={sorted(b['sources'])}"
+                        )
 
             for key in sorted(groups.keys(), key=lambda x: x.lower()):
                 g = groups[key]
@@ -269,215 +593,91 @@ def main():
                 if not keep_rec(ns, wl):
                     continue
 
-                records = g.get("records", [])
-                if not records:
+                buckets = g.get("buckets", {})
+                if not buckets:
                     rec = {"ns": ns, "workload": wl, "reason": "no_records"}
-                    fi.write(json.dumps(rec) + "\n")
+                    sinks.invalid(rec)
                     continue
 
-                def records_matching(end_date, pool):
-                    return [rec for rec in pool if rec["end_dt"] == end_date]
-
-                def aggregate_for(end_date, candidates):
-                    modes_acc = set()
-                    requesters_acc = set()
-                    reasons_acc = set()
-                    patchers_acc = set()
-                    sources_acc = []
-                    seen_sources = set()
-                    last_updated_dt = None
-                    last_updated_raw = None
-
-                    for item in candidates:
-                        modes_acc.update(item["modes"])
-                        if item["requester"]:
-                            requesters_acc.add(item["requester"])
-                        if item["reason"]:
-                            reasons_acc.add(item["reason"])
-                        if item["patcher"]:
-                            patchers_acc.add(item["patcher"])
-                        if item["source"] and item["source"] not in seen_sources:
-                            sources_acc.append(item["source"])
-                            seen_sources.add(item["source"])
-                        if item["created_at"] is not None and (
-                            last_updated_dt is None or item["created_at"] > last_updated_dt
-                        ):
-                            last_updated_dt = item["created_at"]
-                            last_updated_raw = item.get("created_at_raw")
-                        elif last_updated_dt is None and item.get("created_at_raw"):
-                            # fallback to textual timestamp when datetime parsing failed
-                            raw_val = item.get("created_at_raw")
-                            if last_updated_raw is None or raw_val > last_updated_raw:
-                                last_updated_raw = raw_val
-
-                    if not modes_acc:
+                def aggregate_for(end_date):
+                    b = buckets[end_date.isoformat()]
+                    if not b["modes"]:
                         return None
 
-                    mode_eff_val = "247" if "247" in modes_acc else "out_worktime"
+                    mode_eff_val = "247" if "247" in b["modes"] else "out_worktime"
                     dl_val = days_left(end_date, today)
-                    sources_acc.sort()
+                    sources_acc = sorted(b["sources"])
 
                     return {
                         "ns": ns,
                         "workload": wl,
                         "mode_effective": mode_eff_val,
-                        "modes": sorted(modes_acc),
+                        "modes": sorted(b["modes"]),
                         "end_date": end_date.isoformat(),
                         "days_left": dl_val,
-                        "requesters": sorted(requesters_acc),
-                        "reasons": sorted(reasons_acc),
-                        "patchers": sorted(patchers_acc),
+                        "requesters": sorted(b["requesters"]),
+                        "reasons": sorted(b["reasons"]),
+                        "patchers": sorted(b["patchers"]),
                         "sources": sources_acc,
                         "sources_count": len(sources_acc),
                         "last_updated_at": (
-                            last_updated_dt.isoformat()
-                            if last_updated_dt is not None
-                            else last_updated_raw
+                            b["last_dt"].isoformat()
+                            if b["last_dt"] is not None
+                            else b["fallback_raw"]
                         ),
                     }
 
-                valid_records = [rec for rec in records if rec["end_dt"] and 0 <= days_left(rec["end_dt"], today) <= MAX_DAYS]
+                all_dates = [datetime.date.fromisoformat(ed) for ed in buckets if ed]
+                valid_dates = [d for d in all_dates if 0 <= days_left(d, today) <= MAX_DAYS]
 
-                if valid_records:
-                    end_d = max(rec["end_dt"] for rec in valid_records)
-                    chosen = records_matching(end_d, valid_records)
-                    record = aggregate_for(end_d, chosen)
+                if valid_dates:
+                    end_d = max(valid_dates)
+                    record = aggregate_for(end_d)
                     if record is None:
                         inv = {"ns": ns, "workload": wl, "reason": "no_mode"}
-                        fi.write(json.dumps(inv) + "\n")
+                        sinks.invalid(inv)
                         continue
 
                     dl = record["days_left"]
                     if not (0 <= dl <= MAX_DAYS):
                         inv = {**record, "reason": "all_outside_window"}
-                        try:
-                            all_dates = [rec["end_dt"] for rec in records if rec["end_dt"]]
-                            inv["latest_end"] = max(all_dates).isoformat() if all_dates else None
-                        except Exception:
-                            pass
-                        fi.write(json.dumps(inv, ensure_ascii=False) + "\n")
+                        inv["latest_end"] = max(all_dates).isoformat() if all_dates else None
+                        sinks.invalid(inv, ensure_ascii=False)
                         continue
 
-                    fj.write(json.dumps(record, ensure_ascii=False) + "\n")
-                    cw.writerow([
-                        ns,
-                        wl,
-                        record["mode_effective"],
-                        ";".join(record["modes"]),
-                        record["end_date"],
-                        dl,
-                        ";".join(record["requesters"]),
-                        ";".join(record["reasons"]),
-                        ";".join(record["patchers"]),
-                        record["sources_count"],
-                        record["last_updated_at"] or "",
-                    ])
-                    valid_count += 1
-
-                    digest_rows.append({
-                        "ns": ns,
-                        "workload": wl,
-                        "mode": mode_human(record["mode_effective"]),
-                        "end": record["end_date"],
-                        "days_left": dl,
-                        "reasons": ";".join(record["reasons"]),
-                        "requesters": ";".join(record["requesters"]),
-                        "patchers": ";".join(record["patchers"]),
-                        "tag": "⚠️" if dl <= 3 else "",
-                    })
+                    sinks.polished(record)
                     continue
 
                 # No valid records inside window
-                all_dates = [rec["end_dt"] for rec in records if rec["end_dt"]]
                 end_d = max(all_dates) if all_dates else None
                 if not end_d:
                     rec = {"ns": ns, "workload": wl, "reason": "missing_end_date"}
-                    fi.write(json.dumps(rec) + "\n")
+                    sinks.invalid(rec)
                     continue
 
-                chosen = records_matching(end_d, records)
-                record = aggregate_for(end_d, chosen)
+                record = aggregate_for(end_d)
                 if record is None:
                     inv = {"ns": ns, "workload": wl, "reason": "no_mode"}
-                    fi.write(json.dumps(inv) + "\n")
+                    sinks.invalid(inv)
                     continue
 
                 inv = {**record, "reason": "all_outside_window"}
                 inv["latest_end"] = record["end_date"]
-                fi.write(json.dumps(inv, ensure_ascii=False) + "\n")
-
-        # ---- DIGEST OUTPUTS (human-friendly) ----
-        digest_rows.sort(key=lambda r: (r["days_left"], r["ns"].lower(), r["workload"].lower()))
-
-        # CSV
-        with open(digest_csv, "w", newline="", encoding="utf-8") as fdc:
-            w = csv.writer(fdc)
-            w.writerow(["NS","Workload","Mode","End","D-left","Tag","Reason(s)","Requester(s)","Patcher(s)"])
-            for r in digest_rows:
-                w.writerow([
-                    r["ns"], r["workload"], r["mode"], r["end"],
-                    r["days_left"], r["tag"], r["reasons"], r["requesters"], r["patchers"]
-                ])
-
-        # Webex Markdown
-        with open(digest_md, "w", encoding="utf-8") as fdm:
-            fdm.write("| NS | Workload | Mode | End | D-left | Tag | Reason(s) | Requester(s) | Patcher(s) |\n")
-            fdm.write("| --- | --- | --- | --- | ---: | :-: | --- | --- | --- |\n")
-            for r in digest_rows:
-                fdm.write(
-                    f"| {r['ns']} | {r['workload']} | {r['mode']} | {r['end']} | {r['days_left']} | {r['tag']} | "
-                    f"{r['reasons']} | {r['requesters']} | {r['patchers']} |\n"
-                )
-
-        # HTML
-        with open(digest_html, "w", encoding="utf-8") as fdh:
-            fdh.write("<!doctype html><meta charset='utf-8'>\n")
-            fdh.write("<style>table{border-collapse:collapse;font:14px sans-serif} th,td{border:1px solid #ddd;padding:6px 8px} th{background:#f6f6f6} .hot{background:#fff3cd}</style>\n")
-            fdh.write("<table><thead><tr>"
-                      "<th>NS</th><th>Workload</th><th>Mode</th><th>End</th>"
-                      "<th style='text-align:right'>D-left</th><th>Tag</th><th>Reason(s)</th><th>Requester(s)</th><th>Patcher(s)</th>"
-                      "</tr></thead><tbody>\n")
-            for r in digest_rows:
-                cls = " class='hot'" if r["tag"] == "⚠️" else ""
-                fdh.write(
-                    f"<tr{cls}><td>{esc_html(r['ns'])}</td>"
-                    f"<td>{esc_html(r['workload'])}</td>"
-                    f"<td>{esc_html(r['mode'])}</td>"
-                    f"<td>{esc_html(r['end'])}</td>"
-                    f"<td style='text-align:right'>{r['days_left']}</td>"
-                    f"<td style='text-align:center'>{esc_html(r['tag'])}</td>"
-                    f"<td>{esc_html(r['reasons'])}</td>"
-                    f"<td>{esc_html(r['requesters'])}</td>"
-                    f"<td>{esc_html(r['patchers'])}</td></tr>\n"
-                )
-            fdh.write("</tbody></table>\n")
-
-        # summary + invalid reason breakdown
-        total_invalid = 0
-        if os.path.exists(invalid_jsonl):
-            with open(invalid_jsonl, "r", encoding="utf-8") as fi:
-                for _ in fi:
-                    total_invalid += 1
-
-        print(f"📊 Summary: today={today.isoformat()}, raw_files={len(raw_files)}, raw_lines={total_lines}, parsed_ok={parsed_ok}, groups={len(groups)}, polished={valid_count}, invalid_lines={total_invalid}")
-        if os.path.exists(invalid_jsonl) and DEBUG:
-            reason_counts = defaultdict(int)
-            with open(invalid_jsonl, "r", encoding="utf-8") as fi:
-                for line in fi:
-                    try:
-                        obj = json.loads(line)
-                        reason_counts[obj.get("reason","(none)")] += 1
-                    except Exception:
-                        pass
-            if reason_counts:
-                print("   Invalid breakdown:", dict(sorted(reason_counts.items())))
-
-        print(f"✅ Polished: {polished_jsonl}")
-        print(f"✅ Polished: {polished_csv}")
-        print(f"ℹ️  Invalid: {invalid_jsonl}")
-        print(f"📤 Digest:  {digest_csv}")
-        print(f"📤 Webex:   {digest_md}")
-        print(f"📤 Email:   {digest_html}")
+                sinks.invalid(inv, ensure_ascii=False)
+        finally:
+            sinks.close()
+
+        print(f"📊 Summary: today={today.isoformat()}, raw_files={len(raw_files)}, raw_lines={total_lines}, parsed_ok={parsed_ok}, groups={len(groups)}, polished={sinks.valid_count}, invalid_lines={sinks.invalid_count}")
+        if DEBUG and sinks.invalid_reasons:
+            print("   Invalid breakdown:", dict(sorted(sinks.invalid_reasons.items())))
+
+        print(f"✅ Polished: {sinks.polished_jsonl}")
+        print(f"✅ Polished: {sinks.polished_csv}")
+        print(f"ℹ️  Invalid: {sinks.invalid_jsonl}")
+        print(f"📤 Digest:  {sinks.digest_csv}")
+        print(f"📤 Webex:   {sinks.digest_md}")
+        print(f"📤 Email:   {sinks.digest_html}")
+        os.replace(started_tmp, STARTED_MARKER)     # rename giữ mtime = lúc bắt đầu đọc
 
     finally:
         try:
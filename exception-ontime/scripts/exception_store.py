@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+exception_store.py
+
+Store append-only cho RAW đăng ký exception, thay cho cây RAW_ROOT/<ngày>/raw-*.jsonl,csv,meta.
+
+Layout (STORE_ROOT):
+  log.jsonl                 # append-only, mỗi dòng 1 entry (register ghi 1 lần write/đăng ký)
+  segments/seg-000001.jsonl # compact từ log, sort theo (ns|workload, file, line)
+  index.json                # danh sách segment (+ min/max ts) và index ns|workload -> [segment, offset, length]
+  .lock                     # flock: register/compact giữ exclusive, dedupe đọc giữ shared
+
+Entry: {"k": "ns|workload" ("" nếu dòng không parse được), "f": "<ngày>/raw-<rid>-<build>.jsonl",
+        "n": số dòng trong file RAW gốc, "t": epoch lúc đăng ký (thay cho mtime), "r": dòng JSON gốc}
+-> dedupe dựng lại đúng từng "file RAW ảo" (path, số dòng, nội dung) nên output không đổi.
+
+Bootstrap:
+  - Store chưa có index.json (chưa từng dùng) -> bootstrap(RAW_ROOT) import cây raw-*.jsonl cũ rồi ghi index;
+    register và dedupe đều gọi trước khi ghi / đọc nên chuyển EXCEPTION_STORE=store không làm mất đăng ký cũ
+    (store rỗng -> polished rỗng -> scaler DOWN hết workload đang exception)
+
+Compaction:
+  - log > STORE_COMPACT_BYTES -> gom log thành 1 segment mới
+  - > STORE_MAX_SEGMENTS segment hoặc có segment chứa entry quá RETAIN_DAYS -> merge lại, bỏ entry quá hạn
+  - index ghi `log_skip` (số byte log đã nằm trong segment) trước khi truncate log -> crash giữa chừng không nhân đôi dữ liệu
+
+CLI:
+  exception_store.py stats
+  exception_store.py compact [RETAIN_DAYS]
+  exception_store.py get <ns|workload>
+  exception_store.py import <RAW_ROOT>     # migrate cây raw-*.jsonl cũ vào store (bỏ qua file đã có)
+  exception_store.py export <OUT_ROOT>     # xuất lại layout raw-*.jsonl/.csv/.meta theo ngày
+
+ENV:
+  STORE_ROOT          = /data/exceptions/store
+  STORE_COMPACT_BYTES = 4194304
+  STORE_MAX_SEGMENTS  = 8
+"""
+
+import os, sys, json, csv, time, fcntl, hashlib, datetime
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+STORE_ROOT          = os.environ.get("STORE_ROOT", "/data/exceptions/store")
+STORE_COMPACT_BYTES = int(os.environ.get("STORE_COMPACT_BYTES", str(4 * 1024 * 1024)))
+STORE_MAX_SEGMENTS  = int(os.environ.get("STORE_MAX_SEGMENTS", "8"))
+
+INDEX_VERSION = 1
+
+# cột CSV giống file raw-*.csv của build-exception-draft.py
+CSV_HEADER = [
+    "req_id","seq","ns","workload","on_exeption_247","on_exeption_out_worktime",
+    "requester","reason","end_date","end_input","created_at","created_by",
+    "source_job","source_build","status","hash"
+]
+
+def entry_key(raw: str) -> str:
+    try:
+        r = json.loads(raw)
+    except Exception:
+        return ""
+    if not isinstance(r, dict):
+        return ""
+    ns = (r.get("ns") or "").strip()
+    wl = (r.get("workload") or "").strip()
+    return f"{ns}|{wl}" if ns and wl else ""
+
+def _dump(e: dict) -> bytes:
+    return (json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+class ExceptionStore:
+    def __init__(self, root: str = None):
+        self.root = root or STORE_ROOT
+        self.log_path = os.path.join(self.root, "log.jsonl")
+        self.seg_dir = os.path.join(self.root, "segments")
+        self.index_path = os.path.join(self.root, "index.json")
+        os.makedirs(self.seg_dir, exist_ok=True)
+
+    # ---------- lock / index ----------
+    @contextmanager
+    def lock(self, exclusive: bool = True):
+        with open(os.path.join(self.root, ".lock"), "a+") as lf:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                if exclusive:
+                    self._recover()
+                yield
+            finally:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+    def load_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                idx = json.load(f)
+            if idx.get("version") == INDEX_VERSION:
+                return idx
+        except FileNotFoundError:
+            pass
+        return {"version": INDEX_VERSION, "next_seq": 1, "log_skip": 0, "segments": [], "keys": {}}
+
+    def _save_index(self, idx: dict):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(idx, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, self.index_path)
+
+    def initialized(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    def _log_size(self) -> int:
+        try:
+            return os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+
+    def _recover(self):
+        # crash sau khi truncate log nhưng trước khi ghi lại index (log_skip > size log)
+        idx = self.load_index()
+        if idx["log_skip"] and self._log_size() < idx["log_skip"]:
+            idx["log_skip"] = 0
+            self._save_index(idx)
+
+    # ---------- write ----------
+    def append(self, file_id: str, lines: List[str], ts: float = None, line_numbers: List[int] = None) -> int:
+        """
+        Ghi các dòng của 1 "file RAW" (file_id = <ngày>/raw-<rid>-<build>.jsonl) vào log bằng 1 lần write.
+        Gọi trong `with store.lock():`.
+        """
+        ts = time.time() if ts is None else ts
+        nums = line_numbers or list(range(1, len(lines) + 1))
+        buf = b"".join(_dump({"k": entry_key(raw), "f": file_id, "n": n, "t": round(ts, 3), "r": raw})
+                       for n, raw in zip(nums, lines))
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, buf)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return len(lines)
+
+    # ---------- read ----------
+    def _read_segment(self, name: str) -> Iterator[dict]:
+        with open(os.path.join(self.seg_dir, name), "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _read_log(self, skip: int) -> Iterator[dict]:
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(skip)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break   # dòng đang được append dở
+                if line.strip():
+                    yield json.loads(line)
+
+    def entries(self, min_ts: float = 0) -> Iterator[dict]:
+        idx = self.load_index()
+        for seg in idx["segments"]:
+            if seg["max_t"] < min_ts:
+                continue
+            for e in self._read_segment(seg["name"]):
+                if e["t"] >= min_ts:
+                    yield e
+        for e in self._read_log(idx["log_skip"]):
+            if e["t"] >= min_ts:
+                yield e
+
+    def get(self, key: str) -> List[dict]:
+        """Toàn bộ entry của 1 ns|workload: đọc đúng đoạn byte trong segment theo index + quét log."""
+        idx = self.load_index()
+        out = []
+        for name, off, length in idx["keys"].get(key, []):
+            with open(os.path.join(self.seg_dir, name), "rb") as f:
+                f.seek(off)
+                out.extend(json.loads(l) for l in f.read(length).splitlines() if l.strip())
+        out.extend(e for e in self._read_log(idx["log_skip"]) if e["k"] == key)
+        return sorted(out, key=lambda e: (e["f"], e["n"]))
+
+    def files(self, min_ts: float = 0) -> Dict[str, List[dict]]:
+        """file_id -> entries (sort theo số dòng)."""
+        by_file: Dict[str, List[dict]] = {}
+        for e in self.entries(min_ts):
+            by_file.setdefault(e["f"], []).append(e)
+        for es in by_file.values():
+            es.sort(key=lambda e: e["n"])
+        return by_file
+
+    def file_ids(self) -> set:
+        return {e["f"] for e in self.entries()}
+
+    # ---------- compaction ----------
+    def _write_segment(self, idx: dict, entries: List[dict]) -> Optional[dict]:
+        if not entries:
+            return None
+        entries.sort(key=lambda e: (e["k"], e["f"], e["n"]))
+        name = f"seg-{idx['next_seq']:06d}.jsonl"
+        idx["next_seq"] += 1
+        keys: Dict[str, List[int]] = {}
+        path = os.path.join(self.seg_dir, name)
+        off = 0
+        with open(path + ".tmp", "wb") as f:
+            for e in entries:
+                b = _dump(e)
+                span = keys.get(e["k"])
+                if span is None:
+                    keys[e["k"]] = [off, len(b)]
+                else:
+                    span[1] += len(b)
+                f.write(b)
+                off += len(b)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        for k, (o, l) in keys.items():
+            idx["keys"].setdefault(k, []).append([name, o, l])
+        seg = {"name": name, "entries": len(entries), "bytes": off,
+               "min_t": min(e["t"] for e in entries), "max_t": max(e["t"] for e in entries)}
+        idx["segments"].append(seg)
+        return seg
+
+    def _drop_segments(self, idx: dict, names: set):
+        idx["segments"] = [s for s in idx["segments"] if s["name"] not in names]
+        for k in list(idx["keys"]):
+            spans = [sp for sp in idx["keys"][k] if sp[0] not in names]
+            if spans:
+                idx["keys"][k] = spans
+            else:
+                del idx["keys"][k]
+
+    def needs_compact(self, retain_days: int = 0) -> bool:
+        idx = self.load_index()
+        if self._log_size() - idx["log_skip"] > STORE_COMPACT_BYTES:
+            return True
+        if len(idx["segments"]) > STORE_MAX_SEGMENTS:
+            return True
+        cutoff = time.time() - retain_days * 86400
+        return bool(retain_days) and any(s["min_t"] < cutoff for s in idx["segments"])
+
+    def compact(self, retain_days: int = 0) -> Dict[str, int]:
+        """
+        Gọi trong `with store.lock():`. Log -> 1 segment mới; merge segment khi quá STORE_MAX_SEGMENTS
+        hoặc khi có entry quá RETAIN_DAYS (entry quá hạn bị bỏ).
+        """
+        idx = self.load_index()
+        cutoff = time.time() - retain_days * 86400 if retain_days else 0
+        log_end = self._log_size()
+        fresh = [e for e in self._read_log(idx["log_skip"]) if e["t"] >= cutoff]
+
+        if len(idx["segments"]) + 1 > STORE_MAX_SEGMENTS:
+            merge = list(idx["segments"])
+        else:
+            merge = [s for s in idx["segments"] if s["min_t"] < cutoff]
+        pool = fresh
+        dropped = 0
+        for s in merge:
+            for e in self._read_segment(s["name"]):
+                if e["t"] >= cutoff:
+                    pool.append(e)
+                else:
+                    dropped += 1
+        merged_names = {s["name"] for s in merge}
+        self._drop_segments(idx, merged_names)
+        seg = self._write_segment(idx, pool)
+        idx["log_skip"] = log_end
+        self._save_index(idx)
+        for n in merged_names:
+            try:
+                os.remove(os.path.join(self.seg_dir, n))
+            except OSError:
+                pass
+        # index đã trỏ log_skip = log_end; giờ mới truncate và đưa log_skip về 0
+        with open(self.log_path, "ab") as f:
+            f.truncate(0)
+        idx["log_skip"] = 0
+        self._save_index(idx)
+        return {"merged_segments": len(merge), "entries": seg["entries"] if seg else 0,
+                "dropped": dropped, "segments": len(idx["segments"])}
+
+    def maybe_compact(self, retain_days: int = 0) -> Optional[Dict[str, int]]:
+        if not self.needs_compact(retain_days):
+            return None
+        with self.lock():
+            return self.compact(retain_days)
+
+    # ---------- raw compat ----------
+    def raw_view(self, raw_root: str, lookback_days: int) -> "RawView":
+        return RawView(self, raw_root, lookback_days)
+
+    def import_raw(self, raw_root: str) -> Tuple[int, int]:
+        """Migrate RAW_ROOT/<ngày>/raw-*.jsonl vào log (t = mtime file). Trả về (files, lines)."""
+        have = self.file_ids()
+        n_files = n_lines = 0
+        for root, _, fs in os.walk(raw_root):
+            for fn in sorted(fs):
+                if not (fn.startswith("raw-") and fn.endswith(".jsonl")):
+                    continue
+                path = os.path.join(root, fn)
+                fid = os.path.relpath(path, raw_root)
+                if fid in have:
+                    continue
+                nums, lines = [], []
+                with open(path, "r", encoding="utf-8") as f:
+                    for i, line in enumerate(f, 1):
+                        raw = line.rstrip("\n")
+                        if raw.strip():
+                            nums.append(i); lines.append(raw)
+                if lines:
+                    self.append(fid, lines, ts=os.path.getmtime(path), line_numbers=nums)
+                    n_files += 1; n_lines += len(lines)
+        return n_files, n_lines
+
+    def bootstrap(self, raw_root: str) -> Optional[Tuple[int, int]]:
+        """
+        Lần đầu dùng store (chưa có index.json): import RAW_ROOT rồi ghi index làm mốc -> lần sau không quét lại.
+        import_raw bỏ qua file_id đã có nên store đã nhận vài đăng ký trước đó vẫn an toàn. None = đã init.
+        """
+        if self.initialized():
+            return None
+        with self.lock():
+            if self.initialized():
+                return None
+            res = self.import_raw(raw_root) if os.path.isdir(raw_root) else (0, 0)
+            self._save_index(self.load_index())
+        return res
+
+    def export_raw(self, out_root: str) -> int:
+        """Xuất layout cũ: <ngày>/raw-<rid>-<build>.jsonl + .csv + .meta (mtime = thời điểm đăng ký)."""
+        n = 0
+        for fid, es in sorted(self.files().items()):
+            path = os.path.join(out_root, fid)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            base = path[:-len(".jsonl")]
+            recs = []
+            with open(path, "w", encoding="utf-8") as fj:
+                line_no = 1
+                for e in es:
+                    while line_no < e["n"]:   # giữ nguyên số dòng gốc (dòng trống)
+                        fj.write("\n"); line_no += 1
+                    fj.write(e["r"] + "\n"); line_no += 1
+                    try:
+                        recs.append(json.loads(e["r"]))
+                    except Exception:
+                        pass
+            with open(base + ".csv", "w", newline="", encoding="utf-8") as fc:
+                cw = csv.writer(fc)
+                cw.writerow(CSV_HEADER)
+                for r in recs:
+                    cw.writerow([str(r.get(c, "")).lower() if isinstance(r.get(c), bool) else r.get(c, "")
+                                 for c in CSV_HEADER])
+            first = recs[0] if recs else {}
+            with open(base + ".meta", "w", encoding="utf-8") as fm:
+                fm.write(f"created_at={first.get('created_at', '')}\n")
+                fm.write(f"created_by={first.get('created_by', '')}\n")
+                fm.write(f"job={first.get('source_job', '')}\n")
+                fm.write(f"build={first.get('source_build', '')}\n")
+                fm.write(f"files={os.path.basename(path)},{os.path.basename(base)}.csv\n")
+            t = es[0]["t"]
+            for p in (path, base + ".csv", base + ".meta"):
+                os.utime(p, (t, t))
+            n += 1
+        return n
+
+    def stats(self) -> dict:
+        idx = self.load_index()
+        return {"root": self.root, "segments": len(idx["segments"]),
+                "segment_entries": sum(s["entries"] for s in idx["segments"]),
+                "segment_bytes": sum(s["bytes"] for s in idx["segments"]),
+                "log_bytes": self._log_size() - idx["log_skip"], "keys": len(idx["keys"])}
+
+class RawView:
+    """
+    Nhìn store như cây RAW_ROOT cũ cho dedupe: mỗi file_id là 1 path ảo RAW_ROOT/<file_id>
+    với số dòng, nội dung và "mtime" (= t lúc đăng ký) như file thật.
+    """
+    def __init__(self, store: ExceptionStore, raw_root: str, lookback_days: int):
+        self.raw_root = raw_root
+        with store.lock(exclusive=False):
+            by_file = store.files(time.time() - lookback_days * 86400)
+        self._files = {os.path.join(raw_root, fid): es for fid, es in by_file.items()}
+
+    def files(self) -> List[str]:
+        return sorted(self._files)
+
+    def lines(self, path: str) -> Iterator[Tuple[int, str]]:
+        for e in self._files[path]:
+            yield e["n"], e["r"]
+
+    def content(self, path: str) -> bytes:
+        return b"".join(f"{n}\t{r}\n".encode("utf-8") for n, r in self.lines(path))
+
+    def stat(self, path: str) -> dict:
+        return {"size": len(self.content(path)), "mtime_ns": int(self._files[path][0]["t"] * 1e9)}
+
+    def sha256(self, path: str) -> str:
+        return hashlib.sha256(self.content(path)).hexdigest()
+
+def main(argv: List[str]) -> int:
+    if not argv or argv[0] not in ("stats", "compact", "get", "import", "export"):
+        print(__doc__)
+        return 2
+    cmd, args = argv[0], argv[1:]
+    st = ExceptionStore()
+    if cmd == "stats":
+        print(json.dumps(st.stats(), ensure_ascii=False, indent=2))
+    elif cmd == "compact":
+        with st.lock():
+            res = st.compact(int(args[0]) if args else 0)
+        print(f"✅ compacted: {res}")
+    elif cmd == "get":
+        if not args:
+            print("❌ cần ns|workload"); return 2
+        with st.lock(exclusive=False):
+            for e in st.get(args[0]):
+                ts = datetime.datetime.fromtimestamp(e["t"]).isoformat(timespec="seconds")
+                print(f"{ts}  {e['f']}:{e['n']}  {e['r']}")
+    elif cmd == "import":
+        if not args:
+            print("❌ cần RAW_ROOT"); return 2
+        with st.lock():
+            nf, nl = st.import_raw(args[0])
+        print(f"✅ imported files={nf} lines={nl} from {args[0]}")
+    elif cmd == "export":
+        if not args:
+            print("❌ cần thư mục đích"); return 2
+        with st.lock(exclusive=False):
+            n = st.export_raw(args[0])
+        print(f"📦 exported {n} raw file(s) -> {args[0]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
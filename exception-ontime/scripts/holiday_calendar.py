@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+holiday_calendar.py
+
+Lịch nghỉ lễ dùng chung cho scaler, compute-active và schedule.py: parse holidays.txt 1 lần thành index
+các khoảng ordinal [start, end] đã sort + gộp, tra bằng bisect O(log n); index cache ra đĩa theo sha256
+của file nguồn (file không đổi -> không parse lại).
+
+Cú pháp holidays.txt (tương thích dòng `YYYY-MM-DD` cũ; `#` là comment, kể cả cuối dòng):
+  2026-01-01                   # 1 ngày
+  2026-02-14..2026-02-22       # khoảng (gồm 2 đầu), vd Tết
+  *-09-02                      # lặp hằng năm
+  *-04-30..*-05-01             # khoảng lặp hằng năm
+  [ns:^sb-payments]            # từ đây: chỉ áp cho ns khớp regex (như managed-ns.txt)
+  2026-03-10
+  [global]                     # quay lại lịch chung
+Ngày lễ của 1 ns = lịch chung ∪ mọi section [ns:...] khớp ns đó. Dòng sai cú pháp -> cảnh báo, bỏ qua.
+Rule lặp được khai triển cho năm RECUR_YEARS (2000..2100; 29/02 chỉ năm nhuận).
+
+ENV:
+  HOLIDAYS_FILE       = holidays.txt
+  HOLIDAY_INDEX_FILE  = STATE_ROOT/holidays-index.json
+
+CLI:
+  python3 holiday_calendar.py check [YYYY-MM-DD] [ns]   # ngày có phải lễ không (exit 0 = lễ, 1 = không)
+  python3 holiday_calendar.py list [YEAR]               # các khoảng nghỉ (chung + theo ns)
+"""
+
+import os, re, sys, json, hashlib, datetime
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+HOLIDAYS_FILE      = os.environ.get("HOLIDAYS_FILE", "holidays.txt")
+STATE_ROOT         = os.environ.get("STATE_ROOT", "/data/exceptions/state")
+HOLIDAY_INDEX_FILE = os.environ.get("HOLIDAY_INDEX_FILE", "").strip() or os.path.join(STATE_ROOT, "holidays-index.json")
+
+INDEX_VERSION = 1
+RECUR_YEARS = range(2000, 2101)
+
+_DATE = r"\d{4}-\d{2}-\d{2}"
+_RECUR = r"\*-(\d{2})-(\d{2})"
+_RE_DATE = re.compile(rf"({_DATE})(?:\.\.({_DATE}))?")
+_RE_RECUR = re.compile(rf"{_RECUR}(?:\.\.{_RECUR})?")
+_RE_SECTION = re.compile(r"\[(global|ns:(.+))\]")
+
+Range = Tuple[int, int]
+
+def _recur_ranges(m1: int, d1: int, m2: int, d2: int) -> List[Range]:
+    out = []
+    for y in RECUR_YEARS:
+        try:
+            s = datetime.date(y, m1, d1)
+        except ValueError:
+            continue                      # 29/02 năm không nhuận
+        # khoảng qua năm mới (*-12-30..*-01-02) -> đầu cuối thuộc năm sau
+        ey = y if (m2, d2) >= (m1, d1) else y + 1
+        try:
+            e = datetime.date(ey, m2, d2)
+        except ValueError:
+            e = datetime.date(ey, 2, 28)          # đầu cuối 29/02 năm không nhuận
+        out.append((s.toordinal(), e.toordinal()))
+    return out
+
+def parse_line(line: str) -> Optional[List[Range]]:
+    """1 dòng (đã bỏ comment) -> list khoảng ordinal, None nếu sai cú pháp."""
+    m = _RE_DATE.fullmatch(line)
+    if m:
+        try:
+            s = datetime.date.fromisoformat(m.group(1))
+            e = datetime.date.fromisoformat(m.group(2)) if m.group(2) else s
+        except ValueError:
+            return None
+        return [(s.toordinal(), e.toordinal())] if e >= s else None
+    m = _RE_RECUR.fullmatch(line)
+    if m:
+        m1, d1 = int(m.group(1)), int(m.group(2))
+        m2, d2 = (int(m.group(3)), int(m.group(4))) if m.group(3) else (m1, d1)
+        try:
+            datetime.date(2000, m1, d1); datetime.date(2000, m2, d2)   # 2000 nhuận: nhận cả 29/02
+        except ValueError:
+            return None
+        return _recur_ranges(m1, d1, m2, d2)
+    return None
+
+def merge_ranges(ranges: List[Range]) -> List[List[int]]:
+    out: List[List[int]] = []
+    for s, e in sorted(ranges):
+        if out and s <= out[-1][1] + 1:
+            out[-1][1] = max(out[-1][1], e)
+        else:
+            out.append([s, e])
+    return out
+
+def build_index(text: str, source: str = "") -> dict:
+    sections: Dict[str, List[Range]] = {"": []}
+    cur = ""
+    for no, raw in enumerate(text.splitlines(), start=1):
+        line = raw.split("#", 1)[0].strip()
+        if not line:
+            continue
+        m = _RE_SECTION.fullmatch(line)
+        if m:
+            cur = (m.group(2) or "").strip()
+            if cur:
+                try:
+                    re.compile(cur)
+                except re.error as e:
+                    print(f"⚠️  {source}:{no}: regex ns sai ({e}) → bỏ qua section")
+                    cur = "\0"
+            sections.setdefault(cur, [])
+            continue
+        r = parse_line(line)
+        if r is None:
+            print(f"⚠️  {source}:{no}: dòng holiday không hợp lệ → bỏ qua: {raw.strip()!r}")
+            continue
+        sections[cur].extend(r)
+    sections.pop("\0", None)
+    return {
+        "version": INDEX_VERSION,
+        "global": merge_ranges(sections.pop("")),
+        "ns": [{"pattern": p, "ranges": merge_ranges(r)} for p, r in sections.items() if r],
+    }
+
+def _hit(ranges: List[List[int]], starts: List[int], o: int) -> bool:
+    i = bisect_right(starts, o) - 1
+    return i >= 0 and o <= ranges[i][1]
+
+class HolidayCalendar:
+    def __init__(self, doc: dict = None):
+        doc = doc or {"global": [], "ns": []}
+        self.ranges = doc.get("global") or []
+        self.starts = [r[0] for r in self.ranges]
+        self.ns = [(re.compile(e["pattern"]), e["ranges"], [r[0] for r in e["ranges"]]) for e in doc.get("ns") or []]
+        self._ns_cache: Dict[str, list] = {}
+
+    def __len__(self) -> int:
+        return sum(e - s + 1 for s, e in self.ranges)
+
+    def _sections(self, ns: str) -> list:
+        if ns not in self._ns_cache:
+            self._ns_cache[ns] = [(r, st) for rx, r, st in self.ns if rx.search(ns)]
+        return self._ns_cache[ns]
+
+    def is_holiday(self, d: datetime.date, ns: str = None) -> bool:
+        """Lịch chung; truyền ns thì tính thêm các section [ns:...] khớp."""
+        o = d.toordinal()
+        if _hit(self.ranges, self.starts, o):
+            return True
+        return bool(ns) and any(_hit(r, st, o) for r, st in self._sections(ns))
+
+    def has_ns_holiday(self, d: datetime.date) -> bool:
+        """Có section theo ns nào nghỉ ngày d không (scaler: không fast-exit NOOP)."""
+        o = d.toordinal()
+        return any(_hit(r, st, o) for _, r, st in self.ns)
+
+    def ns_holiday_pred(self, d: datetime.date):
+        """Predicate ns -> nghỉ riêng ngày d (không tính lịch chung); None nếu không section nào nghỉ."""
+        if not self.has_ns_holiday(d):
+            return None
+        o = d.toordinal()
+        return lambda ns: any(_hit(r, st, o) for r, st in self._sections(ns))
+
+def _sha256(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+_LOADED: Dict[tuple, HolidayCalendar] = {}
+
+def load(path: str = None, index_path: str = None) -> HolidayCalendar:
+    """
+    Index cache theo sha256 file nguồn: khớp -> đọc index; khác/thiếu -> parse rồi ghi lại index (lỗi ghi bỏ qua).
+    Không có holidays file -> lịch rỗng. Trong 1 process cache theo (path, sha256).
+    """
+    path = path or HOLIDAYS_FILE
+    index_path = index_path or HOLIDAY_INDEX_FILE
+    digest = _sha256(path)
+    if digest is None:
+        return HolidayCalendar()
+    key = (path, digest)
+    if key in _LOADED:
+        return _LOADED[key]
+    doc = None
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        if d.get("version") == INDEX_VERSION and d.get("source_sha256") == digest:
+            doc = d
+    except (OSError, ValueError):
+        pass
+    if doc is None:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = build_index(f.read(), path)
+        doc["source"], doc["source_sha256"] = os.path.abspath(path), digest
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+            tmp = index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, index_path)
+        except OSError:
+            pass
+    cal = _LOADED[key] = HolidayCalendar(doc)
+    return cal
+
+def _fmt(r) -> str:
+    s, e = datetime.date.fromordinal(r[0]), datetime.date.fromordinal(r[1])
+    return s.isoformat() if s == e else f"{s.isoformat()}..{e.isoformat()}"
+
+def main(argv: List[str]) -> int:
+    cmd = argv[0] if argv else "check"
+    cal = load()
+    if cmd == "check":
+        d = datetime.date.fromisoformat(argv[1]) if len(argv) > 1 else datetime.date.today()
+        ns = argv[2] if len(argv) > 2 else None
+        hol = cal.is_holiday(d, ns)
+        print(f"{'🎌' if hol else '📅'} {d.isoformat()}{' ns=' + ns if ns else ''} holiday={hol}")
+        return 0 if hol else 1
+    if cmd == "list":
+        year = int(argv[1]) if len(argv) > 1 else datetime.date.today().year
+        lo, hi = datetime.date(year, 1, 1).toordinal(), datetime.date(year, 12, 31).toordinal()
+        for label, ranges in [("global", cal.ranges)] + [(f"ns:{rx.pattern}", r) for rx, r, _ in cal.ns]:
+            rows = [_fmt(r) for r in ranges if r[1] >= lo and r[0] <= hi]
+            print(f"[{label}] {len(rows)} khoảng")
+            for x in rows:
+                print(f"  {x}")
+        return 0
+    print(__doc__)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
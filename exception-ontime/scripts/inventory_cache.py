@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+inventory_cache.py
+
+Daemon giữ inventory cluster trong bộ nhớ bằng LIST + WATCH, ghi snapshot ra đĩa cho scaler
+(INVENTORY_SOURCE=snapshot) -> mở cửa sổ không phải list lại cả cụm, apiserver không bị dồn tải lúc 07:10 / 17:55.
+
+- Mỗi resource (namespaces, deployments, statefulsets, horizontalpodautoscalers) 1 thread:
+  LIST (phân trang) -> WATCH từ resourceVersion của list; BOOKMARK cập nhật rv;
+  410 Gone / lỗi stream -> LIST lại; resync định kỳ INVENTORY_RESYNC_S
+- Chỉ giữ field scaler cần (name/namespace/resourceVersion, spec.replicas + label pod template cho PDB_GUARD,
+  HPA minReplicas/scaleTargetRef)
+- Snapshot ghi atomic mỗi INVENTORY_SNAPSHOT_INTERVAL_S nếu có thay đổi, hoặc heartbeat khi không đổi;
+  mỗi resource kèm resourceVersion + synced (đã LIST xong ít nhất 1 lần) + ok_at (lần cuối LIST / WATCH thành công)
+- Watch tối đa min(INVENTORY_WATCH_TIMEOUT_S, MAX_AGE_S/2) rồi mở lại từ rv -> stream khoẻ thì ok_at luôn mới;
+  apiserver / auth lỗi lâu hơn MAX_AGE_S -> ngừng ghi heartbeat, scaler thấy snapshot cũ và list API như cũ
+- Cần KUBE_TRANSPORT=native (watch dùng kết nối HTTP stream)
+
+ENV:
+  INVENTORY_SNAPSHOT            = STATE_ROOT/inventory-snapshot.json
+  INVENTORY_SNAPSHOT_INTERVAL_S = 5
+  INVENTORY_SNAPSHOT_MAX_AGE_S  = 120   (scaler: snapshot cũ hơn -> list API như cũ)
+  INVENTORY_WATCH_TIMEOUT_S     = 300
+  INVENTORY_RESYNC_S            = 3600
+
+CLI:
+  python3 inventory_cache.py run       # daemon (foreground, systemd / container)
+  python3 inventory_cache.py once      # LIST 1 lần rồi ghi snapshot
+  python3 inventory_cache.py status    # tuổi snapshot, rv, số item mỗi resource
+"""
+
+import os, sys, json, time, signal, threading
+from typing import Dict, List, Optional, Tuple
+from kube_transport import make_transport, KubeError
+
+STATE_ROOT  = os.environ.get("STATE_ROOT", "/data/exceptions/state")
+SNAPSHOT    = os.environ.get("INVENTORY_SNAPSHOT", "").strip() or os.path.join(STATE_ROOT, "inventory-snapshot.json")
+INTERVAL_S  = float(os.environ.get("INVENTORY_SNAPSHOT_INTERVAL_S", "5"))
+MAX_AGE_S   = float(os.environ.get("INVENTORY_SNAPSHOT_MAX_AGE_S", "120"))
+WATCH_TIMEOUT_S = int(os.environ.get("INVENTORY_WATCH_TIMEOUT_S", "300"))
+RESYNC_S    = float(os.environ.get("INVENTORY_RESYNC_S", "3600"))
+DEBUG       = os.environ.get("DEBUG", "0").lower() in ("1", "true", "yes")
+
+SNAPSHOT_VERSION = 1
+RESOURCES = ["namespaces", "deployments", "statefulsets", "horizontalpodautoscalers"]
+
+def slim(item: dict) -> dict:
+    """Bỏ mọi field scaler không dùng (snapshot nhỏ, ghi nhanh)."""
+    meta = item.get("metadata") or {}
+    out = {"kind": item.get("kind", ""),
+           "metadata": {k: meta[k] for k in ("name", "namespace", "resourceVersion") if k in meta}}
+    spec = item.get("spec") or {}
+    if out["kind"] == "HorizontalPodAutoscaler":
+        out["spec"] = {k: spec[k] for k in ("minReplicas", "scaleTargetRef") if k in spec}
+    elif out["kind"] in ("Deployment", "StatefulSet"):
+        out["spec"] = {"replicas": spec.get("replicas", 1)}
+        labels = ((spec.get("template") or {}).get("metadata") or {}).get("labels")
+        if labels:
+            out["spec"]["template"] = {"metadata": {"labels": labels}}
+    return out
+
+def _key(item: dict) -> Tuple[str, str]:
+    m = item.get("metadata") or {}
+    return (m.get("namespace", ""), m.get("name", ""))
+
+class Reflector(threading.Thread):
+    """LIST + WATCH 1 resource, giữ map (ns, name) -> item đã slim."""
+
+    def __init__(self, transport, res: str, cache: "InventoryCache"):
+        super().__init__(name=f"reflector-{res}", daemon=True)
+        self.t, self.res, self.cache = transport, res, cache
+        self.items: Dict[Tuple[str, str], dict] = {}
+        self.rv = ""
+        self.prefix: Optional[str] = None
+        self.synced = False
+        self.listed_at = 0.0
+        self.ok_at = 0.0      # lần cuối LIST xong / nhận event / stream watch đóng bình thường
+        self.kind = ""
+
+    def relist(self):
+        items, rv, prefix = self.t.list_resource(self.res)
+        with self.cache.lock:
+            self.items = {_key(i): slim(i) for i in items}
+            self.kind = items[0].get("kind", "") if items else self.kind
+            self.rv, self.prefix, self.synced = rv, prefix, True
+            self.listed_at = self.ok_at = time.time()
+            self.cache.dirty = True
+        print(f"📋 {self.res}: listed {len(items)} item(s) rv={rv}", flush=True)
+
+    def apply(self, ev: dict) -> bool:
+        """Trả False nếu cần LIST lại (410 / ERROR)."""
+        et, obj = ev.get("type"), ev.get("object") or {}
+        rv = (obj.get("metadata") or {}).get("resourceVersion", "")
+        if et == "ERROR":
+            print(f"⚠️  {self.res}: watch ERROR {obj.get('code')} {obj.get('reason')} → relist", flush=True)
+            return False
+        with self.cache.lock:
+            self.ok_at = time.time()
+            if et == "BOOKMARK":
+                self.rv = rv or self.rv
+                return True
+            obj.setdefault("kind", self.kind)
+            if et in ("ADDED", "MODIFIED"):
+                self.items[_key(obj)] = slim(obj)
+            elif et == "DELETED":
+                self.items.pop(_key(obj), None)
+            self.rv = rv or self.rv
+            self.cache.dirty = True
+        if DEBUG:
+            print(f"[DEBUG] {self.res} {et} {_key(obj)} rv={rv}", flush=True)
+        return True
+
+    def fresh(self, now: float = None) -> bool:
+        return self.synced and (now or time.time()) - self.ok_at <= MAX_AGE_S
+
+    def run(self):
+        backoff = 1.0
+        # watch đóng định kỳ trước MAX_AGE_S -> cụm yên ắng (không event / bookmark) vẫn có ok_at mới
+        timeout_s = max(1, int(min(WATCH_TIMEOUT_S, MAX_AGE_S / 2))) if MAX_AGE_S > 0 else WATCH_TIMEOUT_S
+        while not self.cache.stop.is_set():
+            try:
+                if not self.synced or time.time() - self.listed_at > RESYNC_S:
+                    self.relist()
+                ok = True
+                for ev in self.t.watch(self.res, self.rv, timeout_s=timeout_s, prefix=self.prefix):
+                    if not self.apply(ev):
+                        ok = False
+                        break
+                    if self.cache.stop.is_set():
+                        return
+                if ok:
+                    self.ok_at = time.time()
+                else:
+                    self.synced = False
+                backoff = 1.0
+            except KubeError as e:
+                print(f"⚠️  {self.res}: {e} (retry {backoff:.0f}s)", flush=True)
+                if e.status == 410:
+                    self.synced = False
+                self.cache.stop.wait(backoff)
+                backoff = min(60.0, backoff * 2)
+
+class InventoryCache:
+    def __init__(self, transport, path: str = None):
+        self.t = transport
+        self.path = path or SNAPSHOT
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.dirty = False
+        self.reflectors = [Reflector(transport, r, self) for r in RESOURCES]
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            res = {}
+            for r in self.reflectors:
+                res[r.res] = {"resourceVersion": r.rv, "synced": r.synced, "listed_at": r.listed_at, "ok_at": r.ok_at,
+                              "items": [r.items[k] for k in sorted(r.items)]}
+            self.dirty = False
+        return {"version": SNAPSHOT_VERSION, "written_at": time.time(), "resources": res}
+
+    def write(self):
+        write_snapshot(self.path, self.snapshot())
+
+    def once(self):
+        for r in self.reflectors:
+            r.relist()
+        self.write()
+
+    def run(self):
+        for r in self.reflectors:
+            r.start()
+        last = 0.0
+        stale_logged = False
+        while not self.stop.is_set():
+            self.stop.wait(INTERVAL_S)
+            # ghi khi có thay đổi; không đổi vẫn ghi heartbeat (written_at) để scaler biết daemon còn sống.
+            # resource nào quá MAX_AGE_S không LIST/WATCH được (apiserver / auth lỗi) -> không ghi nữa:
+            # written_at mới trên dữ liệu cũ sẽ qua mặt kiểm tra tuổi của scaler
+            if self.dirty or time.time() - last >= min(MAX_AGE_S / 2, 60):
+                if not all(r.synced for r in self.reflectors):
+                    continue
+                now = time.time()
+                stale = [r.res for r in self.reflectors if MAX_AGE_S > 0 and not r.fresh(now)]
+                if stale:
+                    if not stale_logged:
+                        print(f"⚠️  {','.join(stale)}: quá {MAX_AGE_S:.0f}s không LIST/WATCH được -> ngừng ghi snapshot", flush=True)
+                        stale_logged = True
+                    continue
+                if stale_logged:
+                    print("✅ reflector sync lại -> ghi snapshot tiếp", flush=True)
+                    stale_logged = False
+                self.write()
+                last = now
+
+def write_snapshot(path: str, doc: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def read_snapshot(path: str = None, max_age_s: float = None) -> dict:
+    """
+    Snapshot còn dùng được (đúng version, mọi resource đã synced, không cũ hơn max_age_s - cả written_at lẫn
+    ok_at từng resource), ngược lại RuntimeError.
+    """
+    path = path or SNAPSHOT
+    max_age_s = MAX_AGE_S if max_age_s is None else max_age_s
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"snapshot {path}: {e}")
+    if doc.get("version") != SNAPSHOT_VERSION:
+        raise RuntimeError(f"snapshot {path}: version {doc.get('version')} != {SNAPSHOT_VERSION}")
+    age = time.time() - float(doc.get("written_at") or 0)
+    if max_age_s > 0 and age > max_age_s:
+        raise RuntimeError(f"snapshot {path}: cũ {age:.0f}s > {max_age_s:.0f}s (daemon dừng?)")
+    res = doc.get("resources") or {}
+    missing = [r for r in RESOURCES if not (res.get(r) or {}).get("synced")]
+    if missing:
+        raise RuntimeError(f"snapshot {path}: chưa sync {','.join(missing)}")
+    now = time.time()
+    stale = [r for r in RESOURCES if "ok_at" in res[r] and now - float(res[r]["ok_at"] or 0) > max_age_s]
+    if max_age_s > 0 and stale:
+        raise RuntimeError(f"snapshot {path}: {','.join(stale)} không LIST/WATCH được > {max_age_s:.0f}s")
+    doc["age_s"] = age
+    return doc
+
+def snapshot_items(doc: dict, resources: List[str]) -> List[dict]:
+    out: List[dict] = []
+    for r in resources:
+        out.extend(doc["resources"][r]["items"])
+    return out
+
+def main(argv: List[str]) -> int:
+    cmd = argv[0] if argv else "status"
+    if cmd == "status":
+        try:
+            with open(SNAPSHOT, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ {SNAPSHOT}: {e}")
+            return 2
+        print(f"🗂️  {SNAPSHOT} age={time.time() - float(doc.get('written_at') or 0):.0f}s")
+        for r, v in (doc.get("resources") or {}).items():
+            ok = f"{time.time() - float(v['ok_at']):.0f}s" if v.get("ok_at") else "-"
+            print(f"  {r:<26} items={len(v.get('items') or []):<6} rv={v.get('resourceVersion')} synced={v.get('synced')} ok_age={ok}")
+        return 0
+    if cmd not in ("run", "once"):
+        print(__doc__)
+        return 2
+
+    t = make_transport(os.environ.get("KUBECONFIG_FILE") or os.environ.get("KUBECONFIG") or "",
+                       os.environ.get("KUBE_CONTEXT", ""), os.environ.get("KUBECTL_TIMEOUT", "10s"), DEBUG)
+    if not hasattr(t, "watch"):
+        print("❌ inventory_cache cần KUBE_TRANSPORT=native (watch stream)")
+        return 2
+    cache = InventoryCache(t)
+    try:
+        if cmd == "once":
+            cache.once()
+            print(f"✅ snapshot -> {cache.path}")
+            return 0
+        signal.signal(signal.SIGTERM, lambda *_: cache.stop.set())
+        print(f"🚀 inventory cache → {cache.path} (interval={INTERVAL_S}s watch_timeout={WATCH_TIMEOUT_S}s resync={RESYNC_S}s)", flush=True)
+        cache.run()
+    except KeyboardInterrupt:
+        pass
+    except KubeError as e:
+        print(f"❌ inventory cache: {e}")
+        return 2
+    finally:
+        cache.stop.set()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+kube_transport.py
+
+Lớp transport dùng chung cho các script gọi Kubernetes API.
+
+Backends (chọn bằng ENV KUBE_TRANSPORT):
+  kubectl : mỗi request là 1 process kubectl (hành vi cũ, mặc định)
+  native  : đọc kubeconfig 1 lần, giữ pool kết nối keep-alive (http.client) cho cả run
+
+Native hỗ trợ:
+  - server http:// (fake API server local để test) và https://
+  - certificate-authority(-data), client-certificate(-data)/client-key(-data)
+  - token, tokenFile, username/password, exec plugin (ExecCredential, vd gke-gcloud-auth-plugin)
+  - in-cluster service account khi không có kubeconfig
+  - phân trang list (limit/continue)
+  - watch (stream event theo resourceVersion) cho inventory_cache.py
+
+Interface chung:
+  request(method, path, body=None, query=None, content_type=None) -> (status, data)
+  list_items(resources, namespace=None, label_selector, field_selector) -> [item] (item luôn có "kind")
+  scale(ns, kind, name, replicas)                                  -> (ok, err)
+Lỗi kết nối / timeout / thiếu binary kubectl -> KubeError(status=0) ở cả 2 backend (scale() trả (False, err)).
+Chỉ native:
+  list_resource(resource, namespace=None) -> (items, list resourceVersion, api prefix)
+  watch(resource, resource_version, prefix=...)                    -> iterator event {type, object}
+"""
+
+import os, sys, json, ssl, time, base64, shlex, datetime, subprocess, tempfile, threading, atexit, shutil, re
+import http.client
+from queue import LifoQueue, Empty
+from urllib.parse import urlsplit, urlencode, quote
+from typing import Iterator, List, Optional, Tuple
+
+# resource -> (api prefix [các version thử lần lượt], namespaced, kind)
+RESOURCES = {
+    "namespaces":               (["/api/v1"], False, "Namespace"),
+    "nodes":                    (["/api/v1"], False, "Node"),
+    "pods":                     (["/api/v1"], True,  "Pod"),
+    "deployments":              (["/apis/apps/v1"], True, "Deployment"),
+    "statefulsets":             (["/apis/apps/v1"], True, "StatefulSet"),
+    "horizontalpodautoscalers": (["/apis/autoscaling/v2", "/apis/autoscaling/v2beta2", "/apis/autoscaling/v1"], True, "HorizontalPodAutoscaler"),
+    "poddisruptionbudgets":     (["/apis/policy/v1", "/apis/policy/v1beta1"], True, "PodDisruptionBudget"),
+    "virtualservices":          (["/apis/networking.istio.io/v1beta1", "/apis/networking.istio.io/v1alpha3"], True, "VirtualService"),
+}
+
+# kind ngắn dùng trong scaler -> resource
+SCALE_RESOURCES = {"deploy": "deployments", "deployment": "deployments",
+                   "statefulset": "statefulsets", "sts": "statefulsets"}
+
+# "Error from server (Reason)" của kubectl -> HTTP status
+_REASON_STATUS = {
+    "BadRequest": 400, "Unauthorized": 401, "Forbidden": 403, "NotFound": 404,
+    "MethodNotAllowed": 405, "AlreadyExists": 409, "Conflict": 409, "Gone": 410,
+    "Invalid": 422, "TooManyRequests": 429, "InternalError": 500,
+    "ServiceUnavailable": 503, "Timeout": 504,
+}
+
+def parse_duration(s: str, default: float = 10.0) -> float:
+    """'10s' | '1m' | '500ms' | '15' -> giây."""
+    s = (s or "").strip()
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)(ms|s|m|h)?", s)
+    if not m:
+        return default
+    v = float(m.group(1))
+    return v * {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[m.group(2)]
+
+def _build_path(path: str, query: Optional[dict]) -> str:
+    q = {k: v for k, v in (query or {}).items() if v not in (None, "")}
+    return path + ("?" + urlencode(q) if q else "")
+
+def resource_path(resource: str, namespace: Optional[str] = None, name: str = "", sub: str = "",
+                  prefix: Optional[str] = None) -> str:
+    prefixes, namespaced, _ = RESOURCES[resource]
+    p = prefix or prefixes[0]
+    if namespaced and namespace:
+        p += f"/namespaces/{quote(namespace)}"
+    p += f"/{resource}"
+    if name:
+        p += f"/{quote(name)}"
+    if sub:
+        p += f"/{sub}"
+    return p
+
+class KubeError(RuntimeError):
+    def __init__(self, msg: str, status: int = 0):
+        super().__init__(msg)
+        self.status = status
+
+# ===================== kubectl backend =====================
+class KubectlTransport:
+    name = "kubectl"
+
+    def __init__(self, kubeconfig: str = "", context: str = "", request_timeout: str = "10s", debug: bool = False):
+        self.kubeconfig = kubeconfig
+        self.context = context
+        self.request_timeout = request_timeout
+        self.debug = debug
+
+    def run(self, args: List[str], timeout=30, request_timeout: str = "", stdin: Optional[str] = None) -> Tuple[int, str, str]:
+        cmd = ["kubectl"]
+        if self.kubeconfig:
+            cmd += ["--kubeconfig", self.kubeconfig]
+        if self.context:
+            cmd += ["--context", self.context]
+        cmd += ["--request-timeout", request_timeout or self.request_timeout]
+        cmd += args
+        if self.debug:
+            print("[kubectl]", " ".join(shlex.quote(x) for x in cmd), flush=True)
+        try:
+            cp = subprocess.run(cmd, input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                timeout=timeout, encoding="utf-8")
+        except subprocess.TimeoutExpired:
+            # như native: treo = lỗi kết nối (status 0) -> caller fallback / ghi lỗi thay vì traceback
+            raise KubeError(f"kubectl {' '.join(args[:2])}: timeout sau {timeout}s")
+        except FileNotFoundError as e:
+            raise KubeError(f"kubectl không chạy được: {e}")
+        return cp.returncode, (cp.stdout or "").strip(), (cp.stderr or "").strip()
+
+    @staticmethod
+    def _status_from_err(err: str) -> int:
+        m = re.search(r"Error from server \((\w+)\)", err or "")
+        if m:
+            return _REASON_STATUS.get(m.group(1), 500)
+        if "not found" in (err or "").lower():
+            return 404
+        return 0
+
+    def request(self, method: str, path: str, body=None, query: Optional[dict] = None,
+                content_type: Optional[str] = None, timeout: float = 30) -> Tuple[int, object]:
+        full = _build_path(path, query)
+        method = method.upper()
+        data = json.dumps(body) if body is not None and not isinstance(body, str) else body
+        if method == "GET":
+            args = ["get", "--raw", full]
+        elif method == "POST":
+            args = ["create", "--raw", full, "-f", "-"]
+        elif method == "PUT":
+            args = ["replace", "--raw", full, "-f", "-"]
+        elif method == "DELETE":
+            args = ["delete", "--raw", full]
+        elif method == "PATCH":
+            # kubectl không có patch --raw: map /apis/<g>/<v>/namespaces/<ns>/<res>/<name>[/<sub>]
+            m = re.fullmatch(r"/apis?/(?:([^/]+)/)?(v[^/]+)/namespaces/([^/]+)/([^/]+)/([^/?]+)(?:/([^/?]+))?", path)
+            if not m:
+                raise KubeError(f"kubectl backend cannot PATCH {path}")
+            group, ver, ns, res, name, sub = m.groups()
+            target = f"{res}.{ver}.{group}" if group else res
+            ptype = {"application/strategic-merge-patch+json": "strategic",
+                     "application/json-patch+json": "json"}.get(content_type or "", "merge")
+            args = ["-n", ns, "patch", target, name, "--type", ptype, "-p", data or "{}", "-o", "json"]
+            if sub:
+                args += ["--subresource", sub]
+            data = None
+        else:
+            raise KubeError(f"unsupported method {method}")
+        rc, out, err = self.run(args, timeout=timeout, stdin=data if method in ("POST", "PUT") else None)
+        if rc != 0:
+            return (self._status_from_err(err) or 500), err
+        try:
+            return 200, (json.loads(out) if out else {})
+        except ValueError:
+            return 200, out
+
+    def list_items(self, resources: List[str], namespace: Optional[str] = None, timeout: float = 60,
+                   label_selector: str = "", field_selector: str = "") -> List[dict]:
+        args = ["get", ",".join(resources), "-o", "json"]
+        args += ["-n", namespace] if namespace else (["-A"] if any(RESOURCES[r][1] for r in resources) else [])
+        if label_selector:
+            args += [f"--selector={label_selector}"]
+        if field_selector:
+            args += [f"--field-selector={field_selector}"]
+        rc, out, err = self.run(args, timeout=timeout + 30, request_timeout=f"{int(timeout)}s")
+        if rc != 0:
+            raise KubeError(f"kubectl get {','.join(resources)} failed: {err}", self._status_from_err(err))
+        return json.loads(out).get("items", [])
+
+    def scale(self, ns: str, kind: str, name: str, replicas: int, resource_version: str = "") -> Tuple[bool, str]:
+        args = ["-n", ns, "scale", kind, name, f"--replicas={replicas}"]
+        if resource_version:
+            args += [f"--resource-version={resource_version}"]
+        try:
+            rc, out, err = self.run(args)
+        except KubeError as e:
+            return False, str(e)
+        return rc == 0, err
+
+    def close(self):
+        pass
+
+# ===================== native backend =====================
+def _load_yaml_or_json(text: str) -> dict:
+    try:
+        import yaml  # optional
+        return yaml.safe_load(text) or {}
+    except ImportError:
+        try:
+            return json.loads(text)
+        except ValueError:
+            raise KubeError("native transport cần PyYAML để đọc kubeconfig YAML (pip install pyyaml), hoặc dùng KUBE_TRANSPORT=kubectl")
+
+class _Creds:
+    """Thông tin kết nối rút ra từ kubeconfig (đọc 1 lần)."""
+
+    def __init__(self):
+        self.server = ""
+        self.context = ""
+        self.ca_file = None
+        self.insecure = False
+        self.cert_file = None
+        self.key_file = None
+        self.token = None
+        self.token_file = None
+        self.basic = None
+        self.exec_cfg = None
+        self.exec_expiry = 0.0
+        self.tls_server_name = None
+        self.proxy_url = None
+
+def _named(lst, name):
+    for it in lst or []:
+        if it.get("name") == name:
+            return it
+    return None
+
+class NativeTransport:
+    name = "native"
+
+    def __init__(self, kubeconfig: str = "", context: str = "", request_timeout: str = "10s",
+                 debug: bool = False, pool_size: int = 0):
+        self.debug = debug
+        self.timeout = parse_duration(request_timeout)
+        self.pool_size = pool_size or int(os.environ.get("KUBE_POOL_SIZE", "16"))
+        self._tmpdir = None
+        self._lock = threading.Lock()
+        self._pool: LifoQueue = LifoQueue()
+        self._ssl_ctx = None
+        self.stats = {"requests": 0, "connections": 0}
+        self.creds = self._load(kubeconfig, context)
+        self.context = self.creds.context
+        u = urlsplit(self.creds.server)
+        self._scheme = u.scheme or "https"
+        self._host = u.hostname
+        self._port = u.port or (443 if self._scheme == "https" else 80)
+        self._base = u.path.rstrip("/")
+        atexit.register(self.close)
+
+    # ---- kubeconfig ----
+    def _data_file(self, b64: str, name: str) -> str:
+        if not self._tmpdir:
+            self._tmpdir = tempfile.mkdtemp(prefix="kt-")
+        p = os.path.join(self._tmpdir, name)
+        fd = os.open(p, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(base64.b64decode(b64))
+        return p
+
+    def _load(self, kubeconfig: str, context: str) -> _Creds:
+        c = _Creds()
+        paths = [p for p in (kubeconfig or os.environ.get("KUBECONFIG", "")).split(os.pathsep) if p]
+        if not paths and os.path.exists(os.path.expanduser("~/.kube/config")):
+            paths = [os.path.expanduser("~/.kube/config")]
+        if not paths and os.environ.get("KUBERNETES_SERVICE_HOST"):
+            sa = "/var/run/secrets/kubernetes.io/serviceaccount"
+            c.server = f"https://{os.environ['KUBERNETES_SERVICE_HOST']}:{os.environ.get('KUBERNETES_SERVICE_PORT', '443')}"
+            c.ca_file = os.path.join(sa, "ca.crt")
+            c.token_file = os.path.join(sa, "token")
+            c.context = "in-cluster"
+            return c
+        if not paths:
+            raise KubeError("không tìm thấy kubeconfig (KUBECONFIG_FILE/KUBECONFIG)")
+
+        cfg = {"clusters": [], "users": [], "contexts": []}
+        for p in paths:
+            with open(p, "r", encoding="utf-8") as f:
+                d = _load_yaml_or_json(f.read())
+            base_dir = os.path.dirname(os.path.abspath(p))
+            for sect in ("clusters", "users", "contexts"):
+                for it in d.get(sect) or []:
+                    if sect != "contexts":
+                        body = it.get(sect[:-1]) or {}
+                        for k in ("certificate-authority", "client-certificate", "client-key", "tokenFile"):
+                            if body.get(k) and not os.path.isabs(body[k]):
+                                body[k] = os.path.join(base_dir, body[k])
+                    if not _named(cfg[sect], it.get("name")):
+                        cfg[sect].append(it)
+            if not cfg.get("current-context"):
+                cfg["current-context"] = d.get("current-context")  # file đầu tiên có giá trị thắng (như kubectl)
+
+        ctx_name = context or cfg.get("current-context") or ""
+        ctx = (_named(cfg["contexts"], ctx_name) or {}).get("context")
+        if not ctx:
+            raise KubeError(f"context '{ctx_name}' không có trong kubeconfig")
+        cluster = (_named(cfg["clusters"], ctx.get("cluster")) or {}).get("cluster") or {}
+        user = (_named(cfg["users"], ctx.get("user")) or {}).get("user") or {}
+
+        c.context = ctx_name
+        c.server = cluster.get("server", "")
+        c.insecure = bool(cluster.get("insecure-skip-tls-verify"))
+        c.tls_server_name = cluster.get("tls-server-name")
+        c.proxy_url = cluster.get("proxy-url")
+        if cluster.get("certificate-authority-data"):
+            c.ca_file = self._data_file(cluster["certificate-authority-data"], "ca.crt")
+        elif cluster.get("certificate-authority"):
+            c.ca_file = cluster["certificate-authority"]
+        if user.get("client-certificate-data"):
+            c.cert_file = self._data_file(user["client-certificate-data"], "client.crt")
+        elif user.get("client-certificate"):
+            c.cert_file = user["client-certificate"]
+        if user.get("client-key-data"):
+            c.key_file = self._data_file(user["client-key-data"], "client.key")
+        elif user.get("client-key"):
+            c.key_file = user["client-key"]
+        c.token = user.get("token")
+        c.token_file = user.get("tokenFile")
+        if user.get("username"):
+            c.basic = base64.b64encode(f"{user['username']}:{user.get('password', '')}".encode()).decode()
+        c.exec_cfg = user.get("exec")
+        if user.get("auth-provider"):
+            # legacy gcp/oidc provider: lấy token đã cache trong kubeconfig nếu có
+            c.token = c.token or (user["auth-provider"].get("config") or {}).get("access-token") \
+                or (user["auth-provider"].get("config") or {}).get("id-token")
+        if not c.server:
+            raise KubeError(f"cluster của context '{ctx_name}' không có server")
+        return c
+
+    def _run_exec(self):
+        e = self.creds.exec_cfg
+        env = dict(os.environ)
+        for kv in e.get("env") or []:
+            env[kv["name"]] = kv["value"]
+        cmd = [e["command"]] + list(e.get("args") or [])
+        if self.debug:
+            print("[exec-auth]", " ".join(shlex.quote(x) for x in cmd), flush=True)
+        cp = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, timeout=60, encoding="utf-8")
+        if cp.returncode != 0:
+            raise KubeError(f"exec credential plugin failed: {cp.stderr.strip()[:200]}")
+        st = (json.loads(cp.stdout) or {}).get("status") or {}
+        self.creds.token = st.get("token")
+        if st.get("clientCertificateData") and st.get("clientKeyData"):
+            if not self._tmpdir:
+                self._tmpdir = tempfile.mkdtemp(prefix="kt-")
+            for field, fn in (("clientCertificateData", "exec.crt"), ("clientKeyData", "exec.key")):
+                p = os.path.join(self._tmpdir, fn)
+                with open(p, "w", encoding="utf-8") as f:
+                    f.write(st[field])
+                os.chmod(p, 0o600)
+            self.creds.cert_file = os.path.join(self._tmpdir, "exec.crt")
+            self.creds.key_file = os.path.join(self._tmpdir, "exec.key")
+            self._ssl_ctx = None
+        exp = st.get("expirationTimestamp")
+        self.creds.exec_expiry = time.time() + 300
+        if exp:
+            try:
+                self.creds.exec_expiry = datetime.datetime.fromisoformat(exp.replace("Z", "+00:00")).timestamp() - 30
+            except Exception:
+                pass
+
+    def _auth_header(self) -> Optional[str]:
+        c = self.creds
+        if c.exec_cfg:
+            with self._lock:
+                if (not c.token and not c.cert_file) or time.time() >= c.exec_expiry:
+                    self._run_exec()
+        if c.token_file and os.path.exists(c.token_file):
+            with open(c.token_file, "r", encoding="utf-8") as f:
+                return "Bearer " + f.read().strip()
+        if c.token:
+            return "Bearer " + c.token
+        if c.basic:
+            return "Basic " + c.basic
+        return None
+
+    # ---- connection pool ----
+    def _ssl(self):
+        if self._ssl_ctx is None:
+            c = self.creds
+            ctx = ssl.create_default_context(cafile=c.ca_file) if c.ca_file else ssl.create_default_context()
+            if c.insecure:
+                ctx.check_hostname = False
+                ctx.verify_mode = ssl.CERT_NONE
+            if c.cert_file and c.key_file:
+                ctx.load_cert_chain(c.cert_file, c.key_file)
+            self._ssl_ctx = ctx
+        return self._ssl_ctx
+
+    def _new_conn(self):
+        self.stats["connections"] += 1
+        if self._scheme == "http":
+            return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+        conn = http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout, context=self._ssl())
+        if self.creds.tls_server_name:
+            conn.server_hostname = self.creds.tls_server_name  # type: ignore[attr-defined]
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            return self._new_conn()
+
+    def _release(self, conn):
+        if self._pool.qsize() < self.pool_size:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    # ---- requests ----
+    def request(self, method: str, path: str, body=None, query: Optional[dict] = None,
+                content_type: Optional[str] = None, timeout: Optional[float] = None) -> Tuple[int, object]:
+        full = self._base + _build_path(path, query)
+        payload = None
+        headers = {"Accept": "application/json", "User-Agent": "exception-ontime/kube-transport"}
+        if body is not None:
+            payload = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+            headers["Content-Type"] = content_type or (
+                "application/merge-patch+json" if method.upper() == "PATCH" else "application/json")
+        for attempt in range(3):
+            auth = self._auth_header()
+            if auth:
+                headers["Authorization"] = auth
+            conn = self._acquire()
+            if timeout:
+                conn.timeout = timeout
+                if conn.sock:
+                    conn.sock.settimeout(timeout)
+            try:
+                if self.debug:
+                    print(f"[http] {method} {full}", flush=True)
+                conn.request(method.upper(), full, body=payload, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+                status = resp.status
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                    http.client.CannotSendRequest, http.client.BadStatusLine) as e:
+                # keep-alive bị server đóng -> mở kết nối mới và thử lại
+                conn.close()
+                if attempt == 2:
+                    raise KubeError(f"{method} {path}: {e}")
+                continue
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise KubeError(f"{method} {path}: {e}")
+            if timeout and conn.sock:
+                conn.sock.settimeout(self.timeout)
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            self.stats["requests"] += 1
+            if status == 401 and self.creds.exec_cfg and attempt == 0:
+                self.creds.exec_expiry = 0  # token hết hạn sớm -> exec lại
+                continue
+            text = raw.decode("utf-8", "replace")
+            try:
+                return status, (json.loads(text) if text else {})
+            except ValueError:
+                return status, text
+        raise KubeError(f"{method} {path}: retries exhausted")
+
+    def get_json(self, path: str, query: Optional[dict] = None, timeout: Optional[float] = None) -> dict:
+        st, data = self.request("GET", path, query=query, timeout=timeout)
+        if st != 200:
+            msg = data.get("message") if isinstance(data, dict) else str(data)[:200]
+            raise KubeError(f"GET {path} -> {st}: {msg}", st)
+        return data
+
+    def list_resource(self, res: str, namespace: Optional[str] = None, timeout: float = 60,
+                      label_selector: str = "", field_selector: str = "") -> Tuple[List[dict], str, str]:
+        """
+        List 1 resource (phân trang, thử lần lượt API version khi 404).
+        Trả về (items, resourceVersion của list, prefix đã dùng) — rv + prefix để watch tiếp.
+        """
+        query = {"labelSelector": label_selector, "fieldSelector": field_selector}
+        prefixes, _, kind = RESOURCES[res]
+        for i, prefix in enumerate(prefixes):
+            cont = ""
+            rv = ""
+            got: List[dict] = []
+            try:
+                while True:
+                    q = dict(query, limit=int(os.environ.get("KUBE_LIST_CHUNK", "500")))
+                    if cont:
+                        q["continue"] = cont
+                    obj = self.get_json(resource_path(res, namespace, prefix=prefix), q, timeout=timeout)
+                    got.extend(obj.get("items") or [])
+                    meta = obj.get("metadata") or {}
+                    rv = rv or meta.get("resourceVersion") or ""   # các trang sau giữ snapshot của trang đầu
+                    cont = meta.get("continue") or ""
+                    if not cont:
+                        break
+            except KubeError as e:
+                if e.status == 404 and i + 1 < len(prefixes):
+                    continue  # API version chưa có trên cluster -> thử version cũ hơn
+                raise
+            for it in got:
+                it.setdefault("kind", kind)
+            return got, rv, prefix
+        return [], "", prefixes[-1]
+
+    def list_items(self, resources: List[str], namespace: Optional[str] = None, timeout: float = 60,
+                   label_selector: str = "", field_selector: str = "") -> List[dict]:
+        items: List[dict] = []
+        for res in resources:
+            items.extend(self.list_resource(res, namespace, timeout, label_selector, field_selector)[0])
+        return items
+
+    def watch(self, res: str, resource_version: str, namespace: Optional[str] = None,
+              timeout_s: int = 300, prefix: Optional[str] = None) -> Iterator[dict]:
+        """
+        Stream event watch ({"type": ADDED|MODIFIED|DELETED|BOOKMARK|ERROR, "object": ...}) từ resource_version.
+        Dùng kết nối riêng (không lấy từ pool); kết thúc khi server đóng stream (timeoutSeconds).
+        """
+        q = {"watch": "1", "resourceVersion": resource_version, "timeoutSeconds": int(timeout_s),
+             "allowWatchBookmarks": "true"}
+        full = self._base + _build_path(resource_path(res, namespace, prefix=prefix), q)
+        headers = {"Accept": "application/json", "User-Agent": "exception-ontime/kube-transport"}
+        auth = self._auth_header()
+        if auth:
+            headers["Authorization"] = auth
+        conn = self._new_conn()
+        conn.timeout = timeout_s + 30
+        try:
+            if self.debug:
+                print(f"[http] WATCH {full}", flush=True)
+            try:
+                conn.request("GET", full, headers=headers)
+                resp = conn.getresponse()
+            except (OSError, http.client.HTTPException) as e:
+                raise KubeError(f"WATCH {res}: {e}")
+            self.stats["requests"] += 1
+            if resp.status != 200:
+                raw = resp.read().decode("utf-8", "replace")
+                raise KubeError(f"WATCH {res} -> {resp.status}: {raw[:200]}", resp.status)
+            try:
+                for line in resp:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                raise KubeError(f"WATCH {res} stream: {e}")
+        finally:
+            conn.close()
+
+    def scale(self, ns: str, kind: str, name: str, replicas: int, resource_version: str = "") -> Tuple[bool, str]:
+        body = {"spec": {"replicas": int(replicas)}}
+        if resource_version:
+            body["metadata"] = {"resourceVersion": resource_version}
+        path = resource_path(SCALE_RESOURCES.get(kind.lower(), kind), ns, name, "scale")
+        try:
+            st, data = self.request("PATCH", path, body)
+        except KubeError as e:
+            return False, str(e)
+        if 200 <= st < 300:
+            return True, ""
+        return False, f"{st} {data.get('message') if isinstance(data, dict) else data}"
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                break
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+def make_transport(kubeconfig: str = "", context: str = "", request_timeout: str = "10s",
+                   debug: bool = False, backend: str = ""):
+    """Factory theo ENV KUBE_TRANSPORT=kubectl|native (mặc định kubectl)."""
+    backend = (backend or os.environ.get("KUBE_TRANSPORT", "kubectl")).lower()
+    if backend == "native":
+        return NativeTransport(kubeconfig, context, request_timeout, debug)
+    if backend == "kubectl":
+        return KubectlTransport(kubeconfig, context, request_timeout, debug)
+    raise KubeError(f"KUBE_TRANSPORT không hợp lệ: {backend} (kubectl|native)")
+
+if __name__ == "__main__":
+    # smoke: python3 kube_transport.py <path>  -> in JSON (dùng được với fake API server)
+    t = make_transport(os.environ.get("KUBECONFIG_FILE", ""), os.environ.get("KUBE_CONTEXT", ""),
+                       debug=os.environ.get("DEBUG", "0").lower() in ("1", "true", "yes"))
+    st, data = t.request("GET", sys.argv[1] if len(sys.argv) > 1 else "/version")
+    print(st, json.dumps(data, indent=2, ensure_ascii=False) if not isinstance(data, str) else data)
+    sys.exit(0 if st == 200 else 1)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+label_selector.py
+
+So khớp label theo ngữ nghĩa Kubernetes, dùng chung cho các tool node / PDB (không gọi kube):
+
+- matches(): LabelSelector {matchLabels, matchExpressions} (PDB, workload); None = không khớp gì,
+  {} = khớp mọi thứ (như PDB policy/v1)
+- node_selector_matches(): pod.spec.nodeSelector + nodeAffinity required (nodeSelectorTerms OR, expressions AND)
+- tolerates(): pod chịu được toàn bộ taint NoSchedule / NoExecute của node
+- LabelIndex: index ngược (key, value) -> object để tra 1 selector trên nhiều object (pdb_scout join PDB ->
+  workload): matchLabels / In thu hẹp ứng viên bằng posting list nhỏ nhất, rồi mới kiểm đủ bằng matches()
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+def _expr(e: dict, labels: dict) -> bool:
+    key, op, vals = e.get("key", ""), e.get("operator", ""), e.get("values") or []
+    if op == "In":
+        return key in labels and labels[key] in vals
+    if op == "NotIn":
+        return key not in labels or labels[key] not in vals
+    if op == "Exists":
+        return key in labels
+    if op == "DoesNotExist":
+        return key not in labels
+    if op in ("Gt", "Lt"):
+        try:
+            v, ref = int(labels[key]), int(vals[0])
+        except (KeyError, IndexError, ValueError):
+            return False
+        return v > ref if op == "Gt" else v < ref
+    return False
+
+def matches(selector: Optional[dict], labels: Optional[dict]) -> bool:
+    if selector is None:
+        return False
+    labels = labels or {}
+    for k, v in (selector.get("matchLabels") or {}).items():
+        if labels.get(k) != v:
+            return False
+    return all(_expr(e, labels) for e in selector.get("matchExpressions") or [])
+
+def node_selector_matches(pod_spec: dict, node_labels: Optional[dict]) -> bool:
+    labels = node_labels or {}
+    for k, v in (pod_spec.get("nodeSelector") or {}).items():
+        if labels.get(k) != v:
+            return False
+    req = (((pod_spec.get("affinity") or {}).get("nodeAffinity") or {})
+           .get("requiredDuringSchedulingIgnoredDuringExecution") or {})
+    terms = req.get("nodeSelectorTerms") or []
+    if not terms:
+        return True
+    return any(all(_expr(e, labels) for e in t.get("matchExpressions") or []) for t in terms)
+
+def _tolerated(taint: dict, tolerations: List[dict]) -> bool:
+    for t in tolerations:
+        if t.get("effect") and t.get("effect") != taint.get("effect"):
+            continue
+        if t.get("operator") == "Exists":
+            if not t.get("key") or t.get("key") == taint.get("key"):
+                return True
+        elif t.get("key") == taint.get("key") and (t.get("value") or "") == (taint.get("value") or ""):
+            return True
+    return False
+
+def tolerates(pod_spec: dict, taints: Optional[List[dict]]) -> bool:
+    tols = pod_spec.get("tolerations") or []
+    return all(_tolerated(t, tols) for t in taints or []
+               if t.get("effect") in ("NoSchedule", "NoExecute"))
+
+class LabelIndex:
+    """Index object theo label; select() trả id của object có labels khớp selector (thứ tự add)."""
+
+    def __init__(self):
+        self.labels: List[dict] = []
+        self.objs: List[object] = []
+        self.postings: Dict[Tuple[str, str], Set[int]] = {}
+
+    def add(self, obj, labels: Optional[dict]):
+        i = len(self.objs)
+        self.objs.append(obj)
+        self.labels.append(labels or {})
+        for kv in (labels or {}).items():
+            self.postings.setdefault(kv, set()).add(i)
+
+    def __len__(self) -> int:
+        return len(self.objs)
+
+    def _candidates(self, selector: dict) -> Optional[Set[int]]:
+        sets = [self.postings.get(kv, set()) for kv in (selector.get("matchLabels") or {}).items()]
+        for e in selector.get("matchExpressions") or []:
+            if e.get("operator") == "In":
+                u: Set[int] = set()
+                for v in e.get("values") or []:
+                    u |= self.postings.get((e.get("key", ""), v), set())
+                sets.append(u)
+        if not sets:
+            return None     # chỉ NotIn / Exists / DoesNotExist hoặc {} -> phải quét hết
+        sets.sort(key=len)
+        out = set(sets[0])
+        for st in sets[1:]:
+            out &= st
+        return out
+
+    def select(self, selector: Optional[dict]) -> List[object]:
+        if selector is None:
+            return []
+        cand = self._candidates(selector)
+        ids = range(len(self.objs)) if cand is None else sorted(cand)
+        return [self.objs[i] for i in ids if matches(selector, self.labels[i])]
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+node_evictor.py
+
+Evict pod khỏi các node đã cordon, thay cho vòng `kubectl get pod` x2 + `kubectl delete pod` tuần tự của evict.sh:
+
+- 1 lần list nodes (node Ready + SchedulingDisabled khớp regex, như evict.sh) + 1 lần list pods mỗi node
+  (fieldSelector spec.nodeName) -> annotation / ownerReferences đọc từ kết quả list, không get lại từng pod
+- Bỏ qua (như evict.sh): namespace khớp EVICT_EXCLUDE_NS, annotation unsafe-to-evict=true, pod của DaemonSet;
+  thêm: mirror pod (static pod), pod đang bị xoá
+- Evict qua Eviction API (POST pods/{name}/eviction) -> apiserver kiểm PDB; 429 (PDB chưa cho phép / throttle)
+  retry backoff luỹ thừa (tôn trọng retryAfterSeconds) tới EVICT_TIMEOUT_S, hết hạn -> `blocked`; pod chờ retry
+  nằm trong heap theo thời điểm thử lại, không chiếm worker (pod bị PDB chặn không làm nghẽn pod khác)
+- Chạy song song EVICT_CONCURRENCY pod, đồng thời tối đa EVICT_PER_PDB request evict cùng 1 PDB và EVICT_PER_NS
+  request cùng 1 namespace (PDB list 1 lần cho các ns liên quan, khớp selector bằng label_selector)
+- Report từng pod (evicted | gone | skipped | dry-run | blocked | failed, lý do, số lần thử, thời gian) ghi JSON
+
+ENV:
+  EVICT_EXCLUDE_NS   = sb-check|sb-logging|sb-vhht   (regex namespace không evict; rỗng = không loại ns nào)
+  EVICT_CONCURRENCY  = 10
+  EVICT_PER_PDB      = 1
+  EVICT_PER_NS       = 3
+  EVICT_TIMEOUT_S    = 300   (tổng thời gian retry 429 cho 1 pod)
+  EVICT_BACKOFF_S    = 1     (backoff gốc, nhân đôi mỗi lần, trần 30s)
+  EVICT_REPORT       = evict-report.json
+
+CLI (cùng tham số evict.sh):
+  python3 node_evictor.py "<node regex>" [--dry-run] [--report=FILE]
+"""
+
+import os, re, sys, json, time, heapq, random, datetime, threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple
+from kube_transport import make_transport, resource_path, KubeError
+import label_selector
+
+EXCLUDE_NS    = os.environ.get("EVICT_EXCLUDE_NS", "sb-check|sb-logging|sb-vhht")
+CONCURRENCY   = max(1, int(os.environ.get("EVICT_CONCURRENCY", "10")))
+PER_PDB       = max(1, int(os.environ.get("EVICT_PER_PDB", "1")))
+PER_NS        = max(1, int(os.environ.get("EVICT_PER_NS", "3")))
+TIMEOUT_S     = float(os.environ.get("EVICT_TIMEOUT_S", "300"))
+BACKOFF_S     = float(os.environ.get("EVICT_BACKOFF_S", "1"))
+REPORT        = os.environ.get("EVICT_REPORT", "evict-report.json")
+DEBUG         = os.environ.get("DEBUG", "0").lower() in ("1", "true", "yes")
+
+UNSAFE_ANNOTATION = "unsafe-to-evict"
+MIRROR_ANNOTATION = "kubernetes.io/config.mirror"
+
+def _backoff(attempt: int, retry_after=None) -> float:
+    if retry_after:
+        try:
+            return min(30.0, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+    return min(30.0, BACKOFF_S * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+def _message(data) -> str:
+    if isinstance(data, dict):
+        return str(data.get("message") or data.get("reason") or "")[:200]
+    return str(data or "")[:200]
+
+def cordoned_nodes(nodes: List[dict], pattern: str) -> List[str]:
+    """Node Ready + unschedulable (cột STATUS `Ready,SchedulingDisabled` của evict.sh) khớp regex, sort."""
+    rx = re.compile(pattern)
+    out = set()
+    for n in nodes:
+        name = (n.get("metadata") or {}).get("name", "")
+        conds = (n.get("status") or {}).get("conditions") or []
+        ready = any(c.get("type") == "Ready" and c.get("status") == "True" for c in conds) or not conds
+        if (n.get("spec") or {}).get("unschedulable") and ready and rx.search(name):
+            out.add(name)
+    return sorted(out)
+
+def skip_reason(pod: dict, exclude_ns: str = None) -> str:
+    """Lý do không evict pod ('' = evict)."""
+    meta = pod.get("metadata") or {}
+    ann = meta.get("annotations") or {}
+    exclude_ns = EXCLUDE_NS if exclude_ns is None else exclude_ns
+    if exclude_ns and re.search(exclude_ns, meta.get("namespace", "")):
+        return "excluded namespace"
+    if str(ann.get(UNSAFE_ANNOTATION, "")).lower() == "true":
+        return "unsafe-to-evict=true"
+    refs = meta.get("ownerReferences") or []
+    if refs and refs[0].get("kind") == "DaemonSet":
+        return "DaemonSet"
+    if MIRROR_ANNOTATION in ann:
+        return "mirror pod"
+    if meta.get("deletionTimestamp"):
+        return "terminating"
+    return ""
+
+class Limits:
+    """Semaphore theo PDB và theo namespace; lấy theo thứ tự key cố định (không deadlock)."""
+
+    def __init__(self, per_pdb: int = None, per_ns: int = None):
+        self.per_pdb = per_pdb or PER_PDB
+        self.per_ns = per_ns or PER_NS
+        self._sems: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _sem(self, key: str) -> threading.Semaphore:
+        with self._lock:
+            if key not in self._sems:
+                self._sems[key] = threading.Semaphore(self.per_pdb if key.startswith("pdb:") else self.per_ns)
+            return self._sems[key]
+
+    def hold(self, ns: str, pdbs: List[str]) -> ExitStack:
+        stack = ExitStack()
+        for key in sorted([f"ns:{ns}"] + [f"pdb:{p}" for p in pdbs]):
+            sem = self._sem(key)
+            sem.acquire()
+            stack.callback(sem.release)
+        return stack
+
+def pdbs_for(pod: dict, pdb_ns: Dict[str, List[dict]]) -> List[str]:
+    meta = pod.get("metadata") or {}
+    ns = meta.get("namespace", "")
+    return [f"{ns}/{b['metadata']['name']}" for b in pdb_ns.get(ns, [])
+            if label_selector.matches((b.get("spec") or {}).get("selector"), meta.get("labels"))]
+
+def list_pdbs(t, namespaces: List[str]) -> Dict[str, List[dict]]:
+    """PDB của các ns liên quan: 1 lần list toàn cluster; không có quyền cluster-wide (403) -> list song song theo ns."""
+    want = set(namespaces)
+    try:
+        items = t.list_items(["poddisruptionbudgets"])
+    except KubeError as e:
+        if e.status != 403:
+            raise
+        with ThreadPoolExecutor(max_workers=min(CONCURRENCY, len(namespaces)) or 1) as ex:
+            items = [b for lst in ex.map(lambda ns: t.list_items(["poddisruptionbudgets"], namespace=ns), namespaces)
+                     for b in lst]
+    out: Dict[str, List[dict]] = {}
+    for b in items:
+        ns = (b.get("metadata") or {}).get("namespace", "")
+        if ns in want:
+            out.setdefault(ns, []).append(b)
+    return out
+
+def new_result(pod: dict, pdbs: List[str]) -> dict:
+    meta = pod.get("metadata") or {}
+    return {"node": (pod.get("spec") or {}).get("nodeName", ""), "ns": meta.get("namespace", ""),
+            "pod": meta.get("name", ""), "pdbs": pdbs, "status": "pending", "reason": "",
+            "attempts": 0, "throttled": 0, "duration_s": 0.0, "_started": time.time()}
+
+def evict_attempt(t, res: dict, limits: Limits, timeout_s: float = None) -> Optional[float]:
+    """1 lần POST eviction -> số giây chờ trước lần thử kế tiếp, None nếu đã có kết quả cuối."""
+    ns, name = res["ns"], res["pod"]
+    timeout_s = TIMEOUT_S if timeout_s is None else timeout_s
+    body = {"apiVersion": "policy/v1", "kind": "Eviction", "metadata": {"name": name, "namespace": ns}}
+    res["attempts"] += 1
+    # giữ slot ns / PDB chỉ trong lúc gọi API; backoff không chiếm worker (xếp lịch ở run_evictions)
+    with limits.hold(ns, res["pdbs"]):
+        try:
+            st, data = t.request("POST", resource_path("pods", ns, name, "eviction"), body)
+        except KubeError as e:
+            st, data = 0, str(e)
+    elapsed = time.time() - res["_started"]
+    res["duration_s"] = round(elapsed, 3)
+    if 200 <= st < 300:
+        res["status"] = "evicted"
+        print(f"🗑️  Evicted pod: {name} (namespace: {ns})", flush=True)
+        return None
+    if st == 404:
+        res["status"], res["reason"] = "gone", "pod không còn"
+        return None
+    if st in (429, 500, 502, 503, 504, 0) and elapsed < timeout_s:
+        res["throttled"] += int(st == 429)
+        retry_after = (data.get("details") or {}).get("retryAfterSeconds") if isinstance(data, dict) else None
+        delay = min(_backoff(res["attempts"] - 1, retry_after), max(0.0, timeout_s - elapsed))
+        if DEBUG:
+            print(f"[DEBUG] {ns}/{name} -> {st} {_message(data)} (retry {delay:.1f}s)", flush=True)
+        return delay
+    res["status"] = "blocked" if st == 429 else "failed"
+    res["reason"] = f"{st} {_message(data)}".strip()
+    print(f"{'⏳' if st == 429 else '❌'} {res['status']}: {name} (namespace: {ns}) {res['reason']}", flush=True)
+    return None
+
+def run_evictions(t, results: List[dict], limits: Limits, concurrency: int = None, timeout_s: float = None):
+    """Chạy song song tối đa `concurrency` request; pod bị 429 xếp lại theo thời điểm retry (heap)."""
+    concurrency = concurrency or CONCURRENCY
+    ready = [(0.0, i) for i in range(len(results))]
+    heapq.heapify(ready)
+    inflight: Dict[Future, int] = {}
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(results)) or 1) as ex:
+        while ready or inflight:
+            now = time.time()
+            while ready and ready[0][0] <= now and len(inflight) < concurrency:
+                _, i = heapq.heappop(ready)
+                inflight[ex.submit(evict_attempt, t, results[i], limits, timeout_s)] = i
+            wait_s = max(0.0, ready[0][0] - now) if ready else None
+            if not inflight:
+                time.sleep(wait_s or 0)
+                continue
+            done, _ = wait(list(inflight), timeout=wait_s, return_when=FIRST_COMPLETED)
+            for f in done:
+                i = inflight.pop(f)
+                try:
+                    delay = f.result()
+                except Exception as e:          # lỗi ngoài dự kiến của 1 pod không dừng cả run
+                    results[i]["status"], results[i]["reason"] = "failed", str(e)[:200]
+                    delay = None
+                if delay is not None:
+                    heapq.heappush(ready, (time.time() + delay, i))
+    for r in results:
+        r.pop("_started", None)
+
+def write_report(path: str, started: float, nodes: List[str], results: List[dict]):
+    totals: Dict[str, int] = {"pods": len(results)}
+    for r in results:
+        totals[r["status"]] = totals.get(r["status"], 0) + 1
+    rep = {"started_at": datetime.datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+           "duration_s": round(time.time() - started, 3), "nodes": nodes, "totals": totals,
+           "pods": sorted(results, key=lambda r: (r["node"], r["ns"], r["pod"]))}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(rep, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return rep
+
+def run(t, pattern: str, dry_run: bool = False, report_path: str = None) -> Tuple[int, Optional[dict]]:
+    started = time.time()
+    if dry_run:
+        print("🔍 Chạy ở chế độ dry-run: KHÔNG evict pod thật, chỉ in lệnh")
+    print(f"📦 Kiểm tra các node bị cordoned, khớp pattern: {pattern}")
+    nodes = cordoned_nodes(t.list_items(["nodes"]), pattern)
+    if not nodes:
+        print("✅ Không có node nào bị cordoned phù hợp pattern.")
+        return 0, None
+
+    with ThreadPoolExecutor(max_workers=min(CONCURRENCY, len(nodes))) as ex:
+        per_node = list(ex.map(lambda n: t.list_items(["pods"], field_selector=f"spec.nodeName={n}"), nodes))
+    results, todo = [], []
+    for node, pods in zip(nodes, per_node):
+        print(f"⚠️  Đang xử lý node: {node} ({len(pods)} pod)")
+        for p in pods:
+            why = skip_reason(p)
+            if why:
+                m = p.get("metadata") or {}
+                if why != "excluded namespace":
+                    print(f"⏭️  Bỏ qua pod {m.get('name')} (namespace: {m.get('namespace')}): {why}")
+                results.append({"node": node, "ns": m.get("namespace", ""), "pod": m.get("name", ""), "pdbs": [],
+                                "status": "skipped", "reason": why, "attempts": 0, "throttled": 0, "duration_s": 0.0})
+            else:
+                todo.append(p)
+
+    pdb_ns: Dict[str, List[dict]] = {}
+    if todo and not dry_run:
+        pdb_ns = list_pdbs(t, sorted({(p.get("metadata") or {}).get("namespace", "") for p in todo}))
+    if dry_run:
+        for p in todo:
+            r = new_result(p, [])
+            r["status"] = "dry-run"
+            r.pop("_started")
+            print(f"[dry-run] evict pod {r['pod']} -n {r['ns']}")
+            results.append(r)
+    elif todo:
+        batch = [new_result(p, pdbs_for(p, pdb_ns)) for p in todo]
+        run_evictions(t, batch, Limits())
+        results += batch
+
+    rep = write_report(report_path or REPORT, started, nodes, results)
+    print("📊 " + " ".join(f"{k}={v}" for k, v in rep["totals"].items()) + f" → {report_path or REPORT}")
+    print("🏁 Hoàn tất xử lý.")
+    return (1 if rep["totals"].get("failed") or rep["totals"].get("blocked") else 0), rep
+
+def main(argv: List[str]) -> int:
+    args = [a for a in argv if not a.startswith("--")]
+    if not args:
+        print(__doc__)
+        return 2
+    report = next((a.split("=", 1)[1] for a in argv if a.startswith("--report=")), None)
+    try:
+        t = make_transport(os.environ.get("KUBECONFIG_FILE") or os.environ.get("KUBECONFIG") or "",
+                           os.environ.get("KUBE_CONTEXT", ""), os.environ.get("KUBECTL_TIMEOUT", "10s"), DEBUG)
+        rc, _ = run(t, args[0], "--dry-run" in argv, report)
+    except (KubeError, re.error) as e:
+        print(f"❌ evict: {e}")
+        return 2
+    return rc
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
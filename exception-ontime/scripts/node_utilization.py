@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+node_utilization.py
+
+Engine tính mức dùng node cho resources/check-ultilized.sh: 1 lần list nodes + 1 lần list pods toàn cluster
+thay cho `kubectl get node` + `kubectl describe node` từng node (và describe lại peer trong nodegroup),
+mọi phép tính làm trong process thay vì fork `bc`.
+
+- Requested của node = tổng request các pod đã bind vào node, như "Allocated resources" của describe:
+  mỗi pod max(tổng containers + sidecar, từng initContainer) + overhead; pod Succeeded/Failed không tính
+- Allocatable lấy từ status.allocatable; quantity parse đủ hậu tố (m, k/M/G/T, Ki/Mi/Gi/Ti, số mũ)
+- Cộng dồn theo node và theo nodegroup trong 1 lượt duyệt pods (không gọi API theo node)
+- Bảng in ra giữ nguyên format / cách làm tròn (cắt như bc scale=2, scale=1) và logic chọn node yếu nhất
+  của check-ultilized.sh; `--json` ghi thêm báo cáo đầy đủ (node, nodegroup, kết quả kiểm tra evacuate)
+- Nodegroup = tên node bỏ 2 khối cuối theo '-' (như script sh); NODEGROUP_LABEL set -> lấy theo label node
+- `--consolidate[=N]`: thay bước "1 node yếu nhất" bằng consolidation_planner (mô phỏng đặt từng pod lên node
+  khác theo taint / nodeSelector / PDB) -> cordon + evict nhiều node trong 1 run
+
+ENV:
+  NODE_MIN_AGE_S          = 1800   (node trẻ hơn -> bỏ qua, như AGE_THRESHOLD)
+  NODE_UNDERUTIL_PCT      = 45     (CPU% và Mem% đều dưới ngưỡng -> underutilized)
+  NODEGROUP_LABEL         = ""     (vd cloud.google.com/gke-nodepool)
+  NODE_UTIL_POD_SELECTOR  = status.phase!=Succeeded,status.phase!=Failed
+  RESOURCES_DIR           = <repo>/resources   (cordon.sh / evict.sh cho --promote-evict)
+  CONSOLIDATE_MAX_NODES   = 3      (--consolidate không kèm N; 0 = không giới hạn)
+
+CLI (cùng tham số check-ultilized.sh):
+  python3 node_utilization.py [--include=REGEX] [--exclude=REGEX] [--promote-evict] [--consolidate[=N]] [--json=FILE|-]
+"""
+
+import os, re, sys, json, time, datetime, subprocess
+from decimal import Decimal, ROUND_DOWN, ROUND_CEILING, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+from kube_transport import make_transport, KubeError
+
+MIN_AGE_S        = int(os.environ.get("NODE_MIN_AGE_S", "1800"))
+UNDERUTIL_PCT    = Decimal(os.environ.get("NODE_UNDERUTIL_PCT", "45"))
+NODEGROUP_LABEL  = os.environ.get("NODEGROUP_LABEL", "").strip()
+POD_SELECTOR     = os.environ.get("NODE_UTIL_POD_SELECTOR", "status.phase!=Succeeded,status.phase!=Failed")
+RESOURCES_DIR    = os.environ.get("RESOURCES_DIR", "").strip() or \
+                   os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "resources"))
+CONSOLIDATE_MAX  = int(os.environ.get("CONSOLIDATE_MAX_NODES", "3"))
+DEBUG            = os.environ.get("DEBUG", "0").lower() in ("1", "true", "yes")
+
+GiB = 1024 ** 3
+ROW = "%-40s %-15s %-15s %-10s %-15s %-15s %-10s %-15s"
+
+# ===== Quantity =====
+_SUFFIX = {
+    "n": Decimal("1e-9"), "u": Decimal("1e-6"), "m": Decimal("1e-3"), "": Decimal(1),
+    "k": Decimal(10) ** 3, "M": Decimal(10) ** 6, "G": Decimal(10) ** 9, "T": Decimal(10) ** 12,
+    "P": Decimal(10) ** 15, "E": Decimal(10) ** 18,
+    "Ki": Decimal(2) ** 10, "Mi": Decimal(2) ** 20, "Gi": Decimal(2) ** 30, "Ti": Decimal(2) ** 40,
+    "Pi": Decimal(2) ** 50, "Ei": Decimal(2) ** 60,
+}
+_RE_QTY = re.compile(r"([+-]?(?:\d+\.?\d*|\.\d+))([eE][+-]?\d+|[numkKMGTPE]i?|)")
+
+def parse_quantity(q) -> Decimal:
+    """'250m' -> 0.25, '1Gi' -> 1073741824, '1e3' -> 1000; sai cú pháp -> ValueError."""
+    if isinstance(q, (int, float)):
+        return Decimal(str(q))
+    m = _RE_QTY.fullmatch(str(q).strip())
+    if not m:
+        raise ValueError(f"quantity không hợp lệ: {q!r}")
+    base, suf = m.group(1), m.group(2)
+    try:
+        if suf in _SUFFIX:
+            return Decimal(base) * _SUFFIX[suf]
+        return Decimal(base) * Decimal(10) ** int(suf[1:])      # 1e3, 5E-2
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"quantity không hợp lệ: {q!r}")
+
+def cpu_milli(q) -> int:
+    """CPU -> millicore (làm tròn lên như MilliValue của apimachinery)."""
+    return int((parse_quantity(q) * 1000).to_integral_value(ROUND_CEILING)) if q not in (None, "") else 0
+
+def mem_bytes(q) -> int:
+    return int(parse_quantity(q).to_integral_value(ROUND_CEILING)) if q not in (None, "") else 0
+
+# ===== Pod requests =====
+def _req(c: dict) -> Tuple[int, int]:
+    r = (c.get("resources") or {}).get("requests") or {}
+    return cpu_milli(r.get("cpu")), mem_bytes(r.get("memory"))
+
+def pod_requests(pod: dict) -> Tuple[int, int]:
+    """
+    (cpu_m, mem_b) theo cách scheduler / describe tính: max(tổng containers + sidecar, từng initContainer
+    + sidecar khởi động trước nó) + overhead.
+    """
+    spec = pod.get("spec") or {}
+    cpu = mem = 0
+    for c in spec.get("containers") or []:
+        a, b = _req(c)
+        cpu, mem = cpu + a, mem + b
+    init_cpu = init_mem = side_cpu = side_mem = 0
+    for c in spec.get("initContainers") or []:
+        a, b = _req(c)
+        if c.get("restartPolicy") == "Always":      # sidecar: chạy suốt vòng đời pod
+            side_cpu, side_mem = side_cpu + a, side_mem + b
+            init_cpu, init_mem = max(init_cpu, side_cpu), max(init_mem, side_mem)
+        else:
+            init_cpu, init_mem = max(init_cpu, side_cpu + a), max(init_mem, side_mem + b)
+    cpu, mem = max(cpu + side_cpu, init_cpu), max(mem + side_mem, init_mem)
+    oh = spec.get("overhead") or {}
+    return cpu + cpu_milli(oh.get("cpu")), mem + mem_bytes(oh.get("memory"))
+
+# ===== bc-compatible format =====
+def _trunc(x: Decimal, scale: int) -> Decimal:
+    return x.quantize(Decimal(1).scaleb(-scale), rounding=ROUND_DOWN)
+
+def bc_div(x, divisors: List[int], scale: int = 2) -> Decimal:
+    """`echo "scale=N; x / d1 / d2" | bc`: cắt (không làm tròn) sau mỗi phép chia."""
+    v = Decimal(x)
+    for d in divisors:
+        v = _trunc(v / d, scale)
+    return v
+
+def bc_ratio(req: Decimal, alloc: Decimal) -> Decimal:
+    return Decimal(0) if alloc == 0 else _trunc(100 * req / alloc, 1)
+
+def bc_str(v: Decimal) -> str:
+    """In như bc: 0 -> '0', 0.71 -> '.71', -0.5 -> '-.5'."""
+    if v == 0:
+        return "0"
+    s = str(v)
+    if s.startswith("0."):
+        return s[1:]
+    if s.startswith("-0."):
+        return "-" + s[2:]
+    return s
+
+# ===== Inventory =====
+def nodegroup_of(name: str, labels: Optional[dict] = None) -> str:
+    if NODEGROUP_LABEL and labels and labels.get(NODEGROUP_LABEL):
+        return labels[NODEGROUP_LABEL]
+    return "-".join(name.split("-")[:-2])
+
+def _ts(s: str) -> Optional[float]:
+    try:
+        return datetime.datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def node_rows(nodes: List[dict], pods: List[dict]) -> List[dict]:
+    """Node list + pod list -> 1 dict mỗi node (giữ thứ tự list nodes), requested cộng dồn 1 lượt qua pods."""
+    rows: Dict[str, dict] = {}
+    for n in nodes:
+        meta = n.get("metadata") or {}
+        alloc = (n.get("status") or {}).get("allocatable") or {}
+        name = meta.get("name", "")
+        rows[name] = {
+            "name": name, "nodegroup": nodegroup_of(name, meta.get("labels")),
+            "created": _ts(meta.get("creationTimestamp")),
+            "unschedulable": bool((n.get("spec") or {}).get("unschedulable")),
+            "alloc_cpu_m": cpu_milli(alloc.get("cpu")), "alloc_mem_b": mem_bytes(alloc.get("memory")),
+            "req_cpu_m": 0, "req_mem_b": 0, "pods": 0,
+        }
+    for p in pods:
+        r = rows.get((p.get("spec") or {}).get("nodeName") or "")
+        if r is None or (p.get("status") or {}).get("phase") in ("Succeeded", "Failed"):
+            continue
+        cpu, mem = pod_requests(p)
+        r["req_cpu_m"] += cpu
+        r["req_mem_b"] += mem
+        r["pods"] += 1
+    return list(rows.values())
+
+def fetch(transport) -> Tuple[List[dict], List[dict]]:
+    """(nodes, pods): đúng 2 lần list cho cả cluster."""
+    return transport.list_items(["nodes"]), transport.list_items(["pods"], field_selector=POD_SELECTOR)
+
+def load(transport) -> List[dict]:
+    return node_rows(*fetch(transport))
+
+# ===== Analysis =====
+def annotate(row: dict) -> dict:
+    """Thêm các cột của bảng (giá trị đã cắt như bc) + cờ underutilized."""
+    row["req_core"] = bc_div(row["req_cpu_m"], [1000])
+    row["alloc_core"] = bc_div(row["alloc_cpu_m"], [1000])
+    row["req_gib"] = bc_div(row["req_mem_b"], [1024, 1024, 1024])
+    row["alloc_gib"] = bc_div(row["alloc_mem_b"], [1024, 1024, 1024])
+    row["cpu_pct"] = bc_ratio(row["req_core"], row["alloc_core"])
+    row["mem_pct"] = bc_ratio(row["req_gib"], row["alloc_gib"])
+    row["underutilized"] = row["cpu_pct"] < UNDERUTIL_PCT and row["mem_pct"] < UNDERUTIL_PCT
+    return row
+
+def nodegroups(rows: List[dict]) -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    for r in rows:
+        g = out.setdefault(r["nodegroup"], {"nodes": 0, "alloc_cpu_m": 0, "req_cpu_m": 0,
+                                            "alloc_mem_b": 0, "req_mem_b": 0, "underutilized": 0})
+        g["nodes"] += 1
+        for k in ("alloc_cpu_m", "req_cpu_m", "alloc_mem_b", "req_mem_b"):
+            g[k] += r[k]
+        g["underutilized"] += int(r["underutilized"])
+    for g in out.values():
+        g["free_cpu_m"] = g["alloc_cpu_m"] - g["req_cpu_m"]
+        g["free_mem_b"] = g["alloc_mem_b"] - g["req_mem_b"]
+        g["cpu_pct"] = round(100.0 * g["req_cpu_m"] / g["alloc_cpu_m"], 1) if g["alloc_cpu_m"] else 0.0
+        g["mem_pct"] = round(100.0 * g["req_mem_b"] / g["alloc_mem_b"], 1) if g["alloc_mem_b"] else 0.0
+    return out
+
+def weakest(rows: List[dict]) -> Optional[dict]:
+    """Node underutilized có CPU% thấp nhất (hoà -> node đứng trước, như script sh)."""
+    best = None
+    for r in rows:
+        if r["underutilized"] and (best is None or r["cpu_pct"] < best["cpu_pct"]):
+            best = r
+    return best
+
+def evacuation(rows: List[dict], node: dict) -> dict:
+    """Tổng free (allocatable - requested) của các node cùng nodegroup có đủ chứa requested của `node`."""
+    peers = [r for r in rows if r["name"] != node["name"] and r["nodegroup"] == node["nodegroup"]]
+    free_cpu = sum(r["alloc_cpu_m"] - r["req_cpu_m"] for r in peers)
+    free_mem = sum(r["alloc_mem_b"] - r["req_mem_b"] for r in peers)
+    return {"node": node["name"], "nodegroup": node["nodegroup"], "peers": [r["name"] for r in peers],
+            "free_cpu_m": free_cpu, "free_mem_b": free_mem,
+            "needed_cpu_m": node["req_cpu_m"], "needed_mem_b": node["req_mem_b"],
+            "ok": free_cpu >= node["req_cpu_m"] and free_mem >= node["req_mem_b"]}
+
+def _jsonable(row: dict) -> dict:
+    return {k: (float(v) if isinstance(v, Decimal) else v) for k, v in row.items()}
+
+# ===== CLI =====
+def parse_args(argv: List[str]) -> Optional[dict]:
+    opts = {"include": "", "exclude": "", "promote": False, "json": "", "consolidate": None}
+    for arg in argv:
+        if arg.startswith("--include="):
+            opts["include"] = arg.split("=", 1)[1]
+        elif arg.startswith("--exclude="):
+            opts["exclude"] = arg.split("=", 1)[1]
+        elif arg == "--promote-evict":
+            opts["promote"] = True
+        elif arg.startswith("--json="):
+            opts["json"] = arg.split("=", 1)[1]
+        elif arg == "--consolidate" or arg.startswith("--consolidate="):
+            n = arg.split("=", 1)[1] if "=" in arg else ""
+            if n and not n.isdigit():
+                print(f"❌ --consolidate cần số node: {arg}")
+                return None
+            opts["consolidate"] = int(n) if n else CONSOLIDATE_MAX
+        else:
+            print(f"❌ Unknown argument: {arg}")
+            return None
+    return opts
+
+def _sh(script: str, *args: str) -> int:
+    return subprocess.call(["sh", os.path.join(RESOURCES_DIR, script), *args])
+
+def consolidate(t, nodes: List[dict], pods: List[dict], rows: List[dict], opts: dict, say, report: dict) -> int:
+    """Bước gom node (--consolidate): ứng viên = node underutilized, nodegroup không bị --exclude, chưa cordon."""
+    import consolidation_planner
+    ex = re.compile(opts["exclude"]) if opts["exclude"] else None
+    cands = [r["name"] for r in rows if r["underutilized"] and not r["unschedulable"]
+             and not (ex and ex.search(r["nodegroup"]))]
+    if not cands:
+        say("\n✅ No underutilized node eligible for consolidation")
+        return 0
+    try:
+        pdbs = t.list_items(["poddisruptionbudgets"])
+    except KubeError as e:
+        print(f"❌ list PDB: {e}")
+        return 2
+    plan = report["consolidation"] = consolidation_planner.build_consolidation(
+        nodes, pods, pdbs, cands, max_nodes=opts["consolidate"])
+    say(f"\n🧮 Consolidation: {len(plan['drain'])}/{len(cands)} candidate node(s) can be drained together"
+        f" (max {opts['consolidate'] or 'unlimited'})")
+    moved: Dict[str, int] = {}
+    for m in plan["moves"]:
+        moved[m["from"]] = moved.get(m["from"], 0) + 1
+    for n in plan["drain"]:
+        targets = sorted({m["to"] for m in plan["moves"] if m["from"] == n})
+        say(f"  🔻 {n}: {moved.get(n, 0)} pod(s) → {', '.join(targets) or '-'}")
+    for n, why in plan["blocked"].items():
+        say(f"  ⛔ {n}: {why}")
+    if not plan["drain"]:
+        return 0
+    if not opts["promote"]:
+        say("⚠️ Skipping cordon & evict due to missing --promote-evict flag")
+        return 0
+    _sh("cordon.sh", *plan["drain"])
+    _sh("evict.sh", "^(" + "|".join(re.escape(n) for n in plan["drain"]) + ")$")
+    return 0
+
+def main(argv: List[str]) -> int:
+    opts = parse_args(argv)
+    if opts is None:
+        return 1
+    quiet = opts["json"] == "-"
+    say = (lambda *a: None) if quiet else (lambda *a: print(*a, flush=True))
+    report = {"generated_at": time.time(), "min_age_s": MIN_AGE_S, "underutil_pct": float(UNDERUTIL_PCT),
+              "nodes": [], "nodegroups": {}, "weakest": None, "evacuation": None}
+
+    def finish(rc: int) -> int:
+        if opts["json"]:
+            out = json.dumps(report, ensure_ascii=False, indent=2)
+            if quiet:
+                print(out)
+            else:
+                with open(opts["json"], "w", encoding="utf-8") as f:
+                    f.write(out)
+        return rc
+
+    say("### PHASE I - CHECK NODE UTILIZATION")
+    t0 = time.time()
+    try:
+        t = make_transport(os.environ.get("KUBECONFIG_FILE") or os.environ.get("KUBECONFIG") or "",
+                           os.environ.get("KUBE_CONTEXT", ""), os.environ.get("KUBECTL_TIMEOUT", "10s"), DEBUG)
+        nodes, pods = fetch(t)
+        rows = node_rows(nodes, pods)
+    except (KubeError, ValueError) as e:
+        print(f"❌ node utilization: {e}")
+        return 2
+    if DEBUG:
+        print(f"[DEBUG] listed {len(rows)} node(s) in {time.time() - t0:.2f}s", flush=True)
+
+    if opts["include"]:
+        rx = re.compile(opts["include"])
+        rows = [r for r in rows if rx.search(r["name"])]
+    else:
+        say("⚠️ Node pattern group is empty. Auto-grouping nodes based on naming convention.")
+    if not rows:
+        say("❌ No matching nodes found!")
+        return finish(1)
+
+    now = time.time()
+    rows = [annotate(r) for r in rows if r["created"] is not None and now - r["created"] >= MIN_AGE_S]
+    report["nodes"] = [_jsonable(r) for r in rows]
+    report["nodegroups"] = nodegroups(rows)
+    if not rows:
+        say(f"⚠️ No eligible nodes older than {MIN_AGE_S} seconds found!")
+        return finish(0)
+
+    say("\n" + ROW % ("Node", "CPU Req", "CPU Total", "CPU%", "Mem Req (GiB)", "Mem Total", "Mem%", "Underutilized?"))
+    say(ROW % ("-" * 40, "-" * 15, "-" * 15, "-" * 8, "-" * 15, "-" * 15, "-" * 8, "-" * 17))
+    for r in rows:
+        say(ROW % (r["name"], bc_str(r["req_core"]), bc_str(r["alloc_core"]), bc_str(r["cpu_pct"]) + "%",
+                   bc_str(r["req_gib"]), bc_str(r["alloc_gib"]), bc_str(r["mem_pct"]) + "%",
+                   "Yes" if r["underutilized"] else "No"))
+
+    if opts["consolidate"] is not None:
+        return finish(consolidate(t, nodes, pods, rows, opts, say, report))
+
+    low = weakest(rows)
+    if not low:
+        say("\n✅ No underutilized node found (CPU+MEM < 45%)")
+        return finish(0)
+    report["weakest"] = low["name"]
+    say(f"\n👉 Weakest node (CPU+MEM < 50%): {low['name']} ({bc_str(low['cpu_pct'])}% CPU)")
+    group = low["nodegroup"]
+    if opts["exclude"] and re.search(opts["exclude"], group):
+        say(f"⚠️ Nodegroup [{group}] is excluded by pattern [{opts['exclude']}]. Aborting eviction.")
+        return finish(0)
+
+    say(f"🔍 Checking nodegroup resource availability in group [{group}]...")
+    ev = report["evacuation"] = evacuation(rows, low)
+    if ev["ok"]:
+        say("✅ Nodegroup has enough free resources for evacuation.")
+        if opts["promote"]:
+            _sh("cordon.sh", low["name"])
+            _sh("evict.sh", low["name"])
+        else:
+            say("⚠️ Skipping cordon & evict due to missing --promote-evict flag")
+    else:
+        say(f"❌ Nodegroup does NOT have enough resources to evacuate {low['name']}")
+        say(f"Free CPU: {bc_str(bc_div(ev['free_cpu_m'], [1000]))} / Needed: {bc_str(low['req_core'])} (core)")
+        say(f"Free MEM: {bc_str(bc_div(ev['free_mem_b'], [1024, 1024, 1024]))} / Needed: {bc_str(low['req_gib'])} (GiB)")
+    return finish(0)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ns_matcher.py
+
+Compile managed-ns.txt / deny-ns.txt (regex mỗi dòng, `#` là comment) một lần thành matcher:
+
+- Pattern dạng literal prefix (`^sb-`, `^sb-.*`, `^team\\.x`) -> prefix trie, đi theo từng ký tự của ns
+- Pattern dạng literal exact (`^sb-trino$`)         -> set
+- Còn lại gom thành 1 regex alternation `(?:p1)|(?:p2)|...` (compile 1 lần)
+- Deny luôn thắng allow (giữ nguyên ngữ nghĩa cũ: deny trước, rồi mới xét allow)
+
+load_matcher() cache theo (path, mtime, size) của 2 file, trong 1 process: gọi lại nhiều lần trong 1 run
+không đọc/compile lại khi file không đổi (mỗi run scaler là process mới nên vẫn compile 1 lần / run). explain(ns) trả về pattern nào đã quyết định (dùng cho --explain-ns).
+"""
+
+import os, re
+from typing import Dict, List, Optional, Tuple
+
+_META = set(".^$*+?{}[]|()\\")
+_INLINE_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+
+def _literal(p: str) -> Optional[str]:
+    """
+    Trả về chuỗi literal nếu p chỉ gồm ký tự thường (hoặc escape của ký tự không phải chữ/số), ngược lại None.
+    """
+    out = []
+    i = 0
+    while i < len(p):
+        c = p[i]
+        if c == "\\":
+            if i + 1 >= len(p) or p[i + 1].isalnum() or p[i + 1] == "_":
+                return None   # \d, \w, \b ... là class/anchor, không phải literal
+            out.append(p[i + 1])
+            i += 2
+            continue
+        if c in _META:
+            return None
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+def classify(p: str) -> Tuple[str, str]:
+    """
+    ("prefix", lit) | ("exact", lit) | ("regex", p)
+    """
+    if p.startswith("^"):
+        body = p[1:]
+        if body.endswith(".*") and not body.endswith("\\.*"):
+            body = body[:-2]      # `^sb-.*` tương đương prefix `^sb-`
+        if body.endswith("$") and not body.endswith("\\$"):
+            lit = _literal(body[:-1])
+            if lit is not None:
+                return "exact", lit
+        lit = _literal(body)
+        if lit is not None:
+            return "prefix", lit
+    return "regex", p
+
+class PatternSet:
+    """Tập pattern đã compile: prefix trie + exact set + 1 regex alternation."""
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = [p for p in patterns if p]
+        self._trie: Dict[str, dict] = {}
+        self._exact: Dict[str, str] = {}
+        self._regex: List[str] = []
+        for p in self.patterns:
+            kind, val = classify(p)
+            if kind == "prefix":
+                node = self._trie
+                for ch in val:
+                    node = node.setdefault(ch, {})
+                node.setdefault("", p)   # "" = điểm kết thúc prefix, giữ pattern đầu tiên cho explain
+            elif kind == "exact":
+                self._exact.setdefault(val, p)
+            else:
+                re.compile(p)            # lỗi cú pháp báo ngay, kèm đúng pattern
+                self._regex.append(p)
+        # pattern có inline flag đầu chuỗi (vd. `(?i)...`) không gộp vào alternation được -> compile riêng
+        grouped = [p for p in self._regex if not _INLINE_FLAGS.match(p)]
+        self._singles = [re.compile(p) for p in self._regex if _INLINE_FLAGS.match(p)]
+        self._combined = re.compile("|".join(f"(?:{p})" for p in grouped)) if grouped else None
+
+    def _prefix_hit(self, ns: str) -> Optional[str]:
+        node = self._trie
+        if "" in node:
+            return node[""]
+        for ch in ns:
+            node = node.get(ch)
+            if node is None:
+                return None
+            if "" in node:
+                return node[""]
+        return None
+
+    def match(self, ns: str) -> Optional[str]:
+        """
+        Trả về pattern khớp (ưu tiên exact -> prefix -> regex theo thứ tự file), None nếu không khớp.
+        """
+        p = self._exact.get(ns)
+        if p is not None:
+            return p
+        p = self._prefix_hit(ns)
+        if p is not None:
+            return p
+        if self._combined is not None:
+            if self._combined.search(ns):
+                # chỉ khi đã khớp mới dò lại từng pattern để biết pattern nào (explain/log)
+                for rp in self._regex:
+                    if not _INLINE_FLAGS.match(rp) and re.search(rp, ns):
+                        return rp
+        for rx in self._singles:
+            if rx.search(ns):
+                return rx.pattern
+        return None
+
+    def __contains__(self, ns: str) -> bool:
+        if ns in self._exact or self._prefix_hit(ns) is not None:
+            return True
+        if self._combined is not None and self._combined.search(ns):
+            return True
+        return any(rx.search(ns) for rx in self._singles)
+
+class NsMatcher:
+    def __init__(self, patterns: List[str], deny: List[str]):
+        self.allow = PatternSet(patterns)
+        self.deny = PatternSet(deny)
+
+    def allowed(self, ns: str) -> bool:
+        return ns not in self.deny and ns in self.allow
+
+    def filter(self, all_ns: List[str]) -> List[str]:
+        return sorted(ns for ns in all_ns if self.allowed(ns))
+
+    def explain(self, ns: str) -> Tuple[bool, str]:
+        """
+        (managed?, lý do) — lý do là pattern deny/allow đã quyết định.
+        """
+        d = self.deny.match(ns)
+        if d is not None:
+            return False, f"deny  {d}"
+        a = self.allow.match(ns)
+        if a is not None:
+            return True, f"allow {a}"
+        return False, "no match"
+
+def read_patterns(path: str) -> List[str]:
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            s = line.strip()
+            if not s or s.startswith("#"): continue
+            out.append(s)
+    return out
+
+def _stamp(path: str):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+_CACHE: Dict[Tuple[str, str], Tuple[tuple, NsMatcher]] = {}
+
+def load_matcher(managed_file: str, deny_file: str) -> NsMatcher:
+    """
+    managed_file bắt buộc (RuntimeError nếu thiếu), deny_file tuỳ chọn.
+    Cache theo mtime/size: file không đổi -> trả lại matcher đã compile.
+    """
+    key = (managed_file, deny_file)
+    stamp = (_stamp(managed_file), _stamp(deny_file))
+    if stamp[0] is None:
+        raise RuntimeError(f"Missing {managed_file}")
+    hit = _CACHE.get(key)
+    if hit and hit[0] == stamp:
+        return hit[1]
+    pats = read_patterns(managed_file)
+    deny = read_patterns(deny_file) if stamp[1] is not None else []
+    m = NsMatcher(pats, deny)
+    _CACHE[key] = (stamp, m)
+    return m
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdb_scout.py
+
+Quét rủi ro PodDisruptionBudget toàn cluster trong 1 lượt -> pdb/r.csv (+ JSON), thay cho vòng
+"mỗi ns (.pdb-scout.ns.tmp) -> mỗi PDB -> get pod theo selector":
+
+- 4 lệnh list cluster-wide (pdb, deploy, sts, hpa); không có quyền cluster-wide (403) -> list song song theo ns
+- Join trong bộ nhớ: selector của PDB tra qua label_selector.LabelIndex (posting list theo label của pod template
+  từng workload trong ns), không query pod theo từng PDB
+- totalPods = tổng spec.replicas của workload khớp (không khớp workload nào -> status.expectedPods của PDB)
+- risk_flags (nối bằng |, không có -> ok):
+    allowed0     status.disruptionsAllowed = 0 (drain / evict node đang chứa pod sẽ bị chặn)
+    tight_min    minAvailable >= totalPods (kể cả khi mọi pod healthy vẫn không evict được pod nào)
+    max0         maxUnavailable = 0
+    hpa_min_low  HPA.minReplicas thấp tới mức PDB về allowed 0 khi HPA scale xuống
+    multi_pdb    workload bị nhiều PDB cùng khớp (Eviction API từ chối pod có > 1 PDB)
+    no_match     selector không khớp Deployment/StatefulSet nào và không có pod
+    scaled0      workload đang 0 replicas (vd DOWN ngoài giờ) -> không đánh giá, chạy lại sau khi UP
+- guard_plan(): dùng trong scaler (PDB_GUARD): action DOWN về target > 0 mà PDB của workload đang cho evict
+  (allowed >= 1) sẽ về allowed 0 -> clamp target lên số replicas nhỏ nhất còn allowed >= 1 / bỏ action / chỉ cảnh báo
+
+ENV:
+  PDB_SCOUT_NS_FILE     = ""       (1 ns mỗi dòng, vd pdb/.pdb-scout.ns.tmp; rỗng = mọi ns)
+  PDB_SCOUT_CSV         = r.csv
+  PDB_SCOUT_JSON        = r.json   (rỗng = không ghi)
+  PDB_SCOUT_CONCURRENCY = 8        (list theo ns khi bị 403 cluster-wide)
+  PDB_GUARD             = clamp    (scaler: clamp | skip | warn | off)
+
+CLI:
+  python3 pdb_scout.py [--ns-file=FILE] [--csv=FILE] [--json=FILE|-] [--only-risk]
+"""
+
+import os, sys, json, math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from kube_transport import make_transport, KubeError
+import label_selector
+
+NS_FILE     = os.environ.get("PDB_SCOUT_NS_FILE", "")
+CSV_OUT     = os.environ.get("PDB_SCOUT_CSV", "r.csv")
+JSON_OUT    = os.environ.get("PDB_SCOUT_JSON", "r.json")
+CONCURRENCY = max(1, int(os.environ.get("PDB_SCOUT_CONCURRENCY", "8")))
+GUARD       = os.environ.get("PDB_GUARD", "clamp").lower()
+DEBUG       = os.environ.get("DEBUG", "0").lower() in ("1", "true", "yes")
+
+KINDS = ["poddisruptionbudgets", "deployments", "statefulsets", "horizontalpodautoscalers"]
+SHORT_KIND = {"Deployment": "deploy", "StatefulSet": "statefulset"}
+CSV_HEADER = "namespace,pdb,policy,selector,currentHealthy,desiredHealthy,allowed,totalPods,risk_flags,recommendation"
+
+REC_SINGLE  = "Single-replica workload: avoid PDB, or commit to replicas >=2 and then use .spec.maxUnavailable=1"
+REC_TIGHT   = "Set .spec.minAvailable <= replicas-1 and ensure HPA.minReplicas >= minAvailable+1"
+REC_SWITCH  = "consider switching to .spec.maxUnavailable=1"
+REC_MAX0    = "Set .spec.maxUnavailable >= 1 (0 blocks every voluntary eviction)"
+REC_HPA     = "Raise HPA.minReplicas to >= {n} so scale-in keeps allowed >= 1"
+REC_MULTI   = "Pods are selected by several PDBs (eviction API refuses them): keep one PDB per workload"
+REC_NOMATCH = "Selector matches no Deployment/StatefulSet: fix .spec.selector or delete the PDB"
+REC_SCALED0 = "Workload scaled to 0: re-run after scale up"
+REC_UNHEALTHY = "currentHealthy < desiredHealthy: fix unhealthy pods before draining"
+
+# -------- PDB math (giả định mọi pod healthy, làm tròn lên như disruption controller) --------
+def _scaled(v, total: int) -> int:
+    if isinstance(v, str) and v.endswith("%"):
+        try:
+            return int(math.ceil(float(v[:-1]) * total / 100))
+        except ValueError:
+            return 0
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return 0
+
+def policy(spec: dict) -> str:
+    if "minAvailable" in spec:
+        return "minAvailable"
+    if "maxUnavailable" in spec:
+        return "maxUnavailable"
+    return "none"
+
+def desired_at(spec: dict, replicas: int) -> int:
+    if "minAvailable" in spec:
+        return _scaled(spec["minAvailable"], replicas)
+    if "maxUnavailable" in spec:
+        return max(0, replicas - _scaled(spec["maxUnavailable"], replicas))
+    return 0
+
+def allowed_at(spec: dict, replicas: int) -> int:
+    return max(0, replicas - desired_at(spec, replicas))
+
+def min_safe_replicas(spec: dict, upto: int) -> Optional[int]:
+    """Số replicas nhỏ nhất (1..upto) mà PDB còn cho evict >= 1 pod; None nếu không có."""
+    for r in range(1, upto + 1):
+        if allowed_at(spec, r) >= 1:
+            return r
+    return None
+
+def selector_str(sel: Optional[dict]) -> str:
+    if not sel:
+        return ""
+    parts = [f"{k}={v}" for k, v in sorted((sel.get("matchLabels") or {}).items())]
+    for e in sel.get("matchExpressions") or []:
+        key, op, vals = e.get("key", ""), e.get("operator", ""), ",".join(e.get("values") or [])
+        parts.append({"In": f"{key} in ({vals})", "NotIn": f"{key} notin ({vals})",
+                      "Exists": key, "DoesNotExist": f"!{key}"}.get(op, f"{key} {op} ({vals})"))
+    return ",".join(parts)
+
+# -------- Inventory --------
+def read_ns_file(path: str) -> List[str]:
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [l.strip() for l in f if l.strip() and not l.strip().startswith("#")]
+
+def fetch(t, namespaces: List[str] = None) -> List[dict]:
+    """PDB + deploy + sts + hpa: list cluster-wide (lọc ns trong bộ nhớ); 403 -> list song song từng ns."""
+    want = set(namespaces or [])
+    try:
+        items = t.list_items(KINDS)
+    except KubeError as e:
+        if e.status != 403 or not want:
+            raise
+        with ThreadPoolExecutor(max_workers=min(CONCURRENCY, len(want))) as ex:
+            items = [i for lst in ex.map(lambda ns: t.list_items(KINDS, namespace=ns), sorted(want)) for i in lst]
+    if want:
+        items = [i for i in items if (i.get("metadata") or {}).get("namespace", "") in want]
+    return items
+
+def _template_labels(it: dict) -> dict:
+    return (((it.get("spec") or {}).get("template") or {}).get("metadata") or {}).get("labels") or {}
+
+def index_workloads(items: List[dict]) -> Tuple[Dict[str, label_selector.LabelIndex], Dict[Tuple[str, str, str], int]]:
+    """-> (ns -> LabelIndex của workload {ns, kind, name, replicas}, (ns, kind, name) -> HPA minReplicas)."""
+    by_ns: Dict[str, label_selector.LabelIndex] = {}
+    hpa: Dict[Tuple[str, str, str], int] = {}
+    for it in items:
+        meta, spec = it.get("metadata") or {}, it.get("spec") or {}
+        ns = meta.get("namespace", "")
+        if it.get("kind") == "HorizontalPodAutoscaler":
+            ref = spec.get("scaleTargetRef") or {}
+            if ref.get("kind") in SHORT_KIND:
+                hpa[(ns, SHORT_KIND[ref["kind"]], ref.get("name", ""))] = max(1, _scaled(spec.get("minReplicas", 1), 0))
+            continue
+        kind = SHORT_KIND.get(it.get("kind", ""))
+        if not kind:
+            continue
+        try:
+            rep = int(spec.get("replicas", 1))
+        except (TypeError, ValueError):
+            rep = 0
+        wl = {"ns": ns, "kind": kind, "name": meta.get("name", ""), "replicas": rep}
+        by_ns.setdefault(ns, label_selector.LabelIndex()).add(wl, _template_labels(it))
+    return by_ns, hpa
+
+# -------- Scan --------
+def assess(pdb: dict, workloads: List[dict], hpa_min: Optional[int], shared: bool) -> Tuple[List[str], List[str], int]:
+    """-> (risk_flags, recommendation parts, totalPods)."""
+    spec, st = pdb.get("spec") or {}, pdb.get("status") or {}
+    total = sum(w["replicas"] for w in workloads) if workloads else int(st.get("expectedPods") or 0)
+    if workloads and total == 0:
+        return ["scaled0"], [REC_SCALED0], 0
+    if not workloads and total == 0:
+        return ["no_match"], [REC_NOMATCH], 0
+    flags, recs = [], []
+    pol = policy(spec)
+    if int(st.get("disruptionsAllowed") or 0) == 0:
+        flags.append("allowed0")
+    tight = pol == "minAvailable" and desired_at(spec, total) >= total
+    max0 = pol == "maxUnavailable" and _scaled(spec["maxUnavailable"], total) == 0
+    if tight:
+        flags.append("tight_min")
+    if max0:
+        flags.append("max0")
+    if total <= 1 and (tight or max0):
+        recs.append(REC_SINGLE)
+    if tight:
+        recs += [REC_TIGHT, REC_SWITCH]
+    if max0:
+        recs.append(REC_MAX0)
+    if hpa_min is not None and not tight and not max0 and allowed_at(spec, hpa_min) == 0:
+        n = min_safe_replicas(spec, max(total, hpa_min) + 100)
+        if n:
+            flags.append("hpa_min_low")
+            recs.append(REC_HPA.format(n=n))
+    if shared:
+        flags.append("multi_pdb")
+        recs.append(REC_MULTI)
+    if "allowed0" in flags and not (tight or max0):
+        recs.append(REC_UNHEALTHY)
+    return flags, recs, total
+
+def scan(items: List[dict]) -> List[dict]:
+    by_ns, hpa = index_workloads(items)
+    pdbs = sorted((i for i in items if i.get("kind") == "PodDisruptionBudget"),
+                  key=lambda b: (b["metadata"].get("namespace", ""), b["metadata"].get("name", "")))
+    matched = []
+    cover: Dict[Tuple[str, str, str], int] = {}
+    for b in pdbs:
+        ns = b["metadata"].get("namespace", "")
+        idx = by_ns.get(ns)
+        wls = idx.select((b.get("spec") or {}).get("selector")) if idx else []
+        matched.append(wls)
+        for w in wls:
+            k = (ns, w["kind"], w["name"])
+            cover[k] = cover.get(k, 0) + 1
+
+    rows = []
+    for b, wls in zip(pdbs, matched):
+        meta, spec, st = b["metadata"], b.get("spec") or {}, b.get("status") or {}
+        ns = meta.get("namespace", "")
+        keys = [(ns, w["kind"], w["name"]) for w in wls]
+        mins = [hpa[k] for k in keys if k in hpa]
+        flags, recs, total = assess(b, wls, sum(mins) if mins else None, any(cover[k] > 1 for k in keys))
+        rows.append({
+            "namespace": ns, "pdb": meta.get("name", ""), "policy": policy(spec),
+            "selector": selector_str(spec.get("selector")),
+            "currentHealthy": int(st.get("currentHealthy") or 0), "desiredHealthy": int(st.get("desiredHealthy") or 0),
+            "allowed": int(st.get("disruptionsAllowed") or 0), "totalPods": total,
+            "risk_flags": "|".join(flags) or "ok", "recommendation": "; ".join(dict.fromkeys(recs)) or "ok",
+            "spec": {k: spec[k] for k in ("minAvailable", "maxUnavailable") if k in spec},
+            "workloads": [f"{w['kind']}/{w['name']}" for w in wls], "hpaMinReplicas": sum(mins) if mins else None,
+        })
+    return rows
+
+def _q(s: str) -> str:
+    return '"' + s.replace('"', '""') + '"'
+
+def write_csv(path: str, rows: List[dict]):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write(CSV_HEADER + "\n")
+        for r in rows:
+            f.write(",".join([r["namespace"], r["pdb"], r["policy"], _q(r["selector"]),
+                              str(r["currentHealthy"]), str(r["desiredHealthy"]), str(r["allowed"]),
+                              str(r["totalPods"]), r["risk_flags"], _q(r["recommendation"])]) + "\n")
+    os.replace(tmp, path)
+
+def write_json(path: str, rows: List[dict]):
+    if path == "-":
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+# -------- Scaler guard --------
+def guard_plan(plan: dict, inv: Dict[str, dict], pdbs: Dict[str, List[dict]], mode: str = None) -> List[str]:
+    """
+    inv: index_inventory của scaler (ns -> {"labels": {(kind, name): template labels}}); pdbs: ns -> [PDB].
+    Sửa plan tại chỗ (clamp target / bỏ action vào plan["skipped"]["pdb"]) -> các dòng log.
+    """
+    mode = (mode or GUARD).lower()
+    logs: List[str] = []
+    keep = []
+    skipped = plan.setdefault("skipped", {}).setdefault("pdb", [])
+    for a in plan["actions"]:
+        if a["op"] != "down" or a["target"] <= 0 or not pdbs.get(a["ns"]):
+            keep.append(a)
+            continue
+        labels = (inv.get(a["ns"]) or {}).get("labels", {}).get((a["kind"], a["name"]))
+        need, why = 0, ""
+        for b in pdbs[a["ns"]]:
+            spec = b.get("spec") or {}
+            if labels is None or not label_selector.matches(spec.get("selector"), labels):
+                continue
+            if allowed_at(spec, a["current"]) >= 1 and allowed_at(spec, a["target"]) == 0:
+                n = min_safe_replicas(spec, a["current"]) or a["current"]
+                if n > need:
+                    need, why = n, b["metadata"].get("name", "")
+        if not need:
+            keep.append(a)
+            continue
+        w = f"{a['kind']}/{a['name']} -n {a['ns']}"
+        if mode == "warn":
+            logs.append(f"⚠️  DOWN {w} -> {a['target']} để PDB {why} về allowed 0 (cần >= {need})")
+            keep.append(a)
+        elif mode == "clamp" and need < a["current"]:
+            logs.append(f"🛡️  DOWN {w} -> {need} thay vì {a['target']} (PDB {why} giữ allowed >= 1)")
+            a["reason"] += f", pdb {why} clamp {a['target']}->{need}"
+            a["target"] = need
+            keep.append(a)
+        else:
+            skipped.append(f"{w}: PDB {why} cần replicas >= {need}")
+            logs.append(f"🛡️  skip DOWN {w} -> {a['target']} (PDB {why} cần replicas >= {need})")
+    plan["actions"] = keep
+    return logs
+
+# -------- CLI --------
+def main(argv: List[str]) -> int:
+    opt = {a.split("=", 1)[0]: (a.split("=", 1) + [""])[1] for a in argv if a.startswith("--")}
+    if "--help" in opt or "-h" in argv:
+        print(__doc__)
+        return 0
+    try:
+        namespaces = read_ns_file(opt.get("--ns-file", NS_FILE))
+    except OSError as e:
+        print(f"❌ ns file: {e}")
+        return 2
+    try:
+        t = make_transport(os.environ.get("KUBECONFIG_FILE") or os.environ.get("KUBECONFIG") or "",
+                           os.environ.get("KUBE_CONTEXT", ""), os.environ.get("KUBECTL_TIMEOUT", "10s"), DEBUG)
+        items = fetch(t, namespaces)
+    except KubeError as e:
+        print(f"❌ list pdb,deploy,sts,hpa: {e}")
+        return 2
+    rows = scan(items)
+    if "--only-risk" in opt:
+        rows = [r for r in rows if r["risk_flags"] != "ok"]
+    counts: Dict[str, int] = {}
+    for r in rows:
+        for f in r["risk_flags"].split("|"):
+            counts[f] = counts.get(f, 0) + 1
+    csv_path, json_path = opt.get("--csv") or CSV_OUT, opt.get("--json", JSON_OUT)
+    write_csv(csv_path, rows)
+    if json_path:
+        write_json(json_path, rows)
+    risky = sum(1 for r in rows if r["risk_flags"] != "ok")
+    detail = " ".join(f"{k}={v}" for k, v in sorted(counts.items()) if k != "ok")
+    print(f"🛡️  PDB: {len(rows)} in {len({r['namespace'] for r in rows})} ns, risk={risky}{' (' + detail + ')' if detail else ''}"
+          f" → {csv_path}{', ' + json_path if json_path and json_path != '-' else ''}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+rbac_probe.py
+
+Fast path kiểm tra quyền cho validate-kube-auth.py: mỗi namespace 1 SelfSubjectRulesReview (SSRR)
+thay cho tối đa 5 lần `kubectl auth can-i`, rồi tự đánh giá rule local.
+
+- rules_review(): POST selfsubjectrulesreviews, trả (resourceRules, incomplete); chạy được trên cả 2 transport
+  (kubectl: `create --raw -f -`, native: pool keep-alive)
+- allows(): so verb/group/resource[/subresource] với resourceRules theo ngữ nghĩa RBAC
+  ("*" khớp mọi thứ, "*/scale" khớp subresource scale; rule có resourceNames không cấp quyền list/get chung)
+- Rule cho phép -> chắc chắn được phép. Không khớp mà SSRR `incomplete` (webhook authorizer, ...) -> caller
+  hỏi lại bằng SelfSubjectAccessReview cho đúng check đó
+- RulesCache: kết quả SSRR lưu file theo identity kubeconfig (hash user + server + context), TTL ngắn,
+  chạy lại trong vài phút (Jenkins retry, nhiều lần đăng ký liền nhau) không gọi cluster
+- DecisionCache: quyết định đã kiểm chứng (ns tồn tại, can-i từng verb/resource, kết nối cluster), key =
+  hash(identity, context, ns, verb, resource); kết quả dương TTL dài, âm TTL ngắn (vừa được cấp quyền thì
+  không phải đợi lâu) -> cùng người đăng ký cùng ns hằng ngày không round-trip nào tới cluster
+
+ENV:
+  RBAC_CACHE_DIR          = <tmp>/exception-ontime-rbac
+  RBAC_RULES_CACHE_TTL_S  = 300     (0 = tắt cache)
+  RBAC_DECISION_TTL_S     = 43200   (kết quả dương; 0 = tắt cache quyết định)
+  RBAC_DECISION_NEG_TTL_S = 300     (kết quả âm / ns không tồn tại; 0 = không cache kết quả âm)
+"""
+
+import os, json, time, hashlib, tempfile, threading
+from typing import Dict, List, Optional, Tuple
+from kube_transport import KubeError
+
+RBAC_CACHE_DIR = os.environ.get("RBAC_CACHE_DIR", "").strip() or os.path.join(tempfile.gettempdir(), "exception-ontime-rbac")
+RULES_TTL_S    = float(os.environ.get("RBAC_RULES_CACHE_TTL_S", "300"))
+DECISION_TTL_S = float(os.environ.get("RBAC_DECISION_TTL_S", "43200"))
+DECISION_NEG_TTL_S = float(os.environ.get("RBAC_DECISION_NEG_TTL_S", "300"))
+
+SSRR_PATH = "/apis/authorization.k8s.io/v1/selfsubjectrulesreviews"
+
+# group API của resource cần kiểm tra (SSRR trả apiGroups theo group, không qua discovery)
+RESOURCE_GROUPS = {"pods": "", "deployments": "apps", "statefulsets": "apps"}
+
+def split_resource(resource: str) -> Tuple[str, str, str]:
+    """'deployments/scale' -> (group, 'deployments', 'scale')."""
+    res, _, sub = resource.partition("/")
+    return RESOURCE_GROUPS.get(res, ""), res, sub
+
+def _load_doc(text: str) -> Optional[dict]:
+    try:
+        import yaml  # optional
+        return yaml.safe_load(text) or {}
+    except ImportError:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+    except Exception:
+        return None
+
+def _named(lst, name):
+    for it in lst or []:
+        if it.get("name") == name:
+            return it
+    return None
+
+def kube_identity(kubeconfig: str, context: str = "") -> str:
+    """
+    Hash identity của kubeconfig: user entry (token/cert/exec...) + server + tên context đang dùng.
+    Đọc không được (YAML mà thiếu PyYAML) -> hash cả file + context (vẫn đổi khi kubeconfig đổi).
+    """
+    with open(kubeconfig, "r", encoding="utf-8") as f:
+        text = f.read()
+    doc = _load_doc(text)
+    if isinstance(doc, dict):
+        name = context or doc.get("current-context") or ""
+        ctx = (_named(doc.get("contexts"), name) or {}).get("context") or {}
+        cluster = (_named(doc.get("clusters"), ctx.get("cluster")) or {}).get("cluster") or {}
+        user = (_named(doc.get("users"), ctx.get("user")) or {}).get("user") or {}
+        if ctx:
+            basis = json.dumps({"context": name, "server": cluster.get("server", ""), "user": user}, sort_keys=True)
+            return hashlib.sha256(basis.encode("utf-8")).hexdigest()[:32]
+    return hashlib.sha256((context + "\0" + text).encode("utf-8")).hexdigest()[:32]
+
+def rules_review(transport, ns: str) -> Tuple[List[dict], bool]:
+    """1 SSRR cho namespace -> (resourceRules, incomplete). Lỗi gọi API -> KubeError."""
+    body = {"apiVersion": "authorization.k8s.io/v1", "kind": "SelfSubjectRulesReview",
+            "spec": {"namespace": ns}}
+    st, data = transport.request("POST", SSRR_PATH, body)
+    if st not in (200, 201) or not isinstance(data, dict):
+        raise KubeError(f"selfsubjectrulesreview ns={ns} status={st}: {str(data)[:200]}", st)
+    status = data.get("status") or {}
+    return list(status.get("resourceRules") or []), bool(status.get("incomplete"))
+
+def _rule_matches(rule: dict, verb: str, group: str, res: str, sub: str) -> bool:
+    if rule.get("resourceNames"):
+        return False
+    verbs = rule.get("verbs") or []
+    if "*" not in verbs and verb not in verbs:
+        return False
+    groups = rule.get("apiGroups") or []
+    if "*" not in groups and group not in groups:
+        return False
+    full = f"{res}/{sub}" if sub else res
+    for r in rule.get("resources") or []:
+        if r == "*" or r == full or (sub and r == f"*/{sub}"):
+            return True
+    return False
+
+def allows(rules: List[dict], verb: str, resource: str) -> bool:
+    group, res, sub = split_resource(resource)
+    return any(_rule_matches(r, verb, group, res, sub) for r in rules)
+
+def _write_private(path: str, doc: dict):
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+class RulesCache:
+    """File JSON `<dir>/<identity>.rules.json`: ns -> {"at", "rules", "incomplete"}."""
+
+    def __init__(self, identity: str, ttl_s: float = None, cache_dir: str = None, read: bool = True):
+        self.ttl_s = RULES_TTL_S if ttl_s is None else ttl_s
+        self.path = os.path.join(cache_dir or RBAC_CACHE_DIR, f"{identity}.rules.json")
+        self.data: Dict[str, dict] = {}
+        self.dirty = False
+        if self.ttl_s > 0 and read:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f) or {}
+            except (OSError, ValueError):
+                self.data = {}
+
+    def get(self, ns: str) -> Optional[Tuple[List[dict], bool]]:
+        e = self.data.get(ns)
+        if not e or self.ttl_s <= 0 or time.time() - float(e.get("at", 0)) > self.ttl_s:
+            return None
+        return e.get("rules") or [], bool(e.get("incomplete"))
+
+    def put(self, ns: str, rules: List[dict], incomplete: bool):
+        if self.ttl_s <= 0:
+            return
+        self.data[ns] = {"at": time.time(), "rules": rules, "incomplete": incomplete}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        now = time.time()
+        keep = {ns: e for ns, e in self.data.items() if now - float(e.get("at", 0)) <= self.ttl_s}
+        _write_private(self.path, keep)
+        self.dirty = False
+
+class DecisionCache:
+    """
+    File JSON `<dir>/decisions.json`: hash(identity|context|ns|verb|resource) -> {"v", "exp"}.
+    read=False (--no-cache): bỏ qua giá trị đang cache nhưng vẫn ghi kết quả mới (làm tươi cache).
+    Thread-safe (các ns được kiểm tra song song).
+    """
+
+    def __init__(self, identity: str, context: str = "", ttl_s: float = None, neg_ttl_s: float = None,
+                 cache_dir: str = None, read: bool = True):
+        self.identity, self.context = identity, context
+        self.ttl_s = DECISION_TTL_S if ttl_s is None else ttl_s
+        self.neg_ttl_s = DECISION_NEG_TTL_S if neg_ttl_s is None else neg_ttl_s
+        self.path = os.path.join(cache_dir or RBAC_CACHE_DIR, "decisions.json")
+        self.read = read
+        self.fresh: Dict[str, dict] = {}
+        self.hits = 0
+        self._lock = threading.Lock()
+        self.data = self._load() if (read and self.ttl_s > 0) else {}
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f) or {}
+        except (OSError, ValueError):
+            return {}
+
+    def key(self, ns: str, verb: str, resource: str) -> str:
+        basis = "|".join((self.identity, self.context, ns or "", verb, resource))
+        return hashlib.sha256(basis.encode("utf-8")).hexdigest()[:40]
+
+    def get(self, ns: str, verb: str, resource: str):
+        """Giá trị còn hạn hoặc None."""
+        e = self.data.get(self.key(ns, verb, resource))
+        if not e or time.time() > float(e.get("exp", 0)):
+            return None
+        with self._lock:
+            self.hits += 1
+        return e.get("v")
+
+    def put(self, ns: str, verb: str, resource: str, value, positive: bool):
+        ttl = self.ttl_s if positive else min(self.neg_ttl_s, self.ttl_s)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self.fresh[self.key(ns, verb, resource)] = {"v": value, "exp": time.time() + ttl}
+
+    def save(self):
+        """Gộp với file hiện tại (job khác có thể vừa ghi), bỏ entry hết hạn, ghi atomic 0600."""
+        if not self.fresh:
+            return
+        now = time.time()
+        merged = {k: e for k, e in self._load().items() if float(e.get("exp", 0)) > now}
+        merged.update(self.fresh)
+        _write_private(self.path, merged)
+        self.fresh = {}
@@ -9,13 +9,31 @@ Jitter refactor:
 - DOWN (enter_out, weekend_close, etc.): 0..2s
 
 Các tính năng:
-- ACTION=auto quyết định cửa sổ chạy theo giờ VN (TZ)
-- Holiday (HOLIDAY_MODE=hard_off): DOWN tất cả
+- ACTION=auto quyết định cửa sổ chạy theo giờ VN (TZ), lịch khai báo trong schedule.py (SCHEDULE_FILE),
+  compile thành bảng chuyển trạng thái tra bisect; `--next` in cửa sổ kế tiếp + thời điểm (job chờ đúng giờ)
+- Holiday (HOLIDAY_MODE=hard_off): DOWN tất cả; holidays.txt qua holiday_calendar (khoảng, lặp hằng năm,
+  section theo ns -> chỉ DOWN các ns đó), index ordinal cache theo sha256 file
 - Ưu tiên 247, xét hiệu lực theo end_date, hỗ trợ ALL: _ALL_, __ALL__, ALL, *
+  (tra decision_index.json do compute-active build sẵn: 1 dict hit/workload, end_date đã là ordinal)
 - Hỗ trợ HPA minReplicas khi UP, lưu prev_replicas khi DOWN
 - KUBECTL_TIMEOUT cho mọi lệnh kubectl
+- KUBE_TRANSPORT=kubectl|native: native đọc kubeconfig 1 lần, dùng chung pool kết nối keep-alive
+- Inventory 1 lệnh `get deploy,statefulset,hpa -A` (replicas + HPA lấy từ list JSON, không get từng workload)
+- INVENTORY_SOURCE=snapshot: đọc inventory-snapshot.json do inventory_cache.py (LIST+WATCH) giữ nóng,
+  snapshot cũ hơn INVENTORY_SNAPSHOT_MAX_AGE_S / chưa sync -> list API như cũ
 - MAX_ACTIONS_PER_RUN để cắt nhỏ batch mỗi tick
+- managed/deny ns compile 1 lần (prefix trie + regex alternation), cache theo mtime; --explain-ns để debug
+- SCALE_CONCURRENCY worker scale song song, round-robin giữa các namespace
+- SCALE_MODE=bulk: PATCH /scale có resourceVersion, backoff 409/429 theo item, report mỗi run
 - Quyết định action sớm, nếu NOOP thì exit 0 (không gọi kubectl)
+- MAX_ACTIONS_PER_RUN chạm cap -> run cursor (window_id = ngày:action + hàng đợi pending trong plan);
+  tick sau cùng window (kể cả đã qua giờ đóng trong CURSOR_GRACE_MIN) chạy tiếp, không list lại inventory
+- STATE_BACKEND=json|sqlite (state_store): sqlite WAL upsert theo key trong 1 transaction, GC key của
+  workload không còn trong inventory; lần đầu tự migrate từ replicas.json
+- Plan/apply tách rời (scale_planner): plan có thứ tự ghi ra SCALE_PLAN_FILE (diff được giữa các tick),
+  apply ghi status từng action; `--plan-only` chỉ lập plan, `--apply [FILE]` chạy tiếp action còn pending/failed
+- PDB_GUARD=clamp|skip|warn|off (pdb_scout.guard_plan): DOWN về TARGET_DOWN > 0 mà PDB của workload đang cho
+  evict sẽ về allowed 0 -> clamp target / bỏ action / cảnh báo; PDB list 1 lần chỉ khi plan có DOWN target > 0
 
 Jitter:
   * Weekday prestart (UP hàng loạt):   0..15s
@@ -25,13 +43,24 @@ Jitter:
 Holiday hard_off: DOWN tất cả (bỏ qua NOOP).
 """
 
-import os, sys, json, subprocess, shlex, time, datetime, random, fcntl, re
+import os, sys, json, time, datetime, random
 from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from kube_transport import make_transport, parse_duration, KubeError
+import bulk_scale
+from ns_matcher import load_matcher
+import decision_index
+import scale_planner
+import state_store
+import inventory_cache
+import schedule
+import holiday_calendar
+import pdb_scout
+from node_evictor import list_pdbs
 
 # -------- Config (ENV) --------
 OUT_DIR        = os.environ.get("OUT_DIR", "/data/exceptions/out")
 STATE_ROOT     = os.environ.get("STATE_ROOT", "/data/exceptions/state")
-STATE_FILE     = os.path.join(STATE_ROOT, "replicas.json")
 TZ             = os.environ.get("TZ", "Asia/Bangkok")
 
 MANAGED_NS_FILE= os.environ.get("MANAGED_NS_FILE", "managed-ns.txt")   # regex per line
@@ -43,6 +72,7 @@ ACTION         = os.environ.get("ACTION", "auto").lower()
 TARGET_DOWN    = int(os.environ.get("TARGET_DOWN", "0"))
 DEFAULT_UP     = int(os.environ.get("DEFAULT_UP", "1"))
 DOWN_HPA_HANDLING = os.environ.get("DOWN_HPA_HANDLING", "skip").lower()  # skip | force
+PDB_GUARD      = os.environ.get("PDB_GUARD", "clamp").lower()              # clamp | skip | warn | off
 
 # Jitter
 _compat_j = os.environ.get("JITTER_MAX_S")
@@ -53,6 +83,23 @@ JITTER_DOWN_S      = int(os.environ.get("JITTER_DOWN_S", "1"))
 KUBECTL_TIMEOUT    = os.environ.get("KUBECTL_TIMEOUT", "10s")
 MAX_ACTIONS_PER_RUN= int(os.environ.get("MAX_ACTIONS_PER_RUN", "0"))             # 0 = unlimited
 
+# Inventory: cluster = 1 lệnh list -A cho cả cụm | namespace = 1 lệnh list mỗi managed ns
+INVENTORY_MODE     = os.environ.get("INVENTORY_MODE", "cluster").lower()
+INVENTORY_TIMEOUT_S= int(os.environ.get("INVENTORY_TIMEOUT_S", "60"))
+# api = list qua apiserver mỗi tick | snapshot = đọc file do inventory_cache.py (LIST+WATCH) ghi, cũ/thiếu -> api
+INVENTORY_SOURCE   = os.environ.get("INVENTORY_SOURCE", "api").lower()
+
+# Executor: số lệnh scale chạy song song (jitter ngủ trong từng worker, round-robin giữa ns)
+SCALE_CONCURRENCY  = int(os.environ.get("SCALE_CONCURRENCY", "8"))
+# single = kubectl scale / PATCH từng item như cũ | bulk = PATCH /scale có resourceVersion, retry 409/429 theo item
+SCALE_MODE         = os.environ.get("SCALE_MODE", "single").lower()
+SCALE_REPORT_FILE  = os.environ.get("SCALE_REPORT_FILE", os.path.join(STATE_ROOT, "scale-report.json"))
+DECISION_INDEX_FILE= os.environ.get("DECISION_INDEX_FILE", "").strip() or os.path.join(OUT_DIR, "decision_index.json")
+SCALE_PLAN_FILE    = os.environ.get("SCALE_PLAN_FILE", "").strip() or os.path.join(STATE_ROOT, "scale-plan.json")
+# MAX_ACTIONS_PER_RUN chạm cap -> lưu cursor (window + plan còn pending); tick sau trong window (+ grace) chạy tiếp
+RUN_CURSOR_FILE    = os.environ.get("RUN_CURSOR_FILE", "").strip() or os.path.join(STATE_ROOT, "run-cursor.json")
+CURSOR_GRACE_MIN   = int(os.environ.get("CURSOR_GRACE_MIN", "15"))
+
 DEBUG          = os.environ.get("DEBUG","0").lower() in ("1","true","yes")
 DRY_RUN        = os.environ.get("DRY_RUN","0").lower() in ("1","true","yes")
 
@@ -75,152 +122,178 @@ def weekday_index(dt: datetime.datetime) -> int:
 def is_weekend(dt: datetime.datetime) -> bool:
     return weekday_index(dt) >= 5
 
+_SCHEDULE = None
+
+def run_schedule() -> schedule.Schedule:
+    """Lịch cửa sổ (SCHEDULE_FILE hoặc mặc định), compile 1 lần mỗi run."""
+    global _SCHEDULE
+    if _SCHEDULE is None:
+        _SCHEDULE = schedule.Schedule.load()
+    return _SCHEDULE
+
 def decide_action(now: datetime.datetime) -> str:
-    """Xác định action dựa trên weekday/weekend và khoảng giờ cố định."""
-    hm = now.strftime("%H:%M")
-    wd = weekday_index(now)
-
-    if wd < 5:  # Mon–Fri
-        if "07:10" <= hm <= "08:05":
-            return "weekday_prestart"
-        if "17:55" <= hm <= "18:05":
-            return "weekday_enter_out"
-    else:  # Sat–Sun
-        if "08:45" <= hm <= "09:05":
-            return "weekend_pre"
-        if "19:55" <= hm <= "20:05":
-            return "weekend_close"
-
-    return "noop"
+    """Action của cửa sổ chứa `now` theo lịch (ngày lễ xử lý riêng ở main), ngoài cửa sổ -> noop."""
+    return run_schedule().action_at(now)
+
+def is_holiday_date(d: datetime.date) -> bool:
+    return HOLIDAY_MODE == "hard_off" and load_holidays().is_holiday(d)
 
 # -------- Files / state --------
-class LockedFile:
-    def __init__(self, path, mode="a+"):
-        self.path=path; self.mode=mode; self.f=None
-    def __enter__(self):
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        self.f=open(self.path, self.mode)
-        fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
-        return self.f
-    def __exit__(self, exc_type, exc, tb):
-        try:
-            self.f.flush(); os.fsync(self.f.fileno())
-        except: pass
-        try:
-            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
-            self.f.close()
-        except: pass
+_STORE = None
+
+def store():
+    """Backend state (STATE_BACKEND=json|sqlite, xem state_store.py), mở 1 lần mỗi run."""
+    global _STORE
+    if _STORE is None:
+        _STORE = state_store.open_store()
+    return _STORE
 
 def load_state() -> Dict[str, dict]:
-    if not os.path.exists(STATE_FILE): return {}
-    with LockedFile(STATE_FILE, "r+") as f:
-        try:
-            f.seek(0); return json.load(f) or {}
-        except Exception:
-            return {}
+    return store().load()
 
 def save_state(data: dict):
-    tmp = STATE_FILE + ".tmp"
-    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-        f.flush(); os.fsync(f.fileno())
-    os.replace(tmp, STATE_FILE)
-
-# -------- Kubectl helpers --------
-def run_k(args: List[str], timeout=30) -> Tuple[int,str,str]:
-    cmd = ["kubectl"]
-    if KCFG:
-        cmd += ["--kubeconfig", KCFG]
-    if KCTX:
-        cmd += ["--context", KCTX]
-    cmd += ["--request-timeout", KUBECTL_TIMEOUT]
-    cmd += args
-    if DEBUG:
-        print("[kubectl]", " ".join(shlex.quote(x) for x in cmd))
-    cp = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout, encoding="utf-8")
-    return cp.returncode, (cp.stdout or "").strip(), (cp.stderr or "").strip()
+    store().commit(data)
+
+def gc_state(state: dict, inv: Dict[str, dict]):
+    live = {ns: {f"{kind}|{name}" for kind, name, _, _ in inv[ns]["workloads"]} for ns in inv}
+    n = store().gc(state, live)
+    if n:
+        print(f"🧹 state gc: {n} key(s) của workload không còn / quá STATE_GC_DAYS={state_store.STATE_GC_DAYS} ngày")
+
+# -------- Kube transport (KUBE_TRANSPORT=kubectl|native) --------
+_KUBE = None
+
+def kube():
+    """Transport dùng chung cho cả run: kubectl (mỗi lệnh 1 process) hoặc native (pool keep-alive)."""
+    global _KUBE
+    if _KUBE is None:
+        _KUBE = make_transport(KCFG, KCTX, KUBECTL_TIMEOUT, DEBUG)
+    return _KUBE
+
+_SNAPSHOT = None
+
+def inventory_snapshot():
+    """INVENTORY_SOURCE=snapshot: snapshot còn hạn (đọc 1 lần mỗi run), None -> dùng API."""
+    global _SNAPSHOT
+    if INVENTORY_SOURCE != "snapshot":
+        return None
+    if _SNAPSHOT is None:
+        try:
+            _SNAPSHOT = inventory_cache.read_snapshot()
+            if DEBUG: print(f"[DEBUG] inventory snapshot age={_SNAPSHOT['age_s']:.1f}s")
+        except RuntimeError as e:
+            print(f"⚠️  {e} → list qua API")
+            _SNAPSHOT = {}
+    return _SNAPSHOT or None
 
 def list_namespaces() -> List[str]:
-    rc,out,err = run_k(["get","ns","-o","json"])
-    if rc != 0: raise RuntimeError(f"kubectl get ns failed: {err}")
-    obj = json.loads(out)
-    return sorted([i["metadata"]["name"] for i in obj.get("items",[])])
-
-def match_namespaces(all_ns: List[str], patterns: List[str], deny: List[str]) -> List[str]:
-    res = []
-    for ns in all_ns:
-        if any(re.search(p, ns) for p in deny if p):
-            continue
-        if any(re.search(p, ns) for p in patterns if p):
-            res.append(ns)
-    return sorted(res)
+    snap = inventory_snapshot()
+    if snap:
+        return sorted([i["metadata"]["name"] for i in inventory_cache.snapshot_items(snap, ["namespaces"])])
+    try:
+        items = kube().list_items(["namespaces"])
+    except KubeError as e:
+        raise RuntimeError(f"list namespaces failed: {e}")
+    return sorted([i["metadata"]["name"] for i in items])
+
+def ns_matcher():
+    # compile managed/deny 1 lần, cache theo mtime của file (ns_matcher.load_matcher)
+    return load_matcher(MANAGED_NS_FILE, DENY_NS_FILE)
 
 def get_managed_namespaces() -> List[str]:
-    pats = []
-    if os.path.exists(MANAGED_NS_FILE):
-        for line in open(MANAGED_NS_FILE, "r", encoding="utf-8"):
-            s=line.strip()
-            if not s or s.startswith("#"): continue
-            pats.append(s)
-    else:
-        raise RuntimeError(f"Missing {MANAGED_NS_FILE}")
-
-    deny=[]
-    if os.path.exists(DENY_NS_FILE):
-        for line in open(DENY_NS_FILE,"r",encoding="utf-8"):
-            s=line.strip()
-            if not s or s.startswith("#"): continue
-            deny.append(s)
-
-    return match_namespaces(list_namespaces(), pats, deny)
-
-def list_workloads(ns: str) -> List[Tuple[str,str]]:
-    """Return [(kind, name)] with kind in {'deploy','statefulset'}."""
-    rc,out,err = run_k(["-n", ns, "get", "deploy,statefulset", "-o", "json"])
-    if rc != 0:
-        if DEBUG: print(f"[warn] get workloads ns={ns} failed:", err)
-        return []
-    items=[]
-    obj=json.loads(out)
-    for it in obj.get("items",[]):
-        k=it.get("kind","").lower()
-        kind="deploy" if k=="deployment" else "statefulset"
-        name=it["metadata"]["name"]
-        items.append((kind,name))
-    return items
-
-def hpa_index(ns: str) -> Dict[Tuple[str,str], int]:
-    """map (kind,name) -> minReplicas (default 1)."""
-    rc,out,err = run_k(["-n", ns, "get", "hpa", "-o", "json"])
-    if rc != 0:
-        return {}
-    res={}
-    obj=json.loads(out)
-    for it in obj.get("items",[]):
-        ref=it.get("spec",{}).get("scaleTargetRef",{})
-        k=ref.get("kind","").lower()
-        kind="deploy" if k=="deployment" else ("statefulset" if k=="statefulset" else None)
-        name=ref.get("name","")
-        if kind and name:
-            m=it.get("spec",{}).get("minReplicas",1)
-            try: m=int(m)
-            except: m=1
-            res[(kind,name)]=max(1,m)
-    return res
-
-def get_replicas(ns: str, kind: str, name: str) -> int:
-    rc,out,err = run_k(["-n", ns, "get", kind, name, "-o", "jsonpath={.spec.replicas}"])
-    if rc != 0 or not out: return -1
-    try: return int(out)
-    except: return -1
+    return ns_matcher().filter(list_namespaces())
+
+def explain_namespaces(names: List[str]) -> int:
+    """
+    --explain-ns [ns ...]: in pattern managed/deny nào quyết định từng namespace (không scale gì).
+    Không truyền ns -> lấy toàn bộ namespace trong cluster.
+    """
+    m = ns_matcher()
+    names = names or list_namespaces()
+    managed = 0
+    for ns in names:
+        ok, why = m.explain(ns)
+        managed += int(ok)
+        print(f"{'✅' if ok else '❌'} {ns:<40} {why}")
+    print(f"📦 managed={managed}/{len(names)} (allow={len(m.allow.patterns)} deny={len(m.deny.patterns)} patterns)")
+    return 0
+
+# -------- Inventory (1 lệnh list thay cho get từng workload) --------
+def _short_kind(k: str):
+    k = (k or "").lower()
+    if k == "deployment":  return "deploy"
+    if k == "statefulset": return "statefulset"
+    return None
+
+def index_inventory(items: List[dict], keep_ns=None) -> Dict[str, dict]:
+    """
+    Gom items (Deployment/StatefulSet/HPA) thành:
+      ns -> {"workloads": [(kind, name, replicas, resourceVersion)], "hpa": {(kind, name): minReplicas},
+             "labels": {(kind, name): label pod template}}
+    replicas lấy thẳng từ .spec.replicas của list JSON (-1 nếu không đọc được); labels cho PDB_GUARD.
+    """
+    inv: Dict[str, dict] = {}
+    for it in items:
+        meta = it.get("metadata", {}) or {}
+        ns = meta.get("namespace", "")
+        if not ns or (keep_ns and not keep_ns(ns)):
+            continue
+        slot = inv.setdefault(ns, {"workloads": [], "hpa": {}, "labels": {}})
+        spec = it.get("spec", {}) or {}
+        if it.get("kind") == "HorizontalPodAutoscaler":
+            ref = spec.get("scaleTargetRef", {}) or {}
+            kind = _short_kind(ref.get("kind"))
+            name = ref.get("name", "")
+            if kind and name:
+                m = spec.get("minReplicas", 1)
+                try: m = int(m)
+                except: m = 1
+                slot["hpa"][(kind, name)] = max(1, m)
+            continue
+        kind = _short_kind(it.get("kind"))
+        name = meta.get("name", "")
+        if not kind or not name:
+            continue
+        try: rep = int(spec.get("replicas", 1))
+        except: rep = -1
+        slot["workloads"].append((kind, name, rep, meta.get("resourceVersion", "")))
+        slot["labels"][(kind, name)] = ((spec.get("template") or {}).get("metadata") or {}).get("labels") or {}
+    for slot in inv.values():
+        slot["workloads"].sort()
+    return inv
+
+def load_inventory() -> Dict[str, dict]:
+    """
+    INVENTORY_MODE=cluster   : 1 lệnh list deploy,statefulset,hpa -A, lọc ns local theo managed/deny.
+    INVENTORY_MODE=namespace : 1 lệnh list mỗi managed ns (khi kubeconfig không có quyền cluster-wide).
+    INVENTORY_SOURCE=snapshot: lấy từ snapshot của inventory_cache (không gọi API), lọc ns như cluster.
+    """
+    keep = ns_matcher().allowed     # stat 2 file 1 lần / run, không phải mỗi item
+    kinds = ["deployments", "statefulsets", "horizontalpodautoscalers"]
+    snap = inventory_snapshot()
+    if snap:
+        return index_inventory(inventory_cache.snapshot_items(snap, kinds), keep)
+    if INVENTORY_MODE == "namespace":
+        items = []
+        for ns in get_managed_namespaces():
+            try:
+                items.extend(kube().list_items(kinds, namespace=ns, timeout=max(1.0, parse_duration(KUBECTL_TIMEOUT))))
+            except KubeError as e:
+                if DEBUG: print(f"[warn] get workloads ns={ns} failed:", e)
+        return index_inventory(items, keep)
+
+    try:
+        items = kube().list_items(kinds, timeout=INVENTORY_TIMEOUT_S)
+    except KubeError as e:
+        raise RuntimeError(f"list deploy,statefulset,hpa -A failed: {e}")
+    return index_inventory(items, keep)
 
 def scale_to(ns: str, kind: str, name: str, replicas: int) -> bool:
     if DRY_RUN:
         print(f"🧪 [dry-run] scale {kind}/{name} -n {ns} -> {replicas}")
         return True
-    rc,out,err = run_k(["-n", ns, "scale", kind, name, f"--replicas={replicas}"])
-    if rc == 0:
+    ok, err = kube().scale(ns, kind, name, replicas)
+    if ok:
         print(f"✅ scaled {kind}/{name} -n {ns} -> {replicas}")
         return True
     else:
@@ -228,86 +301,240 @@ def scale_to(ns: str, kind: str, name: str, replicas: int) -> bool:
         return False
 
 # -------- Holidays & active exceptions --------
-def load_holidays() -> set:
-    s=set()
-    if os.path.exists(HOLIDAYS_FILE):
-        for line in open(HOLIDAYS_FILE,"r",encoding="utf-8"):
-            t=line.strip()
-            if not t or t.startswith("#"): continue
-            s.add(t)
-    return s
-
-def today_iso():
-    return local_now().date().isoformat()
-
-def load_active_map() -> Dict[str, dict]:
-    path = os.path.join(OUT_DIR, "active_exceptions.jsonl")
-    m={}
-    if not os.path.exists(path): return m
-    with open(path,"r",encoding="utf-8") as f:
-        for line in f:
-            line=line.strip()
-            if not line: continue
-            r=json.loads(line)
-            ns=(r.get("ns") or "").strip()
-            wl=(r.get("workload") or "").strip()
-            mode=(r.get("mode") or "").strip()
-            if not ns or not wl or mode not in ("247","out_worktime"): continue
-            m[f"{ns}|{wl}"]=r
-    return m
-
-# --- precedence & effective mode (refactor) ---
-def _parse_date_safe(s):
-    try:
-        return datetime.date.fromisoformat(str(s)[:10])
-    except Exception:
-        return None
-
-def exception_mode_for(ns: str, name: str, active_map: Dict[str,dict], today: datetime.date=None) -> str:
-    if today is None:
-        today = local_now().date()
-
-    spec = active_map.get(f"{ns}|{name}")
-    glob = (active_map.get(f"{ns}|_ALL_")
-            or active_map.get(f"{ns}|__ALL__")
-            or active_map.get(f"{ns}|ALL")
-            or active_map.get(f"{ns}|*"))
-
-    def active_mode(rec):
-        if not rec:
-            return None
-        ed = _parse_date_safe(rec.get("end_date"))
-        if not ed or ed < today:
-            return None
-        m = (rec.get("mode") or "").strip()
-        return m if m in ("247","out_worktime") else None
-
-    modes = [m for m in (active_mode(spec), active_mode(glob)) if m]
-
-    if "247" in modes:
-        return "247"
-    if "out_worktime" in modes:
-        return "out_worktime"
-    return "none"
+def load_holidays() -> holiday_calendar.HolidayCalendar:
+    # index cache theo sha256 của HOLIDAYS_FILE (STATE_ROOT/holidays-index.json), không có file -> lịch rỗng
+    return holiday_calendar.load(HOLIDAYS_FILE)
+
+def load_decision_index() -> decision_index.DecisionIndex:
+    """decision_index.json do compute-active ghi; cũ/thiếu -> build lại từ active_exceptions.jsonl."""
+    return decision_index.load(DECISION_INDEX_FILE, os.path.join(OUT_DIR, "active_exceptions.jsonl"))
+
+# -------- Executor --------
+def _run_job(job: dict) -> Tuple[dict, dict]:
+    if SCALE_MODE == "bulk" and not DRY_RUN:
+        # bulk: không jitter, API server được bảo vệ bằng backoff 429 + giới hạn concurrency
+        r = bulk_scale.scale_item(kube(), job)
+        tag = f"{job['kind']}/{job['name']} -n {job['ns']} -> {job['target']}"
+        if r["status"] == "ok":
+            print(f"✅ scaled {tag}" + (f" (retries={r['retries']})" if r["retries"] else ""))
+        elif r["status"] == "noop":
+            print(f"ℹ️  already {tag}")
+        elif r["status"] == "conflict":
+            print(f"⚠️  conflict {tag}: {r['error']}")
+        else:
+            print(f"❌ scale {tag}: {r['error']}")
+        return job, r
+    # jitter nằm trong worker: N worker ngủ song song thay vì cộng dồn tuần tự
+    time.sleep(random.uniform(0, job["jitter_s"]))
+    ok = scale_to(job["ns"], job["kind"], job["name"], job["target"])
+    return job, {"ns": job["ns"], "kind": job["kind"], "name": job["name"], "target": job["target"],
+                 "status": "ok" if ok else "failed", "attempts": 1, "retries": 0}
+
+def run_scale_jobs(jobs: List[dict], state: dict, results: List[dict] = None) -> Tuple[int, int]:
+    """
+    Chạy jobs với tối đa SCALE_CONCURRENCY worker.
+    - MAX_ACTIONS_PER_RUN: chỉ submit thêm khi (thành công + đang chạy) < cap
+    - state chỉ được ghi ở thread chính (trước khi submit / khi nhận kết quả)
+    Trả về (changed, pending) với pending = số job chưa chạy do chạm cap; kết quả từng job gom vào `results`.
+    """
+    workers = max(1, SCALE_CONCURRENCY)
+    cap = MAX_ACTIONS_PER_RUN
+    changed = 0
+    idx = 0
+    inflight = set()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        while idx < len(jobs) or inflight:
+            while idx < len(jobs) and len(inflight) < workers and (cap <= 0 or changed + len(inflight) < cap):
+                job = jobs[idx]; idx += 1
+                if job.get("state_before"):
+                    state[job["key"]] = job["state_before"]
+                inflight.add(ex.submit(_run_job, job))
+            if not inflight:
+                break
+            done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                job, res = fut.result()
+                if results is not None:
+                    results.append(res)
+                if res["status"] in ("ok", "noop"):
+                    changed += 1 if res["status"] == "ok" else 0
+                    if job.get("state_after"):
+                        state[job["key"]] = {**job["state_after"], "last_up": time.time()}
+    return changed, len(jobs) - idx
+
+def down_job(ns: str, kind: str, name: str, cur: int, rv: str = "") -> dict:
+    return {"ns": ns, "kind": kind, "name": name, "key": f"{ns}|{kind}|{name}",
+            "target": TARGET_DOWN, "jitter_s": JITTER_DOWN_S, "current": cur, "rv": rv,
+            "state_before": {"prev_replicas": cur, "last_down": time.time()}}
+
+def up_job(ns: str, kind: str, name: str, target: int, jitter_s: int, cur: int = 0, rv: str = "") -> dict:
+    return {"ns": ns, "kind": kind, "name": name, "key": f"{ns}|{kind}|{name}",
+            "target": target, "jitter_s": jitter_s, "current": cur, "rv": rv,
+            "state_after": {"prev_replicas": target}}
+
+def job_from_action(a: dict) -> dict:
+    if a["op"] == "down":
+        return down_job(a["ns"], a["kind"], a["name"], a["current"], a.get("rv", ""))
+    return up_job(a["ns"], a["kind"], a["name"], a["target"], a.get("jitter_s", 0), a["current"], a.get("rv", ""))
+
+def cursor_expiry(window: str, now: datetime.datetime) -> float:
+    """Hết hạn = giờ đóng cửa sổ của action (hoặc lúc lưu, nếu ACTION ép ngoài giờ) + CURSOR_GRACE_MIN."""
+    day, act = window.split(":", 1)
+    end = run_schedule().window_end(datetime.date.fromisoformat(day), act)
+    return max(end, now).timestamp() + CURSOR_GRACE_MIN * 60
+
+def save_cursor(plan: dict, plan_path: str, pending: int):
+    cur = {"window": plan["window"], "action": plan["action"], "plan": plan_path, "pending": pending,
+           "saved_at": time.time(), "expires_at": cursor_expiry(plan["window"], local_now())}
+    tmp = RUN_CURSOR_FILE + ".tmp"
+    os.makedirs(os.path.dirname(RUN_CURSOR_FILE), exist_ok=True)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cur, f, ensure_ascii=False)
+    os.replace(tmp, RUN_CURSOR_FILE)
 
-# -------- Decisions --------
-def should_up_in_weekday_prestart() -> bool:
-    return True
+def load_cursor() -> dict:
+    try:
+        with open(RUN_CURSOR_FILE, "r", encoding="utf-8") as f:
+            return json.load(f) or {}
+    except (OSError, ValueError):
+        return {}
 
-def should_up_in_weekend_pre(mode: str) -> bool:
-    return mode in ("out_worktime","247")
+def clear_cursor():
+    try:
+        os.remove(RUN_CURSOR_FILE)
+    except FileNotFoundError:
+        pass
 
-def should_up_in_enter_out(mode: str) -> bool:
-    return mode in ("out_worktime","247")
+def resume_cursor(act: str, today: datetime.date) -> None:
+    """
+    Có cursor cùng window (ngày + action; act=noop khi đã qua giờ đóng) và chưa hết hạn -> apply tiếp plan.
+    Cursor khác window / hết hạn -> bỏ (tick này lập plan mới như bình thường).
+    """
+    cur = load_cursor()
+    if not cur:
+        return
+    day = cur.get("window", "").split(":", 1)[0]
+    if day == today.isoformat() and act in (cur.get("action"), "noop") and time.time() <= cur.get("expires_at", 0):
+        plan = scale_planner.load_plan(cur.get("plan", ""))
+        if plan is not None and plan["window"] == cur["window"] and scale_planner.pending(plan):
+            print(f"⏩ resume cursor window={cur['window']} pending={len(scale_planner.pending(plan))} (skip inventory)")
+            apply_plan(plan, load_state(), f". action={plan['action']} (cursor)", path=cur["plan"])
+    print(f"🧹 drop run cursor window={cur.get('window')} (khác window / hết hạn / đã xong)")
+    clear_cursor()
+
+def apply_plan(plan: dict, state: dict, label: str, extra: str = "", path: str = None):
+    """
+    Apply stage: chạy action pending/failed của plan theo đúng thứ tự, ghi status lại vào plan (path).
+    Chạm MAX_ACTIONS_PER_RUN -> lưu run cursor để tick sau trong window chạy tiếp.
+    """
+    path = path or SCALE_PLAN_FILE
+    todo = scale_planner.pending(plan)
+    jobs = [job_from_action(a) for a in todo]
+    print(f"🚀 {len(jobs)} action(s) across {len({a['ns'] for a in todo})} ns, SCALE_CONCURRENCY={max(1, SCALE_CONCURRENCY)} SCALE_MODE={SCALE_MODE}")
+    started = time.time()
+    results: List[dict] = []
+    changed, pending = run_scale_jobs(jobs, state, results)
+    save_state(state)
+    scale_planner.mark(plan, results)
+    if not DRY_RUN:
+        scale_planner.save_plan(path, plan)
+        if pending:
+            save_cursor(plan, path, pending)
+        else:
+            clear_cursor()
+    if results and not DRY_RUN:
+        rep = bulk_scale.write_report(SCALE_REPORT_FILE, plan["action"], started, results,
+                                      {"mode": SCALE_MODE, "pending": pending, "window": plan["window"]})
+        t = rep["totals"]
+        print(f"📑 report: ok={t['ok']} noop={t['noop']} conflict={t['conflict']} failed={t['failed']} retries={t['retries']} throttled={t['throttled']} → {SCALE_REPORT_FILE}")
+    if pending:
+        print(f"⏳ Reached MAX_ACTIONS_PER_RUN={MAX_ACTIONS_PER_RUN}, partial done. changed={changed} pending={pending} (plan: {path}, cursor: {RUN_CURSOR_FILE})")
+        sys.exit(0)
+    print(f"✅ Done{label} changed={changed}{extra}")
+    sys.exit(0)
+
+def make_plan(act: str, today: datetime.date, inv: Dict[str, dict], state: dict, hard_off: bool,
+              holiday_ns=None) -> dict:
+    need_active = (not hard_off) and act in ("weekday_enter_out","weekend_pre","weekend_close")
+    dix = load_decision_index() if need_active else decision_index.DecisionIndex()
+    if DEBUG and need_active:
+        print(f"[DEBUG] decision index: entries={len(dix)} built_for={dix.today or '-'}")
+    t0 = time.perf_counter()
+    plan = scale_planner.build_plan(
+        act, today, inv, dix, state, holiday_hard_off=hard_off,
+        target_down=TARGET_DOWN, default_up=DEFAULT_UP, down_hpa_handling=DOWN_HPA_HANDLING,
+        jitter_up_bulk=JITTER_UP_BULK_S, jitter_up_exc=JITTER_UP_EXC_S, jitter_down=JITTER_DOWN_S,
+        holiday_ns=holiday_ns)
+    ms = (time.perf_counter() - t0) * 1000
+    pdb_guard(plan, inv)
+    for w in plan["skipped"]["unknown_replicas"]:
+        print(f"⚠️  cannot get replicas for {w}")
+    if DEBUG:
+        for h in plan["skipped"]["hpa"]:
+            print(f"[DEBUG] skip DOWN {h}")
+    prev = scale_planner.load_plan(SCALE_PLAN_FILE)
+    d = scale_planner.diff_plans(prev, plan)
+    ups = sum(1 for a in plan["actions"] if a["op"] == "up")
+    print(f"🧾 plan window={plan['window']} actions={len(plan['actions'])} (up={ups} down={len(plan['actions']) - ups}) "
+          f"built in {ms:.1f}ms; Δ vs previous: +{len(d['added'])} -{len(d['removed'])} ~{len(d['changed'])}")
+    if not DRY_RUN:
+        if prev is not None:
+            os.replace(SCALE_PLAN_FILE, SCALE_PLAN_FILE.rsplit(".json", 1)[0] + ".prev.json")
+        scale_planner.save_plan(SCALE_PLAN_FILE, plan)
+    return plan
+
+def pdb_guard(plan: dict, inv: Dict[str, dict]):
+    """DOWN không được đẩy PDB của workload còn pod về allowed 0 (evict / drain node sau đó bị chặn)."""
+    if PDB_GUARD == "off":
+        return
+    nss = sorted({a["ns"] for a in plan["actions"] if a["op"] == "down" and a["target"] > 0})
+    if not nss:
+        return
+    try:
+        pdbs = list_pdbs(kube(), nss)
+    except KubeError as e:
+        print(f"⚠️  PDB_GUARD: list PDB failed ({e}) → không kiểm PDB")
+        return
+    for line in pdb_scout.guard_plan(plan, inv, pdbs, PDB_GUARD):
+        print(line)
 
-def should_keep_up_247(mode: str) -> bool:
-    return mode == "247"
+def _arg_value(flag: str) -> str:
+    i = sys.argv.index(flag)
+    return sys.argv[i+1] if i + 1 < len(sys.argv) and not sys.argv[i+1].startswith("-") else ""
 
 # -------- Main --------
 def main():
+    if "--next" in sys.argv[1:]:
+        # cửa sổ đang mở / kế tiếp (tính cả ngày lễ hard_off), không gọi kube; --json cho job chờ đúng giờ
+        info = schedule.describe_next(run_schedule(), local_now(), is_holiday_date)
+        print(json.dumps(info, ensure_ascii=False) if "--json" in sys.argv[1:] else schedule.format_next(info))
+        sys.exit(0 if info.get("action") else 1)
+
+    if "--explain-ns" in sys.argv[1:]:
+        i = sys.argv.index("--explain-ns")
+        try:
+            sys.exit(explain_namespaces([a for a in sys.argv[i+1:] if not a.startswith("-")]))
+        except Exception as e:
+            print(f"❌ explain-ns error: {e}")
+            sys.exit(2)
+
+    if "--apply" in sys.argv[1:]:
+        # chạy tiếp action pending/failed của 1 plan đã lưu (không list lại inventory)
+        path = _arg_value("--apply") or SCALE_PLAN_FILE
+        plan = scale_planner.load_plan(path)
+        if plan is None:
+            print(f"❌ cannot read plan {path}")
+            sys.exit(2)
+        print(f"🧾 apply plan {path} window={plan['window']} {scale_planner.counts(plan)}")
+        apply_plan(plan, load_state(), f". action={plan['action']} (resumed)", path=path)
+
+    plan_only = "--plan-only" in sys.argv[1:]
     now = local_now()
     today = now.date()
-    is_holiday = (today_iso() in load_holidays())
+    cal = load_holidays()
+    is_holiday = cal.is_holiday(today)
+    # ns có lịch nghỉ riêng hôm nay (section [ns:...]) -> DOWN riêng các ns đó, kể cả ngoài cửa sổ
+    holiday_ns = cal.ns_holiday_pred(today) if (HOLIDAY_MODE == "hard_off" and not is_holiday) else None
 
     act = ACTION
     if act == "auto":
@@ -315,96 +542,42 @@ def main():
 
     print(f"⏱️  now={now} TZ={TZ} action={act} holiday={is_holiday} DRY_RUN={int(DRY_RUN)}")
 
-    if act == "noop" and not (is_holiday and HOLIDAY_MODE == "hard_off"):
+    hard_off = is_holiday and HOLIDAY_MODE == "hard_off"
+    if not plan_only:
+        resume_cursor("holiday_hard_off" if hard_off else act, today)
+
+    if act == "noop" and not hard_off and not holiday_ns:
         print("🛌 NOOP window → fast exit (skip kubectl).")
         sys.exit(0)
 
     state = load_state()
 
-    if is_holiday and HOLIDAY_MODE == "hard_off":
-        print("🎌 Holiday hard_off → DOWN all workloads in managed namespaces.")
-        try:
-            mns = get_managed_namespaces()
-        except Exception as e:
-            print(f"❌ managed namespaces error: {e}")
-            sys.exit(2)
-        print(f"📦 managed namespaces: {len(mns)}")
-        changed = 0
-        actions = 0
-        for ns in mns:
-            for kind,name in list_workloads(ns):
-                cur = get_replicas(ns, kind, name)
-                if cur < 0:
-                    print(f"⚠️  cannot get replicas for {kind}/{name} -n {ns}")
-                    continue
-                if cur > TARGET_DOWN:
-                    state[f"{ns}|{kind}|{name}"] = {"prev_replicas": cur, "last_down": time.time()}
-                    time.sleep(random.uniform(0, JITTER_DOWN_S))
-                    if scale_to(ns, kind, name, TARGET_DOWN):
-                        changed += 1
-                        actions += 1
-                        if MAX_ACTIONS_PER_RUN > 0 and actions >= MAX_ACTIONS_PER_RUN:
-                            save_state(state)
-                            print(f"⏳ Reached MAX_ACTIONS_PER_RUN={MAX_ACTIONS_PER_RUN}, partial done. changed={changed}")
-                            sys.exit(0)
-        save_state(state)
-        print(f"✅ Done (holiday). changed={changed}")
-        sys.exit(0)
-
     try:
-        mns = get_managed_namespaces()
+        inv = load_inventory()
     except Exception as e:
-        print(f"❌ managed namespaces error: {e}")
+        print(f"❌ inventory error: {e}")
         sys.exit(2)
 
-    print(f"📦 managed namespaces: {len(mns)}")
+    gc_state(state, inv)
+
+    if hard_off:
+        print("🎌 Holiday hard_off → DOWN all workloads in managed namespaces.")
+    elif holiday_ns:
+        off = [ns for ns in inv if holiday_ns(ns)]
+        print(f"🎌 Namespace holiday → DOWN {len(off)} ns: {', '.join(sorted(off)[:10])}{' …' if len(off) > 10 else ''}")
+    print(f"📦 managed namespaces: {len(inv)}")
     if DEBUG:
-        print(f"[DEBUG] JITTER_UP_BULK_S={JITTER_UP_BULK_S}, JITTER_UP_EXC_S={JITTER_UP_EXC_S}, JITTER_DOWN_S={JITTER_DOWN_S}, KUBECTL_TIMEOUT={KUBECTL_TIMEOUT}, MAX_ACTIONS_PER_RUN={MAX_ACTIONS_PER_RUN}")
+        print(f"[DEBUG] JITTER_UP_BULK_S={JITTER_UP_BULK_S}, JITTER_UP_EXC_S={JITTER_UP_EXC_S}, JITTER_DOWN_S={JITTER_DOWN_S}, KUBECTL_TIMEOUT={KUBECTL_TIMEOUT}, MAX_ACTIONS_PER_RUN={MAX_ACTIONS_PER_RUN}, INVENTORY_MODE={INVENTORY_MODE}, SCALE_CONCURRENCY={SCALE_CONCURRENCY}")
 
-    need_active = act in ("weekday_enter_out","weekend_pre","weekend_close")
-    active = load_active_map() if need_active else {}
+    plan = make_plan(act, today, inv, state, hard_off, holiday_ns)
+    if plan_only:
+        for a in plan["actions"]:
+            print("  " + scale_planner.format_action(a))
+        sys.exit(0)
 
-    changed = 0
-    actions = 0
-    for ns in mns:
-        hpa = hpa_index(ns)
-        for kind,name in list_workloads(ns):
-            want_up = None
-            mode = "none"
-            if act == "weekday_prestart":
-                want_up = should_up_in_weekday_prestart()
-            elif act == "weekday_enter_out":
-                mode = exception_mode_for(ns, name, active, today)
-                want_up = should_up_in_enter_out(mode)
-            elif act == "weekend_pre":
-                mode = exception_mode_for(ns, name, active, today)
-                want_up = should_up_in_weekend_pre(mode)
-            elif act == "weekend_close":
-                mode = exception_mode_for(ns, name, active, today)
-                want_up = should_keep_up_247(mode)
-            else:
-                continue
-
-            cur = get_replicas(ns, kind, name)
-            if cur < 0:
-                print(f"⚠️  cannot get replicas for {kind}/{name} -n {ns}")
-                continue
-
-            if want_up:
-                if (kind,name) in hpa:
-                    target = max(1, int(hpa[(kind,name)]))
-                else:
-                    prev = state.get(f"{ns}|{kind}|{name}",{}).get("prev_replicas", None)
-                    target = int(prev) if isinstance(prev,int) and prev>=1 else DEFAULT_UP
-
-                if cur == 0 and target >= 1:
-                    if act == "weekday_prestart":
-                        time.sleep(random.uniform(0, JITTER_UP_BULK_S))
-                    else:
-                        time.sleep(random.uniform(0, JITTER_UP_EXC_S))
-                    if scale_to(ns, kind, name, target):
-                        state[f"{ns}|{kind}|{name}"] = {"prev_replicas": target, "last_up": time.time()}
-                        changed += 1
-                        actions += 1
-            else:
-                if act == "weekend_pre
+    if hard_off:
+        apply_plan(plan, state, " (holiday).")
+    apply_plan(plan, state, f". action={act}", f" skipped_hpa={len(plan['skipped']['hpa'])} skipped_pdb={len(plan['skipped'].get('pdb', []))}")
+
+if __name__ == "__main__":
+    main()
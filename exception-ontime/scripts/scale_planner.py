@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scale_planner.py
+
+Tách "quyết định" khỏi "thực thi" của scaler:
+
+- build_plan(): hàm thuần (không gọi kube, không sleep) nhận inventory (index_inventory), decision index,
+  holiday, replicas.json -> plan có thứ tự: mỗi action {ns, kind, name, op, current, target, rv, jitter_s, reason, status}
+- Thứ tự cố định: UP trước DOWN (pending UP = workload ngoại lệ chưa chạy, đắt hơn pending DOWN),
+  trong mỗi nhóm round-robin giữa các namespace -> MAX_ACTIONS_PER_RUN cắt theo thứ tự có chủ đích
+- Plan ghi ra JSON 1 action/dòng (diff được giữa 2 tick), status cập nhật sau apply:
+  pending | ok | noop | conflict | failed; pending/failed còn lại chạy tiếp được bằng `--apply FILE`
+
+CLI:
+  python3 scale_planner.py show scale-plan.json
+  python3 scale_planner.py diff scale-plan.prev.json scale-plan.json
+"""
+
+import os, sys, json, datetime
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+PLAN_VERSION = 1
+RETRY_STATUSES = ("pending", "failed")
+
+def action_key(a: dict) -> str:
+    return f"{a['ns']}|{a['kind']}|{a['name']}"
+
+def fair_order(actions: List[dict]) -> List[dict]:
+    """Round-robin giữa các namespace (ns sort theo tên) để ns lớn không chặn ns nhỏ."""
+    by_ns: Dict[str, deque] = {}
+    for a in actions:
+        by_ns.setdefault(a["ns"], deque()).append(a)
+    queues = [by_ns[ns] for ns in sorted(by_ns)]
+    out = []
+    while queues:
+        for q in queues:
+            out.append(q.popleft())
+        queues = [q for q in queues if q]
+    return out
+
+def should_up_in_weekday_prestart() -> bool:
+    return True
+
+def should_up_in_weekend_pre(mode: str) -> bool:
+    return mode in ("out_worktime","247")
+
+def should_up_in_enter_out(mode: str) -> bool:
+    return mode in ("out_worktime","247")
+
+def should_keep_up_247(mode: str) -> bool:
+    return mode == "247"
+
+def _action(ns, kind, name, op, cur, target, rv, jitter_s, reason) -> dict:
+    return {"ns": ns, "kind": kind, "name": name, "op": op, "current": cur, "target": target,
+            "rv": rv, "jitter_s": jitter_s, "reason": reason, "status": "pending"}
+
+def build_plan(act: str, today: datetime.date, inv: Dict[str, dict], dix, state: Dict[str, dict],
+               holiday_hard_off: bool = False, target_down: int = 0, default_up: int = 1,
+               down_hpa_handling: str = "skip", jitter_up_bulk: int = 0, jitter_up_exc: int = 0,
+               jitter_down: int = 0, holiday_ns: Optional[Callable[[str], bool]] = None) -> dict:
+    """
+    act: weekday_prestart | weekday_enter_out | weekend_pre | weekend_close (holiday_hard_off ghi đè act).
+    dix: decision_index.DecisionIndex (chỉ dùng cho enter_out / weekend_*).
+    holiday_ns: ns -> True nếu ns nghỉ riêng hôm nay (section [ns:...] của holiday_calendar) -> DOWN như hard_off.
+    """
+    if holiday_hard_off:
+        act = "holiday_hard_off"
+    today_ord = today.toordinal()
+    ups, downs, unknown, skipped_hpa = [], [], [], []
+
+    for ns in sorted(inv):
+        hpa = inv[ns]["hpa"]
+        ns_off = act == "holiday_hard_off" or bool(holiday_ns and holiday_ns(ns))
+        for kind, name, cur, rv in inv[ns]["workloads"]:
+            if ns_off:
+                if cur < 0:
+                    unknown.append(f"{kind}/{name} -n {ns}")
+                elif cur > target_down:
+                    downs.append(_action(ns, kind, name, "down", cur, target_down, rv, jitter_down, "holiday hard_off"))
+                continue
+
+            mode = "none"
+            if act == "weekday_prestart":
+                want_up = should_up_in_weekday_prestart()
+            elif act == "weekday_enter_out":
+                mode = dix.mode_for(ns, name, today_ord)
+                want_up = should_up_in_enter_out(mode)
+            elif act == "weekend_pre":
+                mode = dix.mode_for(ns, name, today_ord)
+                want_up = should_up_in_weekend_pre(mode)
+            elif act == "weekend_close":
+                mode = dix.mode_for(ns, name, today_ord)
+                want_up = should_keep_up_247(mode)
+            else:
+                continue
+
+            if cur < 0:
+                unknown.append(f"{kind}/{name} -n {ns}")
+                continue
+
+            if want_up:
+                if (kind, name) in hpa:
+                    target, src = max(1, int(hpa[(kind, name)])), "hpa min"
+                else:
+                    prev = state.get(f"{ns}|{kind}|{name}", {}).get("prev_replicas", None)
+                    if isinstance(prev, int) and prev >= 1:
+                        target, src = int(prev), "prev"
+                    else:
+                        target, src = default_up, "default"
+                if cur == 0 and target >= 1:
+                    jitter = jitter_up_bulk if act == "weekday_prestart" else jitter_up_exc
+                    reason = "prestart" if act == "weekday_prestart" else f"exception {mode}"
+                    ups.append(_action(ns, kind, name, "up", cur, target, rv, jitter, f"{reason}, target={src}"))
+            else:
+                if act == "weekend_pre":
+                    # weekend_pre chỉ UP theo exception, không DOWN workload khác
+                    continue
+                if (kind, name) in hpa and down_hpa_handling != "force":
+                    skipped_hpa.append(f"{kind}/{name} -n {ns}: HPA minReplicas={hpa[(kind, name)]}")
+                    continue
+                if cur > target_down:
+                    reason = "no exception" if mode == "none" else f"exception {mode}"
+                    downs.append(_action(ns, kind, name, "down", cur, target_down, rv, jitter_down, reason))
+
+    return {
+        "version": PLAN_VERSION,
+        "window": f"{today.isoformat()}:{act}",
+        "action": act,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "skipped": {"hpa": skipped_hpa, "unknown_replicas": unknown},
+        "actions": fair_order(ups) + fair_order(downs),
+    }
+
+def pending(plan: dict) -> List[dict]:
+    return [a for a in plan.get("actions", []) if a.get("status", "pending") in RETRY_STATUSES]
+
+def mark(plan: dict, results: List[dict]):
+    """Cập nhật status từng action theo kết quả scale (key ns|kind|name)."""
+    by_key = {f"{r['ns']}|{r['kind']}|{r['name']}": r for r in results}
+    for a in plan.get("actions", []):
+        r = by_key.get(action_key(a))
+        if r:
+            a["status"] = r["status"]
+            if r.get("error"):
+                a["error"] = r["error"]
+
+def counts(plan: dict) -> Dict[str, int]:
+    c: Dict[str, int] = {}
+    for a in plan.get("actions", []):
+        c[a.get("status", "pending")] = c.get(a.get("status", "pending"), 0) + 1
+    return c
+
+def save_plan(path: str, plan: dict):
+    """Ghi atomic, mỗi action 1 dòng (sort_keys) để `diff` 2 file plan đọc được."""
+    head = {k: v for k, v in plan.items() if k != "actions"}
+    lines = [json.dumps(a, ensure_ascii=False, sort_keys=True) for a in plan.get("actions", [])]
+    body = json.dumps(head, ensure_ascii=False, sort_keys=True)[:-1]
+    body += ', "actions": [\n' + ",\n".join(lines) + ("\n" if lines else "") + "]}\n"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+def load_plan(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return plan if plan.get("version") == PLAN_VERSION else None
+
+def diff_plans(old: Optional[dict], new: dict) -> Dict[str, List[str]]:
+    """So action theo key: added / removed / changed (op hoặc target khác)."""
+    o = {action_key(a): a for a in (old or {}).get("actions", [])}
+    n = {action_key(a): a for a in new.get("actions", [])}
+    changed = [k for k in n if k in o and (o[k]["op"], o[k]["target"]) != (n[k]["op"], n[k]["target"])]
+    return {"added": [k for k in n if k not in o], "removed": [k for k in o if k not in n], "changed": changed}
+
+def format_action(a: dict) -> str:
+    return (f"{a.get('status','pending'):<8} {a['op']:<4} {a['kind']}/{a['name']} -n {a['ns']} "
+            f"{a['current']}->{a['target']}  ({a['reason']})")
+
+def main(argv: List[str]) -> int:
+    if len(argv) >= 2 and argv[0] == "show":
+        plan = load_plan(argv[1])
+        if plan is None:
+            print(f"❌ cannot read plan {argv[1]}")
+            return 2
+        print(f"🧾 window={plan['window']} created_at={plan['created_at']} {counts(plan)} skipped_hpa={len(plan['skipped']['hpa'])}")
+        for a in plan["actions"]:
+            print("  " + format_action(a))
+        return 0
+    if len(argv) >= 3 and argv[0] == "diff":
+        old, new = load_plan(argv[1]), load_plan(argv[2])
+        if new is None:
+            print(f"❌ cannot read plan {argv[2]}")
+            return 2
+        d = diff_plans(old, new)
+        n = {action_key(a): a for a in new["actions"]}
+        for k in d["added"]:
+            print("+ " + format_action(n[k]))
+        for k in d["removed"]:
+            print("- " + k)
+        for k in d["changed"]:
+            print("~ " + format_action(n[k]))
+        print(f"Δ added={len(d['added'])} removed={len(d['removed'])} changed={len(d['changed'])}")
+        return 1 if any(d.values()) else 0
+    print(__doc__)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+schedule.py
+
+Lịch cửa sổ chạy của scaler dạng khai báo, compile thành bảng chuyển trạng thái đã sort theo phút trong ngày
+(mỗi thứ trong tuần 1 bảng) -> "action lúc T" và "cửa sổ kế tiếp lúc nào" tra bằng bisect, O(log n).
+
+Spec (JSON, SCHEDULE_FILE; không set -> DEFAULT_SPEC, trùng đúng các khung giờ decide_action cũ):
+  {"windows": [{"action": "weekday_prestart", "days": "weekday", "start": "07:10", "end": "08:05"}, ...],
+   "holiday": {"action": "holiday_hard_off", "start": "00:00", "end": "23:59"}}
+- days: "weekday" | "weekend" | "daily" | ["mon", "wed", ...]
+- start/end: HH:MM theo giờ local (TZ), end tính cả phút cuối (như so chuỗi "<= 08:05" cũ)
+- holiday: ngày lễ (HOLIDAY_MODE=hard_off) thay toàn bộ cửa sổ của ngày bằng cửa sổ này; null = không override
+- Cửa sổ chồng nhau trong cùng 1 ngày -> ValueError lúc compile
+
+CLI:
+  python3 schedule.py table                 # bảng chuyển trạng thái đã compile
+  python3 schedule.py next [--json]         # action hiện tại / kế tiếp và thời điểm bắt đầu, kết thúc
+  python3 schedule.py wait                  # ngủ tới đầu cửa sổ kế tiếp (0 nếu đang trong cửa sổ) rồi in action
+"""
+
+import os, sys, json, time, datetime
+from bisect import bisect_right
+from typing import Callable, Dict, List, Optional, Tuple
+import holiday_calendar
+
+SCHEDULE_FILE = os.environ.get("SCHEDULE_FILE", "").strip()
+
+DEFAULT_SPEC = {
+    "windows": [
+        {"action": "weekday_prestart",  "days": "weekday", "start": "07:10", "end": "08:05"},
+        {"action": "weekday_enter_out", "days": "weekday", "start": "17:55", "end": "18:05"},
+        {"action": "weekend_pre",       "days": "weekend", "start": "08:45", "end": "09:05"},
+        {"action": "weekend_close",     "days": "weekend", "start": "19:55", "end": "20:05"},
+    ],
+    "holiday": {"action": "holiday_hard_off", "start": "00:00", "end": "23:59"},
+}
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+DAY_SETS = {"weekday": range(0, 5), "weekend": range(5, 7), "daily": range(0, 7)}
+
+Segment = Tuple[int, int, str]     # (phút bắt đầu, phút kết thúc không gồm, action)
+
+def _minute(hm: str) -> int:
+    t = datetime.time.fromisoformat(hm)
+    return t.hour * 60 + t.minute
+
+def _days(v) -> List[int]:
+    if isinstance(v, str):
+        if v.lower() in DAY_SETS:
+            return list(DAY_SETS[v.lower()])
+        v = [v]
+    out = []
+    for d in v or []:
+        d = str(d).lower()[:3]
+        if d not in DAY_NAMES:
+            raise ValueError(f"schedule: ngày không hợp lệ {d!r}")
+        out.append(DAY_NAMES.index(d))
+    return out
+
+def _segment(w: dict) -> Segment:
+    s, e = _minute(w["start"]), _minute(w["end"]) + 1
+    if e <= s:
+        raise ValueError(f"schedule: {w.get('action')} end {w['end']} trước start {w['start']} (không hỗ trợ qua nửa đêm)")
+    return (s, e, w["action"])
+
+class Schedule:
+    def __init__(self, spec: dict = None):
+        spec = spec or DEFAULT_SPEC
+        self.days: List[List[Segment]] = [[] for _ in range(7)]
+        for w in spec.get("windows") or []:
+            seg = _segment(w)
+            for d in _days(w.get("days", "daily")):
+                self.days[d].append(seg)
+        for d, segs in enumerate(self.days):
+            segs.sort()
+            for a, b in zip(segs, segs[1:]):
+                if b[0] < a[1]:
+                    raise ValueError(f"schedule: {a[2]} và {b[2]} chồng nhau ngày {DAY_NAMES[d]}")
+        self.starts = [[s[0] for s in segs] for segs in self.days]
+        hol = spec.get("holiday")
+        self.holiday: Optional[Segment] = _segment(hol) if hol else None
+        # giờ đóng cửa sổ muộn nhất theo action (cursor_expiry)
+        self.ends: Dict[str, int] = {}
+        for segs in self.days + [[self.holiday] if self.holiday else []]:
+            for s, e, act in segs:
+                self.ends[act] = max(self.ends.get(act, 0), e)
+
+    @classmethod
+    def load(cls, path: str = None) -> "Schedule":
+        path = path if path is not None else SCHEDULE_FILE
+        if not path:
+            return cls(DEFAULT_SPEC)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _day(self, d: datetime.date, is_holiday: Callable[[datetime.date], bool] = None) -> Tuple[List[Segment], List[int]]:
+        if is_holiday and self.holiday and is_holiday(d):
+            return [self.holiday], [self.holiday[0]]
+        wd = d.weekday()
+        return self.days[wd], self.starts[wd]
+
+    def window_at(self, now: datetime.datetime, is_holiday=None) -> Optional[Tuple[str, datetime.datetime, datetime.datetime]]:
+        """Cửa sổ chứa `now` -> (action, start, end) hoặc None."""
+        segs, starts = self._day(now.date(), is_holiday)
+        m = now.hour * 60 + now.minute
+        i = bisect_right(starts, m) - 1
+        if i >= 0 and m < segs[i][1]:
+            return self._window(now.date(), segs[i])
+        return None
+
+    def action_at(self, now: datetime.datetime, is_holiday=None) -> str:
+        w = self.window_at(now, is_holiday)
+        return w[0] if w else "noop"
+
+    def next_window(self, now: datetime.datetime, is_holiday=None) -> Optional[Tuple[str, datetime.datetime, datetime.datetime]]:
+        """Cửa sổ đang mở (start <= now) hoặc cửa sổ kế tiếp trong 8 ngày tới; lịch rỗng -> None."""
+        cur = self.window_at(now, is_holiday)
+        if cur:
+            return cur
+        m = now.hour * 60 + now.minute
+        for k in range(8):
+            d = now.date() + datetime.timedelta(days=k)
+            segs, starts = self._day(d, is_holiday)
+            i = bisect_right(starts, m) if k == 0 else 0
+            if i < len(segs):
+                return self._window(d, segs[i])
+        return None
+
+    def window_end(self, day: datetime.date, act: str) -> datetime.datetime:
+        """Giờ đóng muộn nhất của action (không có trong lịch -> cuối ngày)."""
+        return datetime.datetime.combine(day, datetime.time()) + datetime.timedelta(minutes=self.ends.get(act, 1440) - 1)
+
+    @staticmethod
+    def _window(d: datetime.date, seg: Segment):
+        base = datetime.datetime.combine(d, datetime.time())
+        return seg[2], base + datetime.timedelta(minutes=seg[0]), base + datetime.timedelta(minutes=seg[1])
+
+    def table(self) -> List[Tuple[str, str, str, str]]:
+        out = []
+        for d, segs in enumerate(self.days):
+            for s, e, act in segs:
+                out.append((DAY_NAMES[d], f"{s // 60:02d}:{s % 60:02d}", f"{(e - 1) // 60:02d}:{(e - 1) % 60:02d}", act))
+        if self.holiday:
+            s, e, act = self.holiday
+            out.append(("holiday", f"{s // 60:02d}:{s % 60:02d}", f"{(e - 1) // 60:02d}:{(e - 1) % 60:02d}", act))
+        return out
+
+def describe_next(sched: Schedule, now: datetime.datetime, is_holiday=None) -> dict:
+    w = sched.next_window(now, is_holiday)
+    if not w:
+        return {"now": now.isoformat(timespec="seconds"), "action": None}
+    act, start, end = w
+    return {"now": now.isoformat(timespec="seconds"), "action": act, "active": start <= now,
+            "start": start.isoformat(timespec="minutes"),
+            "end": (end - datetime.timedelta(minutes=1)).isoformat(timespec="minutes"),
+            "in_s": max(0, int((start - now).total_seconds()))}
+
+def format_next(info: dict) -> str:
+    if not info.get("action"):
+        return "⏭️  lịch không có cửa sổ nào"
+    if info["active"]:
+        return f"▶️  {info['action']} đang mở tới {info['end']}"
+    return f"⏭️  {info['action']} lúc {info['start']} (sau {info['in_s']}s, tới {info['end']})"
+
+def main(argv: List[str]) -> int:
+    cmd = argv[0] if argv else "next"
+    try:
+        sched = Schedule.load()
+    except (OSError, ValueError) as e:
+        print(f"❌ schedule: {e}")
+        return 2
+    if cmd == "table":
+        for row in sched.table():
+            print("  {:<8} {}–{}  {}".format(*row))
+        return 0
+    if cmd in ("next", "wait"):
+        try:
+            os.environ["TZ"] = os.environ.get("TZ", "Asia/Bangkok")
+            time.tzset()
+        except Exception:
+            pass
+        # ngày lễ chung (holiday_calendar, HOLIDAYS_FILE) khi HOLIDAY_MODE=hard_off, như scaler
+        cal = holiday_calendar.load()
+        hard_off = os.environ.get("HOLIDAY_MODE", "hard_off").lower() == "hard_off"
+        is_hol = lambda d: hard_off and cal.is_holiday(d)
+        info = describe_next(sched, datetime.datetime.now(), is_hol)
+        if cmd == "wait" and info.get("action"):
+            time.sleep(info["in_s"])
+        print(json.dumps(info, ensure_ascii=False) if "--json" in argv else format_next(info))
+        return 0 if info.get("action") else 1
+    print(__doc__)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
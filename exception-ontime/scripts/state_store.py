@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+state_store.py
+
+State của scaler (key `ns|kind|name` -> {"prev_replicas", "last_down" | "last_up"}) với 2 backend:
+
+- json   : STATE_ROOT/replicas.json như cũ (đọc dưới flock, ghi lại cả file) — mặc định, tương thích ngược
+- sqlite : STATE_ROOT/replicas.sqlite (WAL), mỗi key 1 row; commit chỉ upsert các key đã đổi trong run,
+           gộp 1 transaction -> chi phí save không tăng theo số key tích luỹ
+
+State trả về là StateDict (dict ghi nhận key bị set/xoá) nên code scaler vẫn dùng `state[key] = ...`.
+gc(): xoá key của workload không còn trong inventory (chỉ xét ns đã list được); STATE_GC_DAYS > 0 thì xoá thêm
+key không cập nhật quá N ngày, trừ key đang DOWN (sự kiện cuối là last_down): DOWN chỉ ghi 1 lần và không được
+làm mới khi workload nằm ở 0, xoá đi thì lúc UP mất prev_replicas -> về DEFAULT_UP. Lần đầu mở sqlite mà chưa có DB nhưng có replicas.json -> tự migrate.
+
+ENV:
+  STATE_BACKEND = json | sqlite
+  STATE_DB      = STATE_ROOT/replicas.sqlite
+  STATE_GC_DAYS = 0    (0 = không xoá theo tuổi; chỉ xoá key workload không còn)
+
+CLI:
+  python3 state_store.py stats
+  python3 state_store.py migrate [replicas.json] [replicas.sqlite]
+  python3 state_store.py export [out.json]
+"""
+
+import os, sys, json, time, fcntl, sqlite3
+from typing import Dict, Iterable
+
+STATE_ROOT    = os.environ.get("STATE_ROOT", "/data/exceptions/state")
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "json").lower()
+STATE_FILE    = os.path.join(STATE_ROOT, "replicas.json")
+STATE_DB      = os.environ.get("STATE_DB", "").strip() or os.path.join(STATE_ROOT, "replicas.sqlite")
+STATE_GC_DAYS = int(os.environ.get("STATE_GC_DAYS", "0"))
+
+class StateDict(dict):
+    """dict ghi nhận key đã set/xoá kể từ lúc load (để backend chỉ ghi phần thay đổi)."""
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.dirty = set()
+        self.deleted = set()
+
+    def __setitem__(self, k, v):
+        super().__setitem__(k, v)
+        self.dirty.add(k)
+        self.deleted.discard(k)
+
+    def __delitem__(self, k):
+        super().__delitem__(k)
+        self.dirty.discard(k)
+        self.deleted.add(k)
+
+    def clear_marks(self):
+        self.dirty.clear()
+        self.deleted.clear()
+
+class LockedFile:
+    def __init__(self, path, mode="a+"):
+        self.path=path; self.mode=mode; self.f=None
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.f=open(self.path, self.mode)
+        fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
+        return self.f
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.f.flush(); os.fsync(self.f.fileno())
+        except: pass
+        try:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+            self.f.close()
+        except: pass
+
+def _stale_keys(state: Dict[str, dict], live: Dict[str, set], now: float, max_age_s: float) -> set:
+    """
+    live: ns -> {"kind|name"} của các ns đã list được trong tick. ns không có trong live (ngoài managed,
+    list lỗi) không bị xoá theo inventory — chỉ theo tuổi. Key đang DOWN (last_down mới hơn last_up) không bao giờ
+    bị xoá theo tuổi: prev_replicas của nó là số replicas thật để UP lại.
+    """
+    out = set()
+    for k, v in state.items():
+        ns, _, rest = k.partition("|")
+        if ns in live and rest not in live[ns]:
+            out.add(k)
+            continue
+        if max_age_s > 0:
+            down, up = v.get("last_down"), v.get("last_up")
+            if isinstance(down, (int, float)) and not (isinstance(up, (int, float)) and up > down):
+                continue
+            ts = max([t for t in (v.get("last_down"), v.get("last_up"), v.get("updated_at")) if isinstance(t, (int, float))] or [0])
+            if ts and now - ts > max_age_s:
+                out.add(k)
+    return out
+
+class _Store:
+    def gc(self, state: StateDict, live: Dict[str, set], max_age_days: int = None) -> int:
+        """Xoá key stale khỏi state (ghi xuống backend ở lần commit kế tiếp)."""
+        days = STATE_GC_DAYS if max_age_days is None else max_age_days
+        stale = _stale_keys(state, live, time.time(), days * 86400)
+        for k in stale:
+            del state[k]
+        return len(stale)
+
+class JsonStateStore(_Store):
+    backend = "json"
+
+    def __init__(self, path: str = None):
+        self.path = path or STATE_FILE
+
+    def load(self) -> StateDict:
+        if not os.path.exists(self.path): return StateDict()
+        with LockedFile(self.path, "r+") as f:
+            try:
+                f.seek(0); return StateDict(json.load(f) or {})
+            except Exception:
+                return StateDict()
+
+    def commit(self, state: StateDict):
+        tmp = self.path + ".tmp"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(state), f, ensure_ascii=False, indent=2)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        state.clear_marks()
+
+    def close(self):
+        pass
+
+class SqliteStateStore(_Store):
+    backend = "sqlite"
+
+    def __init__(self, path: str = None, json_path: str = None, auto_migrate: bool = True):
+        self.path = path or STATE_DB
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fresh = not os.path.exists(self.path)
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)")
+        json_path = json_path or STATE_FILE
+        if fresh and auto_migrate and os.path.exists(json_path):
+            n = self.migrate_from_json(json_path)
+            print(f"🔁 state: migrated {n} key(s) {json_path} -> {self.path}")
+
+    def load(self) -> StateDict:
+        s = StateDict()
+        for k, v, ts in self.db.execute("SELECT key, value, updated_at FROM state"):
+            try:
+                rec = json.loads(v)
+            except ValueError:
+                continue
+            rec.setdefault("updated_at", ts)
+            dict.__setitem__(s, k, rec)
+        return s
+
+    def _upsert(self, rows: Iterable[tuple]):
+        self.db.executemany(
+            "INSERT INTO state(key, value, updated_at) VALUES(?,?,?) "
+            "ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at", rows)
+
+    def commit(self, state: StateDict):
+        """1 transaction: upsert key đã set + xoá key đã del trong run."""
+        if not state.dirty and not state.deleted:
+            return
+        now = time.time()
+        rows = [(k, json.dumps({x: y for x, y in state[k].items() if x != "updated_at"}, ensure_ascii=False), now)
+                for k in sorted(state.dirty)]
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self._upsert(rows)
+            self.db.executemany("DELETE FROM state WHERE key=?", [(k,) for k in sorted(state.deleted)])
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        state.clear_marks()
+
+    def migrate_from_json(self, json_path: str) -> int:
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f) or {}
+        now = time.time()
+        rows = []
+        for k, v in data.items():
+            ts = max([t for t in (v.get("last_down"), v.get("last_up")) if isinstance(t, (int, float))] or [now])
+            rows.append((k, json.dumps(v, ensure_ascii=False), ts))
+        self.db.execute("BEGIN IMMEDIATE")
+        self._upsert(rows)
+        self.db.execute("COMMIT")
+        return len(rows)
+
+    def close(self):
+        self.db.close()
+
+def open_store(backend: str = None):
+    backend = (backend or STATE_BACKEND).lower()
+    if backend == "sqlite":
+        return SqliteStateStore()
+    if backend != "json":
+        raise ValueError(f"STATE_BACKEND không hợp lệ: {backend} (json|sqlite)")
+    return JsonStateStore()
+
+def main(argv) -> int:
+    cmd = argv[0] if argv else "stats"
+    if cmd == "migrate":
+        src = argv[1] if len(argv) > 1 else STATE_FILE
+        dst = argv[2] if len(argv) > 2 else STATE_DB
+        st = SqliteStateStore(dst, auto_migrate=False)
+        n = st.migrate_from_json(src)
+        print(f"✅ migrated {n} key(s) {src} -> {dst}")
+        return 0
+    st = open_store()
+    data = st.load()
+    if cmd == "stats":
+        print(json.dumps({"backend": st.backend, "path": st.path, "keys": len(data),
+                          "namespaces": len({k.split("|", 1)[0] for k in data})}, indent=2))
+        return 0
+    if cmd == "export":
+        out = json.dumps(dict(data), ensure_ascii=False, indent=2)
+        if len(argv) > 1:
+            with open(argv[1], "w", encoding="utf-8") as f:
+                f.write(out)
+        else:
+            print(out)
+        return 0
+    print(__doc__)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
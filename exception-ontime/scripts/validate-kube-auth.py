@@ -1,11 +1,28 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+# Usage: validate-kube-auth.py [--no-cache]
+#   --no-cache: không dùng quyết định RBAC / rules đã cache (rbac_probe), kiểm tra lại trên cluster và ghi đè cache
 import os, sys, re, subprocess, shlex
+from concurrent.futures import ThreadPoolExecutor
+from kube_transport import make_transport, KubeError
+import rbac_probe
 
 # ===== Flags / Env =====
 DEBUG            = os.environ.get("DEBUG", "0").lower() in ("1","true","yes")
 STRICT_PATCH     = os.environ.get("STRICT_PATCH", "0").lower() in ("1","true","yes")
 ALLOW_UNKNOWN_NS = os.environ.get("ALLOW_UNKNOWN_NS", "0").lower() in ("1","true","yes")
+KUBE_TRANSPORT   = os.environ.get("KUBE_TRANSPORT", "kubectl").lower()   # kubectl | native
+# rules = 1 SelfSubjectRulesReview mỗi ns (rbac_probe, cache theo identity) | can-i = tối đa 5 lần can-i như cũ
+RBAC_PROBE       = os.environ.get("RBAC_PROBE", "rules").lower()
+RBAC_PROBE_CONCURRENCY = max(1, int(os.environ.get("RBAC_PROBE_CONCURRENCY", "8")))
+
+# native transport (đọc kubeconfig 1 lần, pool keep-alive); None khi dùng kubectl
+_NATIVE = None
+# transport gửi SSRR (native dùng lại _NATIVE, kubectl qua `create --raw`)
+_PROBE = None
+# cache quyết định đã kiểm chứng (rbac_probe.DecisionCache); None khi RBAC_DECISION_TTL_S=0
+_DECISIONS = None
+NO_CACHE = "--no-cache" in sys.argv[1:]
 
 def dbg(msg):
     if DEBUG:
@@ -123,11 +140,57 @@ def run_kubectl(kcfg: str, ctx: str, args: list, timeout=15):
     except subprocess.TimeoutExpired:
         return 124, "", "timeout"
 
+# ===== native helpers (KUBE_TRANSPORT=native) =====
+# group API cho các resource cần kiểm tra quyền (kubectl auth can-i tự suy ra qua discovery)
+RESOURCE_GROUPS = {"pods": "", "deployments": "apps", "statefulsets": "apps"}
+
+def native_ns_exists(ns: str):
+    try:
+        st, data = _NATIVE.request("GET", f"/api/v1/namespaces/{ns}")
+    except KubeError as e:
+        return "unknown", f"get ns error ({str(e)[:120]})"
+    if st == 200:
+        return "exists", "ok"
+    if st == 404:
+        return "not_found", "get ns -> not found"
+    if st in (401, 403):
+        # Disambiguate with a resource call
+        try:
+            st2, data2 = _NATIVE.request("GET", f"/api/v1/namespaces/{ns}/pods", query={"limit": 1})
+        except KubeError as e:
+            return "unknown", f"forbidden get ns, and pods error ({str(e)[:80]})"
+        details = (data2.get("details") or {}) if isinstance(data2, dict) else {}
+        if st2 == 404 and details.get("kind") == "namespaces":
+            return "not_found", "get pods -> namespaces not found"
+        if st2 in (200, 401, 403):
+            return "exists", "cannot read ns, but resource call suggests exists/forbidden"
+        return "unknown", f"forbidden get ns, and ambiguous pods status={st2}"
+    return "unknown", f"get ns status={st}"
+
+def native_can_i(ns: str, verb: str, resource: str) -> bool:
+    res, _, sub = resource.partition("/")
+    attrs = {"namespace": ns, "verb": verb, "resource": res, "group": RESOURCE_GROUPS.get(res, "")}
+    if sub:
+        attrs["subresource"] = sub
+    body = {"apiVersion": "authorization.k8s.io/v1", "kind": "SelfSubjectAccessReview",
+            "spec": {"resourceAttributes": attrs}}
+    try:
+        st, data = _NATIVE.request("POST", "/apis/authorization.k8s.io/v1/selfsubjectaccessreviews", body)
+    except KubeError as e:
+        dbg(f"can-i error: {e}")
+        return False
+    if st not in (200, 201) or not isinstance(data, dict):
+        dbg(f"can-i error status={st}: {str(data)[:200]}")
+        return False
+    return bool((data.get("status") or {}).get("allowed"))
+
 def ns_exists(kcfg: str, ctx: str, ns: str):
     """
     Return (status, detail)
     status ∈ {'exists','not_found','unknown'}
     """
+    if _NATIVE:
+        return native_ns_exists(ns)
     rc, out, err = run_kubectl(kcfg, ctx, ["get","ns", ns, "-o","name"], timeout=10)
     msg = (out + "\n" + err).lower()
     if rc == 0:
@@ -146,13 +209,94 @@ def ns_exists(kcfg: str, ctx: str, ns: str):
     return "unknown", f"get ns rc={rc} ({err[:120]})"
 
 def can_i(kcfg: str, ctx: str, ns: str, verb: str, resource: str) -> bool:
+    if _NATIVE:
+        return native_can_i(ns, verb, resource)
     rc, out, err = run_kubectl(kcfg, ctx, ["auth","can-i",verb,resource,"-n",ns])
     if rc != 0:
         dbg(f"can-i error rc={rc}: {err}")
         return False
     return out.strip().lower() == "yes"
 
+def decided(ns: str, verb: str, resource: str, compute, positive=bool):
+    """
+    Quyết định qua DecisionCache: còn hạn -> không gọi cluster; thiếu -> compute() rồi cache.
+    positive(v): True = TTL dương, False = TTL âm, None = không cache (vd ns 'unknown').
+    """
+    if _DECISIONS is None:
+        return compute()
+    v = _DECISIONS.get(ns, verb, resource)
+    if v is not None:
+        dbg(f"[ns:{ns or '-'}] {verb} {resource} = {v} (cache)")
+        return v
+    v = compute()
+    pos = positive(v)
+    if pos is not None:
+        _DECISIONS.put(ns, verb, resource, v, pos)
+    return v
+
+def check_basic_strict(kcfg: str, ctx: str, ns: str, check) -> tuple:
+    """check(verb, resource) -> bool. Giữ nguyên thứ tự/short-circuit của các check can-i."""
+    allowed = lambda v, r: decided(ns, v, r, lambda: check(v, r))
+    basic_ok = (
+        allowed("list", "pods") or
+        allowed("get",  "deployments") or
+        allowed("get",  "statefulsets")
+    )
+    strict_ok = True
+    if STRICT_PATCH:
+        strict_ok = (
+            allowed("patch", "deployments/scale") or
+            allowed("patch", "statefulsets/scale")
+        )
+    return basic_ok, strict_ok
+
+def probe_rbac(kcfg: str, ctx: str, ns: str, cache) -> tuple:
+    """
+    Fast path: rules từ cache hoặc 1 SSRR; rule không cho phép mà SSRR incomplete -> can-i cho riêng check đó.
+    SSRR lỗi (apiserver cũ, bị chặn) -> can-i như cũ. Trả (basic_ok, strict_ok, fresh_rules | None).
+    SSRR chỉ gửi khi có check chưa nằm trong DecisionCache.
+    """
+    got = {}
+
+    def rules():
+        if "rules" not in got:
+            hit = cache.get(ns) if cache else None
+            if hit is None:
+                try:
+                    hit = got["fresh"] = rbac_probe.rules_review(_PROBE, ns)
+                except KubeError as e:
+                    dbg(f"[ns:{ns}] rules review failed ({e}) → can-i")
+            else:
+                dbg(f"[ns:{ns}] rules from cache")
+            if hit and hit[1]:
+                dbg(f"[ns:{ns}] rules review incomplete → can-i cho check không khớp rule")
+            got["rules"] = hit
+        return got["rules"]
+
+    def check(verb, resource):
+        hit = rules()
+        if hit is None:
+            return can_i(kcfg, ctx, ns, verb, resource)
+        rl, incomplete = hit
+        return rbac_probe.allows(rl, verb, resource) or (incomplete and can_i(kcfg, ctx, ns, verb, resource))
+    return check_basic_strict(kcfg, ctx, ns, check) + (got.get("fresh"),)
+
+def check_namespace(kcfg: str, ctx: str, ns: str, cache) -> tuple:
+    """1 namespace: tồn tại + RBAC -> (status, basic_ok, strict_ok, fresh_rules); chạy song song giữa các ns."""
+    def exists():
+        status, detail = ns_exists(kcfg, ctx, ns)
+        dbg(f"[ns:{ns}] existence={status} ({detail})")
+        return status
+    status = decided(ns, "get", "namespaces", exists, lambda s: {"exists": True, "not_found": False}.get(s))
+    if status == "not_found" or (status == "unknown" and not ALLOW_UNKNOWN_NS):
+        return status, False, (not STRICT_PATCH), None
+    if RBAC_PROBE == "rules":
+        return (status,) + probe_rbac(kcfg, ctx, ns, cache)
+    return (status,) + check_basic_strict(kcfg, ctx, ns, lambda v, r: can_i(kcfg, ctx, ns, v, r)) + (None,)
+
 def current_context(kcfg: str) -> str:
+    if _NATIVE:
+        return _NATIVE.context
     rc, out, err = run_kubectl(kcfg, "", ["config","current-context"])
     return out if rc==0 else ""
 
@@ -165,15 +309,40 @@ def main():
         sys.exit(2)
 
     ctx = (os.environ.get("KUBE_CONTEXT","") or "").strip()
+    if KUBE_TRANSPORT == "native":
+        global _NATIVE
+        try:
+            _NATIVE = make_transport(kcfg, ctx, "10s", DEBUG, "native")
+        except (KubeError, OSError) as e:
+            print(f"❌ Không đọc được kubeconfig đã cung cấp: {e}")
+            sys.exit(2)
     if not ctx:
         ctx = current_context(kcfg)
-    dbg(f"Using context: {ctx or '(current-context)'}")
+    dbg(f"Using context: {ctx or '(current-context)'} (transport={KUBE_TRANSPORT})")
 
-    # quick connectivity
-    rc, out, err = run_kubectl(kcfg, ctx, ["version","--short"], timeout=10)
-    if rc != 0:
+    global _DECISIONS
+    try:
+        identity = rbac_probe.kube_identity(kcfg, ctx)
+        if rbac_probe.DECISION_TTL_S > 0:
+            _DECISIONS = rbac_probe.DecisionCache(identity, ctx, read=not NO_CACHE)
+    except OSError as e:
+        identity = ""
+        dbg(f"decision cache disabled: {e}")
+
+    # quick connectivity (chỉ cache kết nối thành công)
+    conn = {}
+    def connect():
+        if _NATIVE:
+            try:
+                st, conn["err"] = _NATIVE.request("GET", "/version", timeout=10)
+            except KubeError as e:
+                st, conn["err"] = 0, str(e)
+            return st == 200
+        rc, out, conn["err"] = run_kubectl(kcfg, ctx, ["version","--short"], timeout=10)
+        return rc == 0
+    if not decided("", "get", "/version", connect, lambda ok: True if ok else None):
         print("❌ Không kết nối được cluster bằng kubeconfig đã cung cấp.")
-        if DEBUG: print(err)
+        if DEBUG: print(conn.get("err", ""))
         sys.exit(5)
 
     # namespaces from ENV / file (strict)
@@ -186,11 +355,20 @@ def main():
         print("   - MANAGED_NS_FILE='/path/to/namespaces.txt' (mỗi dòng một namespace)")
         sys.exit(1)
 
+    cache = None
+    if RBAC_PROBE == "rules":
+        global _PROBE
+        _PROBE = _NATIVE or make_transport(kcfg, ctx, "10s", DEBUG, "kubectl")
+        if identity:
+            cache = rbac_probe.RulesCache(identity, read=not NO_CACHE)
+
+    # các ns độc lập -> kiểm tra song song; verdict vẫn in theo thứ tự namespaces
+    with ThreadPoolExecutor(max_workers=min(RBAC_PROBE_CONCURRENCY, len(namespaces))) as ex:
+        checked = list(ex.map(lambda ns: check_namespace(kcfg, ctx, ns, cache), namespaces))
+
     failures = []
     results  = {}
-    for ns in namespaces:
-        status, detail = ns_exists(kcfg, ctx, ns)
-        dbg(f"[ns:{ns}] existence={status} ({detail})")
+    for ns, (status, basic_ok, strict_ok, fresh) in zip(namespaces, checked):
         if status == "not_found":
             failures.append((ns, "namespace_not_found"))
             results[ns] = {"exists": False, "basic": False, "strict": (not STRICT_PATCH)}
@@ -200,19 +378,8 @@ def main():
             results[ns] = {"exists": None, "basic": False, "strict": (not STRICT_PATCH)}
             continue
 
-        # RBAC checks
-        basic_ok = (
-            can_i(kcfg, ctx, ns, "list", "pods") or
-            can_i(kcfg, ctx, ns, "get",  "deployments") or
-            can_i(kcfg, ctx, ns, "get",  "statefulsets")
-        )
-        strict_ok = True
-        if STRICT_PATCH:
-            strict_ok = (
-                can_i(kcfg, ctx, ns, "patch", "deployments/scale") or
-                can_i(kcfg, ctx, ns, "patch", "statefulsets/scale")
-            )
-
+        if cache and fresh is not None:
+            cache.put(ns, *fresh)
         results[ns] = {"exists": (status=="exists"), "basic": basic_ok, "strict": strict_ok}
         if not basic_ok or not strict_ok:
             reason = []
@@ -220,6 +387,15 @@ def main():
             if not strict_ok: reason.append("no_patch_scale(deployments/statefulsets)")
             failures.append((ns, ", ".join(reason)))
 
+    for c in (cache, _DECISIONS):
+        if c:
+            try:
+                c.save()
+            except OSError as e:
+                dbg(f"rbac cache save failed: {e}")
+    if _DECISIONS and _DECISIONS.hits:
+        dbg(f"decision cache hits={_DECISIONS.hits}")
+
     if failures:
         print("❌ Bạn KHÔNG có thẩm quyền / namespace không hợp lệ:")
         for ns, why in failures:
@@ -1,4 +1,11 @@
 #!/bin/sh
+# Engine Python (exception-ontime/scripts/node_utilization.py): 1 lần list nodes + 1 lần list pods thay cho
+# `kubectl describe node` từng node; cùng tham số, cùng bảng. CHECK_UTIL_ENGINE=sh -> chạy bản shell bên dưới.
+ENGINE_PY="$(CDPATH= cd -- "$(dirname -- "$0")" && pwd)/../exception-ontime/scripts/node_utilization.py"
+if [ "${CHECK_UTIL_ENGINE:-python}" != "sh" ] && [ -f "$ENGINE_PY" ] && command -v python3 >/dev/null 2>&1; then
+  exec python3 "$ENGINE_PY" "$@"
+fi
+
 echo "### PHASE I - CHECK NODE UTILIZATION"
 
 TMP_FILE=".node-describe.tmp"
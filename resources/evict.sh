@@ -1,10 +1,18 @@
 #!/bin/sh
 
-
+# Engine Python (exception-ontime/scripts/node_evictor.py): 1 lần list pods mỗi node, Eviction API (tôn trọng PDB),
+# chạy song song có giới hạn theo PDB / namespace, retry 429, report từng pod (EVICT_REPORT).
+# Namespace bỏ qua cấu hình qua EVICT_EXCLUDE_NS. EVICT_ENGINE=sh -> chạy bản shell (kubectl delete pod) bên dưới.
+ENGINE_PY="$(CDPATH= cd -- "$(dirname -- "$0")" && pwd)/../exception-ontime/scripts/node_evictor.py"
+if [ "${EVICT_ENGINE:-python}" != "sh" ] && [ -f "$ENGINE_PY" ] && command -v python3 >/dev/null 2>&1; then
+  exec python3 "$ENGINE_PY" "$@"
+fi
 
 NODE_PATTERNS="$1"     # Regex khớp tên node
 DRY_RUN_FLAG="$2"      # --dry-run (tuỳ chọn)
 NS_PREFIX=""
+EXCLUDE_NS="${EVICT_EXCLUDE_NS-sb-check|sb-logging|sb-vhht}"
+[ -z "$EXCLUDE_NS" ] && EXCLUDE_NS='^$'
 
 MATCHED_NODES_TMP=".matched-nodes.tmp"
 > "$MATCHED_NODES_TMP"
@@ -34,7 +42,7 @@ while read NODE; do
 
   kubectl get pods -A --field-selector spec.nodeName="$NODE" --no-headers \
     | awk -v prefix="$NS_PREFIX" '$1 ~ "^"prefix {print $1, $2}' \
-    | grep -Ev 'sb-check|sb-logging|sb-vhht' \
+    | grep -Ev "$EXCLUDE_NS" \
     | while read NS POD; do
 
       # Kiểm tra annotation unsafe-to-evict
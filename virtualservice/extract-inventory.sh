@@ -1,7 +1,14 @@
 #!/bin/bash
 set -e
 
-OUT="/tmp/vs-inventory.csv"
+# Engine Python (vs_inventory.py scan): parse streaming từng VS, cùng CSV, kèm diff NEW/CHANGED/REMOVED với
+# snapshot SQLite lần quét trước (VS_INVENTORY_DB). VS_ENGINE=jq -> chạy bản kubectl | jq bên dưới.
+ENGINE_PY="$(cd "$(dirname "$0")" && pwd)/vs_inventory.py"
+if [ "${VS_ENGINE:-python}" != "jq" ] && [ -f "$ENGINE_PY" ]; then
+  exec python3 "$ENGINE_PY" scan "$@"
+fi
+
+OUT="${VS_INVENTORY_CSV:-/tmp/vs-inventory.csv}"
 
 kubectl get virtualservice -A -o json \
 | jq -r '
@@ -1,3 +1,5 @@
+# Bản cũ (đọc cả CSV + file .xlsx ANTT mỗi run). Jenkinsfile dùng `python3 vs_inventory.py export`:
+# Status ANTT nạp vào snapshot SQLite chỉ khi file ANTT mới nhất đổi.
 import pandas as pd
 import os
 from datetime import datetime
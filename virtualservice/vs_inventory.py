@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+vs_inventory.py
+
+Inventory VirtualService (Istio) + diff với lần quét trước, thay cho cặp extract-inventory.sh (kubectl | jq)
++ merge-inventory.sh (pandas đọc cả CSV mới lẫn file .xlsx ANTT mới nhất rồi left-merge mỗi run):
+
+- scan: đọc `kubectl get virtualservice -A -o json` (hoặc --input) bằng parser JSON streaming (raw_decode từng
+  phần tử của .items, bộ nhớ ~1 VS), mỗi http[].match[] ra 1 dòng ngay khi parse xong -> VS_INVENTORY_CSV
+  cùng định dạng jq @csv cũ (Namespace, VirtualService, Hosts, Gateways, ContextPath; "/" cuối bị bỏ)
+- Snapshot lần quét trước giữ trong SQLite (VS_INVENTORY_DB), khoá ScanKey = Hosts + ContextPath như merge cũ:
+  mỗi dòng tra PK 1 lần -> NEW / CHANGED (ns, tên VS hoặc gateways đổi) / DUPLICATE (2 VS cùng host + path,
+  dòng thứ 2 giữ trong bảng dup_rows của lượt quét); key không gặp lại -> REMOVED. Cả lượt 1 transaction,
+  diff ghi VS_DIFF_CSV
+- Status ANTT: chỉ import lại khi file k8s-vs-inventory*.xlsx mới nhất trong VS_ANTT_DIR đổi (tên / mtime / size),
+  đọc openpyxl read_only từng dòng (cột Hosts, ContextPath, Status); không đổi thì không mở workbook
+- export: file merged (cột cũ + Status, dòng chưa có Status -> "🆕 NEW", thêm cột Change của lần quét cuối)
+  ra .xlsx (cần openpyxl) hoặc .csv; đủ mọi dòng của CSV inventory theo đúng thứ tự, kể cả dòng DUPLICATE
+  (như left-merge pandas cũ: Status tra theo ScanKey nên 2 dòng trùng key cùng Status)
+
+ENV:
+  VS_INVENTORY_CSV = /tmp/vs-inventory.csv
+  VS_INVENTORY_DB  = /K8S-Inventory/vs-inventory.sqlite
+  VS_DIFF_CSV      = /tmp/vs-inventory-diff.csv
+  VS_ANTT_DIR      = /K8S-Inventory/ANTT
+  VS_MERGED_OUT    = /K8S-Inventory/Updated/vs-inventory-merged-{date}.xlsx
+  KUBECTL          = kubectl
+  KUBE_CONTEXT     = ""
+
+CLI:
+  python3 vs_inventory.py scan [--input=FILE|-]     # quét + diff + cập nhật snapshot
+  python3 vs_inventory.py export [--out=FILE]       # file merged từ snapshot + Status ANTT
+  python3 vs_inventory.py show                      # diff của lần quét cuối
+"""
+
+import os, re, sys, csv, json, time, sqlite3, datetime, subprocess
+from typing import Iterator, List, Optional, Tuple
+
+INVENTORY_CSV = os.environ.get("VS_INVENTORY_CSV", "/tmp/vs-inventory.csv")
+DB_PATH       = os.environ.get("VS_INVENTORY_DB", "/K8S-Inventory/vs-inventory.sqlite")
+DIFF_CSV      = os.environ.get("VS_DIFF_CSV", "/tmp/vs-inventory-diff.csv")
+ANTT_DIR      = os.environ.get("VS_ANTT_DIR", "/K8S-Inventory/ANTT")
+MERGED_OUT    = os.environ.get("VS_MERGED_OUT", "/K8S-Inventory/Updated/vs-inventory-merged-{date}.xlsx")
+KUBECTL       = os.environ.get("KUBECTL", "kubectl")
+KUBE_CONTEXT  = os.environ.get("KUBE_CONTEXT", "")
+
+COLUMNS = ["Namespace", "VirtualService", "Hosts", "Gateways", "ContextPath"]
+NEW_STATUS = "🆕 NEW"
+
+# -------- Streaming JSON (.items của 1 List) --------
+_WS = re.compile(r"[ \t\n\r]*")
+_DEC = json.JSONDecoder()
+
+class _Reader:
+    def __init__(self, f, chunk: int = 1 << 16):
+        self.f, self.chunk, self.buf, self.pos, self.eof = f, chunk, "", 0, False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, ch: str):
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"JSON: cần {ch!r}, gặp {got!r} tại offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _DEC.raw_decode(self.buf, self.pos)
+                # số ở cuối buffer có thể còn chữ số chưa đọc tới
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except ValueError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                continue
+
+def iter_items(f) -> Iterator[dict]:
+    """Yield từng phần tử của .items trong 1 List JSON (kubectl -o json), không load cả document."""
+    r = _Reader(f)
+    r.expect("{")
+    while r.peek() not in ("}", ""):
+        key = r.value()
+        r.expect(":")
+        if key != "items":
+            r.value()
+        elif r.peek() == "n":
+            r.value()   # "items": null
+        else:
+            r.expect("[")
+            while r.peek() != "]":
+                yield r.value()
+                if r.peek() == ",":
+                    r.pos += 1
+            r.pos += 1
+        if r.peek() == ",":
+            r.pos += 1
+
+def vs_rows(vs: dict) -> Iterator[Tuple[str, str, str, str, str]]:
+    """Như jq cũ: mỗi http[].match[] 1 dòng, path = uri.prefix // exact // regex // "/" bỏ "/" cuối."""
+    meta, spec = vs.get("metadata") or {}, vs.get("spec") or {}
+    hosts, gws = ",".join(spec.get("hosts") or []), ",".join(spec.get("gateways") or [])
+    for route in spec.get("http") or []:
+        for m in route.get("match") or []:
+            uri = m.get("uri") or {}
+            path = next((uri[k] for k in ("prefix", "exact", "regex") if uri.get(k) is not None), "/")
+            yield meta.get("namespace", ""), meta.get("name", ""), hosts, gws, re.sub(r"/+$", "", path)
+
+# -------- Snapshot (SQLite) --------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+  key TEXT PRIMARY KEY, namespace TEXT, vs TEXT, hosts TEXT, gateways TEXT, path TEXT,
+  seq INTEGER, first_scan INTEGER, last_scan INTEGER, change TEXT);
+CREATE TABLE IF NOT EXISTS dup_rows (
+  key TEXT, namespace TEXT, vs TEXT, hosts TEXT, gateways TEXT, path TEXT, seq INTEGER);
+CREATE TABLE IF NOT EXISTS status (key TEXT PRIMARY KEY, status TEXT);
+CREATE TABLE IF NOT EXISTS changes (
+  change TEXT, key TEXT, namespace TEXT, vs TEXT, hosts TEXT, gateways TEXT, path TEXT, previous TEXT);
+CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);
+"""
+
+def open_db(path: str = None) -> sqlite3.Connection:
+    path = path or DB_PATH
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    db = sqlite3.connect(path, isolation_level=None)
+    db.executescript(_SCHEMA)
+    return db
+
+def _meta(db, k: str, default: str = "") -> str:
+    row = db.execute("SELECT v FROM meta WHERE k=?", (k,)).fetchone()
+    return row[0] if row else default
+
+def _set_meta(db, k: str, v: str):
+    db.execute("INSERT INTO meta(k, v) VALUES(?, ?) ON CONFLICT(k) DO UPDATE SET v=excluded.v", (k, v))
+
+def scan(db: sqlite3.Connection, f, csv_out, diff_out, before_commit=None) -> dict:
+    """
+    Stream VS list -> CSV + diff với snapshot trước -> số dòng theo loại thay đổi.
+    before_commit(): raise để huỷ cả lượt (vd kubectl exit != 0 -> list không đầy đủ, snapshot giữ nguyên).
+    """
+    scan_id = int(_meta(db, "scan_id", "0")) + 1
+    w = csv.writer(csv_out, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    dw = csv.writer(diff_out, lineterminator="\n")
+    dw.writerow(["Change"] + COLUMNS + ["Previous"])
+    counts = {"rows": 0, "vs": 0, "NEW": 0, "CHANGED": 0, "DUPLICATE": 0, "REMOVED": 0, "UNCHANGED": 0}
+    db.execute("BEGIN IMMEDIATE")
+    db.execute("DELETE FROM changes")
+    db.execute("DELETE FROM dup_rows")
+
+    def change(kind: str, key: str, row, prev: str = ""):
+        counts[kind] += 1
+        dw.writerow([kind, *row, prev])
+        db.execute("INSERT INTO changes VALUES(?,?,?,?,?,?,?,?)", (kind, key, *row, prev))
+
+    try:
+        seq = 0
+        for vs in iter_items(f):
+            counts["vs"] += 1
+            for row in vs_rows(vs):
+                ns, name, hosts, gws, path = row
+                key = hosts + path
+                prev = db.execute("SELECT namespace, vs, gateways, last_scan FROM rows WHERE key=?", (key,)).fetchone()
+                if prev and prev[3] == scan_id:
+                    if (prev[0], prev[1], prev[2]) != (ns, name, gws):
+                        w.writerow(row)
+                        counts["rows"] += 1
+                        seq += 1
+                        db.execute("INSERT INTO dup_rows VALUES(?,?,?,?,?,?,?)", (key, *row, seq))
+                        change("DUPLICATE", key, row, f"{prev[0]}/{prev[1]}")
+                    continue    # trùng y hệt (như uniq)
+                w.writerow(row)
+                counts["rows"] += 1
+                seq += 1
+                if prev is None:
+                    kind = "NEW"
+                    db.execute("INSERT INTO rows VALUES(?,?,?,?,?,?,?,?,?,?)",
+                               (key, ns, name, hosts, gws, path, seq, scan_id, scan_id, kind))
+                else:
+                    kind = "UNCHANGED" if (prev[0], prev[1], prev[2]) == (ns, name, gws) else "CHANGED"
+                    db.execute("UPDATE rows SET namespace=?, vs=?, gateways=?, seq=?, last_scan=?, change=? WHERE key=?",
+                               (ns, name, gws, seq, scan_id, kind, key))
+                if kind == "CHANGED":
+                    change(kind, key, row, f"{prev[0]}/{prev[1]} gateways={prev[2]}")
+                elif kind == "NEW":
+                    change(kind, key, row)
+                else:
+                    counts[kind] += 1
+        for key, *row in db.execute("SELECT key, namespace, vs, hosts, gateways, path FROM rows WHERE last_scan<?",
+                                    (scan_id,)).fetchall():
+            change("REMOVED", key, row)
+        db.execute("DELETE FROM rows WHERE last_scan<?", (scan_id,))
+        if before_commit:
+            before_commit()
+        _set_meta(db, "scan_id", str(scan_id))
+        _set_meta(db, "scanned_at", datetime.datetime.now().isoformat(timespec="seconds"))
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    return counts
+
+# -------- Status ANTT --------
+def latest_antt(dir_antt: str = None) -> Optional[str]:
+    dir_antt = dir_antt or ANTT_DIR
+    try:
+        files = sorted(f for f in os.listdir(dir_antt) if f.startswith("k8s-vs-inventory") and f.endswith(".xlsx"))
+    except OSError:
+        return None
+    return os.path.join(dir_antt, files[-1]) if files else None
+
+def import_status(db: sqlite3.Connection, path: str, force: bool = False) -> Optional[int]:
+    """Nạp Status từ file ANTT nếu file khác lần trước -> số key, None nếu bỏ qua (không đổi / thiếu openpyxl)."""
+    st = os.stat(path)
+    sig = f"{os.path.basename(path)}|{int(st.st_mtime)}|{st.st_size}"
+    if not force and _meta(db, "antt_sig") == sig:
+        return None
+    try:
+        import openpyxl  # optional
+    except ImportError:
+        print(f"⚠️  cần openpyxl để đọc {path} (pip install openpyxl) → giữ Status cũ")
+        return None
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(c or "").strip() for c in next(rows, ())]
+        try:
+            ih, ip, ist = header.index("Hosts"), header.index("ContextPath"), header.index("Status")
+        except ValueError:
+            raise RuntimeError(f"{path}: thiếu cột Hosts / ContextPath / Status")
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("DELETE FROM status")
+        n = 0
+        for r in rows:
+            s = r[ist] if ist < len(r) else None
+            if s is None or str(s).strip() == "":
+                continue
+            key = str(r[ih] or "") + str(r[ip] or "")
+            db.execute("INSERT OR REPLACE INTO status VALUES(?, ?)", (key, str(s)))
+            n += 1
+        _set_meta(db, "antt_sig", sig)
+        db.execute("COMMIT")
+    except BaseException:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        raise
+    finally:
+        wb.close()
+    return n
+
+def merged_rows(db: sqlite3.Connection) -> Iterator[tuple]:
+    """Mọi dòng của lần quét cuối theo thứ tự CSV (rows + dup_rows xen theo seq)."""
+    yield from db.execute("""SELECT namespace, vs, hosts, gateways, path, COALESCE(s.status, ?), change FROM (
+                               SELECT key, namespace, vs, hosts, gateways, path, seq, change FROM rows
+                               UNION ALL
+                               SELECT key, namespace, vs, hosts, gateways, path, seq, 'DUPLICATE' FROM dup_rows) r
+                             LEFT JOIN status s ON s.key = r.key ORDER BY r.seq""", (NEW_STATUS,))
+
+def export(db: sqlite3.Connection, out: str) -> Tuple[str, int]:
+    header = COLUMNS + ["Status", "Change"]
+    d = os.path.dirname(out)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    if out.endswith(".xlsx"):
+        try:
+            import openpyxl  # optional
+        except ImportError:
+            out = out[:-5] + ".csv"
+            print(f"⚠️  thiếu openpyxl → ghi CSV {out}")
+        else:
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet()
+            ws.append(header)
+            n = 0
+            for r in merged_rows(db):
+                ws.append(list(r))
+                n += 1
+            wb.save(out)
+            return out, n
+    n = 0
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(header)
+        for r in merged_rows(db):
+            w.writerow(r)
+            n += 1
+    return out, n
+
+# -------- CLI --------
+def _source(arg: str):
+    """-> (file-like, Popen | None)."""
+    if arg == "-":
+        return sys.stdin, None
+    if arg:
+        return open(arg, "r", encoding="utf-8"), None
+    cmd = [KUBECTL, "get", "virtualservice", "-A", "-o", "json"] + (["--context", KUBE_CONTEXT] if KUBE_CONTEXT else [])
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+    return p.stdout, p
+
+def main(argv: List[str]) -> int:
+    cmd = argv[0] if argv else ""
+    opt = {a.split("=", 1)[0]: (a.split("=", 1) + [""])[1] for a in argv[1:] if a.startswith("--")}
+    if cmd not in ("scan", "export", "show"):
+        print(__doc__)
+        return 2
+    db = open_db()
+
+    if cmd == "show":
+        print(f"[+] scan #{_meta(db, 'scan_id', '0')} at {_meta(db, 'scanned_at', '-')}")
+        for r in db.execute("SELECT change, namespace, vs, hosts, path, previous FROM changes ORDER BY change, key"):
+            print(f"  {r[0]:<9} {r[1]}/{r[2]} {r[3]}{r[4]}{'  (' + r[5] + ')' if r[5] else ''}")
+        return 0
+
+    if cmd == "export":
+        antt = latest_antt()
+        if antt:
+            n = import_status(db, antt)
+            if n is not None:
+                print(f"[+] Imported {n} Status from {antt}")
+        out, n = export(db, opt.get("--out") or MERGED_OUT.format(date=datetime.date.today().isoformat()))
+        print(f"[+] Wrote updated file: {out} ({n} rows)")
+        return 0
+
+    t0 = time.time()
+    src, proc = _source(opt.get("--input", ""))
+    tmp_csv, tmp_diff = INVENTORY_CSV + ".tmp", DIFF_CSV + ".tmp"
+
+    def kubectl_ok():
+        # kubectl lỗi giữa chừng -> list không đầy đủ, không được dùng làm snapshot
+        if proc and proc.wait() != 0:
+            raise RuntimeError(f"kubectl get virtualservice exit={proc.returncode}")
+
+    try:
+        with open(tmp_csv, "w", encoding="utf-8", newline="") as fc, open(tmp_diff, "w", encoding="utf-8", newline="") as fd:
+            counts = scan(db, src, fc, fd, kubectl_ok)
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ scan VirtualService: {e}")
+        return 2
+    finally:
+        if proc:
+            proc.stdout.close()
+            proc.wait()
+        elif src is not sys.stdin:
+            src.close()
+    os.replace(tmp_csv, INVENTORY_CSV)
+    os.replace(tmp_diff, DIFF_CSV)
+    print(f"[+] Exported VS inventory to {INVENTORY_CSV} ({counts['rows']} rows / {counts['vs']} VS, {time.time() - t0:.2f}s)")
+    print(f"[+] Diff vs last scan: NEW={counts['NEW']} CHANGED={counts['CHANGED']} REMOVED={counts['REMOVED']} "
+          f"DUPLICATE={counts['DUPLICATE']} unchanged={counts['UNCHANGED']} → {DIFF_CSV}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))